@@ -0,0 +1,115 @@
+"""
+Compare two versions of an archive; shared by nwn.erf.diff() and
+nwn.key.diff().
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Mapping, NamedTuple
+
+Digester = Callable[[list[str]], Mapping[str, bytes]]
+
+
+class Diff(NamedTuple):
+    """The differences between two versions of an archive."""
+
+    added: list[str]
+    """Filenames only in the new version."""
+    removed: list[str]
+    """Filenames only in the old version."""
+    changed: list[str]
+    """Filenames in both versions, with different contents."""
+
+
+def compare(
+    old_sizes: Mapping[str, int],
+    new_sizes: Mapping[str, int],
+    old_digests: Digester,
+    new_digests: Digester,
+    unchanged: Callable[[str], bool] | None = None,
+) -> Diff:
+    """
+    Compare two archives by their index, hashing only where needed.
+
+    Files of different size are changed without further checks. Files for
+    which unchanged() holds (such as the same range of the same file) are
+    skipped. Only the remaining files are hashed, in one call per archive.
+
+    Args:
+        old_sizes: The uncompressed size of each file in the old version.
+        new_sizes: The uncompressed size of each file in the new version.
+        old_digests: Called with a list of filenames to get their digests
+            in the old version.
+        new_digests: Likewise, for the new version.
+        unchanged: Called with a filename of equal size in both versions;
+            returns True if the contents are known to be the same.
+
+    Returns:
+        The differences, each list sorted by filename.
+    """
+
+    added = sorted(fn for fn in new_sizes if fn not in old_sizes)
+    removed = sorted(fn for fn in old_sizes if fn not in new_sizes)
+    changed = []
+    candidates = []
+    for filename, size in old_sizes.items():
+        if filename not in new_sizes:
+            continue
+        if new_sizes[filename] != size:
+            changed.append(filename)
+        elif unchanged is None or not unchanged(filename):
+            candidates.append(filename)
+
+    if candidates:
+        old, new = old_digests(candidates), new_digests(candidates)
+        changed.extend(fn for fn in candidates if old[fn] != new[fn])
+    return Diff(added, removed, sorted(changed))
+
+
+def _digest_chunk(
+    opener: Callable[..., Mapping[str, bytes]], path: Path, filenames: list[str]
+) -> dict[str, bytes]:
+    reader = opener(path)
+    try:
+        return reader.digests(filenames, workers=1)
+    finally:
+        close = getattr(reader, "close", None)
+        if close is not None:
+            close()
+
+
+def process_digester(
+    opener: Callable[..., Mapping[str, bytes]],
+    path: Path,
+    pool: ProcessPoolExecutor,
+    processes: int,
+) -> Digester:
+    """
+    Get a digester that hashes an archive on a process pool.
+
+    Each worker opens the archive itself and hashes one chunk of the
+    filenames, so hashing is not limited by the GIL.
+
+    Args:
+        opener: A picklable callable that opens the archive from its path
+            and returns a reader with a digests() method.
+        path: The path of the archive.
+        pool: The process pool to use.
+        processes: The number of chunks to split the filenames into.
+
+    Returns:
+        A digester for compare().
+    """
+
+    def digest(filenames: list[str]) -> dict[str, bytes]:
+        size = -(-len(filenames) // processes)
+        jobs = [
+            pool.submit(_digest_chunk, opener, path, filenames[i : i + size])
+            for i in range(0, len(filenames), size)
+        ]
+        result = {}
+        for job in jobs:
+            result.update(job.result())
+        return result
+
+    return digest
@@ -0,0 +1,426 @@
+"""
+Internal file I/O helpers shared by the archive readers and writers.
+"""
+
+import hashlib
+import io
+import os
+import stat
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+
+class PositionalReader:
+    """
+    Reads from absolute file offsets without relying on the shared file
+    position, so one instance can be used from many threads at once.
+
+    Uses os.pread() on OS files where the platform supports it; otherwise
+    (Windows, in-memory or compressed streams) falls back to seek and read
+    under a lock.
+
+    Args:
+        file: The file object to read from. It is not closed by this class.
+    """
+
+    def __init__(self, file: BinaryIO):
+        self._file = file
+        self._lock = threading.Lock()
+        self._fd = os_fileno(file) if hasattr(os, "pread") else None
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        """
+        Read up to size bytes at the given absolute offset.
+
+        Args:
+            offset: The absolute offset in the file.
+            size: The number of bytes to read.
+
+        Returns:
+            The data read. Shorter than size only if EOF was reached.
+        """
+
+        if self._fd is None:
+            with self._lock:
+                self._file.seek(offset)
+                return self._file.read(size)
+
+        data = os.pread(self._fd, size, offset)
+        if len(data) == size or not data:
+            return data
+        # Large reads may be split by the OS; keep reading until EOF.
+        parts = [data]
+        got = len(data)
+        while got < size:
+            chunk = os.pread(self._fd, size - got, offset + got)
+            if not chunk:
+                break
+            parts.append(chunk)
+            got += len(chunk)
+        return b"".join(parts)
+
+
+COPY_CHUNK_SIZE = 1024 * 1024
+"""Buffer size for chunked copies when no kernel copy is possible."""
+
+
+def os_fileno(file) -> int | None:
+    """
+    Get the descriptor of a file object whose bytes are those of an OS file.
+
+    Wrapper streams such as gzip.GzipFile report the descriptor of the file
+    underneath them, which holds different bytes, so only io.FileIO and
+    buffered readers and writers around one qualify.
+
+    Args:
+        file: The file object.
+
+    Returns:
+        The file descriptor, or None if the file object is not backed by
+        an OS file as is.
+    """
+
+    raw = file
+    if isinstance(file, (io.BufferedReader, io.BufferedWriter, io.BufferedRandom)):
+        raw = file.raw
+    if not isinstance(raw, io.FileIO) or raw.closed:
+        return None
+    return raw.fileno()
+
+
+def _kernel_copy(
+    src_fd: int, src_pos: int, dst_fd: int, dst_pos: int, size: int, sendfile=True
+):
+    # Returns the number of bytes copied, or None if neither syscall works
+    # for this pair of files; a short count means EOF was reached. sendfile
+    # moves the file position of dst_fd, so it is skipped if not allowed.
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                n = os.copy_file_range(
+                    src_fd, dst_fd, size - copied, src_pos + copied, dst_pos + copied
+                )
+                if n == 0:
+                    return copied
+                copied += n
+            return copied
+        except OSError:
+            # Unsupported by the kernel or file systems (EXDEV, EINVAL, ...);
+            # nothing was written yet unless copied > 0.
+            if copied:
+                raise
+    if sendfile and hasattr(os, "sendfile"):
+        try:
+            os.lseek(dst_fd, dst_pos, os.SEEK_SET)
+            while copied < size:
+                n = os.sendfile(dst_fd, src_fd, src_pos + copied, size - copied)
+                if n == 0:
+                    return copied
+                copied += n
+            return copied
+        except OSError:
+            if copied:
+                raise
+    return None
+
+
+class PositionalWriter:
+    """
+    Writes to absolute file offsets without relying on the shared file
+    position, so one instance can be used from many threads at once.
+
+    Uses os.pwrite() where the platform and file object support it; otherwise
+    falls back to seek and write under a lock. The file object must not be
+    written to through other means while in use; call flush() on it first if
+    it holds buffered data.
+
+    Args:
+        file: The file object to write to. It is not closed by this class.
+    """
+
+    def __init__(self, file: BinaryIO):
+        self._file = file
+        self._lock = threading.Lock()
+        self._fd = os_fileno(file) if hasattr(os, "pwrite") else None
+
+    def write_at(self, offset: int, data: bytes | memoryview):
+        """
+        Write all of data at the given absolute offset.
+
+        Args:
+            offset: The absolute offset in the file.
+            data: The data to write.
+        """
+
+        if self._fd is None:
+            with self._lock:
+                self._file.seek(offset)
+                self._file.write(data)
+                self._file.flush()
+            return
+
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(self._fd, view, offset)
+            view = view[written:]
+            offset += written
+
+    def copy_at(
+        self, offset: int, src: BinaryIO, size: int, chunk_size=COPY_CHUNK_SIZE
+    ):
+        """
+        Copy size bytes from the current position of src to the given
+        absolute offset, with constant memory use.
+
+        The copy is done in the kernel with os.copy_file_range() where
+        possible, and in chunks of chunk_size bytes otherwise.
+
+        Args:
+            offset: The absolute offset in the file.
+            src: The file object to read from.
+            size: The number of bytes to copy.
+            chunk_size: The buffer size for the chunked fallback.
+
+        Raises:
+            ValueError: If src ends before size bytes were copied.
+        """
+
+        src_fd = os_fileno(src)
+        if self._fd is not None and src_fd is not None:
+            src_pos = src.tell()
+            copied = _kernel_copy(
+                src_fd, src_pos, self._fd, offset, size, sendfile=False
+            )
+            if copied is not None:
+                src.seek(src_pos + copied)
+                if copied < size:
+                    raise ValueError("Unexpected end of stream")
+                return
+
+        copied = 0
+        while copied < size:
+            chunk = src.read(min(chunk_size, size - copied))
+            if not chunk:
+                raise ValueError("Unexpected end of stream")
+            self.write_at(offset + copied, chunk)
+            copied += len(chunk)
+
+
+def digest_range(
+    reader: PositionalReader, offset: int, size: int, chunk_size=COPY_CHUNK_SIZE
+) -> bytes:
+    """
+    Compute the SHA1 digest of a range of a file, reading it in chunks.
+
+    Args:
+        reader: The reader to read from.
+        offset: The absolute offset of the range.
+        size: The size of the range.
+        chunk_size: The number of bytes to read at a time.
+
+    Returns:
+        The raw digest.
+
+    Raises:
+        ValueError: If the file ends before the end of the range.
+    """
+
+    sha1 = hashlib.sha1()
+    done = 0
+    while done < size:
+        chunk = reader.read_at(offset + done, min(chunk_size, size - done))
+        if not chunk:
+            raise ValueError("Unexpected end of file")
+        sha1.update(chunk)
+        done += len(chunk)
+    return sha1.digest()
+
+
+def digest_view(mapping, offset: int, size: int) -> bytes:
+    """
+    Compute the SHA1 digest of a range of a memory mapping without copying.
+
+    Args:
+        mapping: The mapping (or any buffer) to hash from.
+        offset: The offset of the range.
+        size: The size of the range.
+
+    Returns:
+        The raw digest.
+
+    Raises:
+        ValueError: If the range is out of bounds.
+    """
+
+    if offset + size > len(mapping):
+        raise ValueError("Range out of bounds")
+    # hashlib releases the GIL for large buffers, so this parallelises.
+    return hashlib.sha1(memoryview(mapping)[offset : offset + size]).digest()
+
+
+MAX_COALESCED_READ = 16 * 1024 * 1024
+"""Upper bound for a single merged read issued by read_ranges()."""
+
+
+def read_ranges(
+    reader: PositionalReader, ranges: list[tuple[int, int]]
+) -> list[bytes]:
+    """
+    Read many (offset, size) ranges with as few read calls as possible.
+
+    Ranges are sorted by offset; ranges that touch or overlap are merged into
+    a single read of up to MAX_COALESCED_READ bytes, which is then split up
+    again.
+
+    Args:
+        reader: The reader to read from.
+        ranges: A list of (offset, size) tuples.
+
+    Returns:
+        The data for each range, in the order given.
+    """
+
+    results: list[bytes] = [b""] * len(ranges)
+    order = sorted(range(len(ranges)), key=lambda i: ranges[i][0])
+
+    i = 0
+    while i < len(order):
+        start = ranges[order[i]][0]
+        end = start + ranges[order[i]][1]
+        j = i + 1
+        while j < len(order):
+            offset, size = ranges[order[j]]
+            if offset > end or max(end, offset + size) - start > MAX_COALESCED_READ:
+                break
+            end = max(end, offset + size)
+            j += 1
+
+        block = memoryview(reader.read_at(start, end - start))
+        for k in order[i:j]:
+            offset, size = ranges[k]
+            results[k] = bytes(block[offset - start : offset - start + size])
+        i = j
+
+    return results
+
+
+def copy_stream(
+    src: BinaryIO, dst: BinaryIO, size: int | None = None, chunk_size=COPY_CHUNK_SIZE
+) -> int:
+    """
+    Copy data from the current position of src to the current position of
+    dst, with constant memory use.
+
+    If both are regular files, the copy is done in the kernel with
+    os.copy_file_range() or os.sendfile() where available; otherwise it
+    is done in chunks of chunk_size bytes. Either way, both file positions
+    end up after the copied data.
+
+    Args:
+        src: The file object to read from.
+        dst: The file object to write to.
+        size: The number of bytes to copy. If not given, copy until EOF.
+        chunk_size: The buffer size for the chunked fallback.
+
+    Returns:
+        The number of bytes copied.
+
+    Raises:
+        ValueError: If src ends before size bytes were copied.
+    """
+
+    src_fd = os_fileno(src)
+    dst_fd = os_fileno(dst)
+    if src_fd is not None and dst_fd is not None:
+        src_pos = src.tell()
+        if stat.S_ISREG(os.fstat(src_fd).st_mode):
+            count = size
+            if count is None:
+                count = max(os.fstat(src_fd).st_size - src_pos, 0)
+            dst.flush()
+            dst_pos = dst.tell()
+            copied = _kernel_copy(src_fd, src_pos, dst_fd, dst_pos, count)
+            if copied is not None:
+                src.seek(src_pos + copied)
+                dst.seek(dst_pos + copied)
+                if size is not None and copied < size:
+                    raise ValueError("Unexpected end of stream")
+                return copied
+
+    copied = 0
+    while size is None or copied < size:
+        want = chunk_size if size is None else min(chunk_size, size - copied)
+        chunk = src.read(want)
+        if not chunk:
+            break
+        dst.write(chunk)
+        copied += len(chunk)
+    if size is not None and copied < size:
+        raise ValueError("Unexpected end of stream")
+    return copied
+
+
+def _copy_owner_and_mode(st: os.stat_result, path: Path):
+    if hasattr(os, "chown"):
+        try:
+            os.chown(path, st.st_uid, st.st_gid)
+        except OSError:
+            # Only root may give files away; keep our own ownership.
+            pass
+    # After chown, which may clear the setuid and setgid bits.
+    os.chmod(path, stat.S_IMODE(st.st_mode))
+
+
+@contextmanager
+def atomic_write(path: str | Path) -> Iterator[BinaryIO]:
+    """
+    Write a file atomically.
+
+    Yields a new temporary file (opened "w+b") next to path, which replaces
+    path once the block completes, or is removed if it raises. The data is
+    synced to disk before the replace, so a crash leaves either the old or
+    the new contents at path.
+
+    Unlike tempfile, which creates files readable by their owner only, the
+    file gets the permissions open() would give: those of the file being
+    replaced (and its owner and group, where permitted), or the default
+    permissions for a new file.
+
+    Args:
+        path: The file to write.
+
+    Yields:
+        The temporary file object.
+    """
+
+    path = Path(path)
+    try:
+        existing = os.stat(path)
+    except FileNotFoundError:
+        existing = None
+    flags = os.O_RDWR | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        tmp = path.with_name(f"{path.name}.{os.urandom(4).hex()}.tmp")
+        try:
+            # The umask applies, as for open().
+            fd = os.open(tmp, flags, 0o666)
+            break
+        except FileExistsError:
+            continue
+    try:
+        if existing is not None:
+            _copy_owner_and_mode(existing, tmp)
+        with os.fdopen(fd, "w+b") as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
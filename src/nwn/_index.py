@@ -0,0 +1,290 @@
+"""
+Compact, array-backed resource indexes used by the archive readers.
+"""
+
+import struct
+from array import array
+from typing import Callable, Generic, Iterable, Iterator, Mapping, Sequence, TypeVar
+
+T = TypeVar("T")
+
+# Serialized index layout: magic, section count, then offset and length of
+# each section; sections start 8-byte aligned. Integer columns are stored in
+# native byte order, as the format is meant for sharing between processes on
+# the same machine, not for distribution.
+_BLOB_HEADER = struct.Struct("<4sI")
+_BLOB_SECTION = struct.Struct("<QQ")
+_WIDTH = struct.Struct("<I")
+
+
+def pack_sections(magic: bytes, sections: Sequence[bytes | array]) -> bytes:
+    """
+    Serialize a list of byte sections into a single blob.
+
+    Args:
+        magic: The 4 byte magic identifying the blob type.
+        sections: The sections to store.
+
+    Returns:
+        The serialized blob.
+    """
+
+    offset = _BLOB_HEADER.size + _BLOB_SECTION.size * len(sections)
+    table = []
+    body = []
+    for section in sections:
+        data = section.tobytes() if isinstance(section, array) else bytes(section)
+        pad = -offset % 8
+        body.append(b"\x00" * pad)
+        offset += pad
+        table.append(_BLOB_SECTION.pack(offset, len(data)))
+        body.append(data)
+        offset += len(data)
+    return b"".join([_BLOB_HEADER.pack(magic, len(sections)), *table, *body])
+
+
+def unpack_sections(buffer, magic: bytes) -> list[memoryview]:
+    """
+    Split a blob written by pack_sections() into zero-copy views.
+
+    Trailing bytes after the last section are ignored, so the buffer may be
+    larger than the blob (as with shared memory, which is page-aligned).
+
+    Args:
+        buffer: Any object supporting the buffer protocol.
+        magic: The expected 4 byte magic.
+
+    Returns:
+        A memoryview of each section.
+
+    Raises:
+        ValueError: If the blob is invalid or of the wrong type.
+    """
+
+    view = memoryview(buffer).cast("B")
+    if len(view) < _BLOB_HEADER.size:
+        raise ValueError("Index blob is truncated")
+    found, count = _BLOB_HEADER.unpack_from(view)
+    if found != magic:
+        raise ValueError(f"Not an index blob of type {magic!r}")
+    if _BLOB_HEADER.size + _BLOB_SECTION.size * count > len(view):
+        raise ValueError("Index blob is truncated")
+    sections = []
+    for i in range(count):
+        offset, length = _BLOB_SECTION.unpack_from(
+            view, _BLOB_HEADER.size + _BLOB_SECTION.size * i
+        )
+        if offset + length > len(view):
+            raise ValueError("Index blob is truncated")
+        sections.append(view[offset : offset + length])
+    return sections
+
+
+def int_column(section: memoryview) -> memoryview:
+    """
+    View a serialized section as a column of unsigned 32 bit integers.
+
+    Args:
+        section: A section written from an array("I").
+
+    Returns:
+        A read-only view of the integers.
+
+    Raises:
+        ValueError: If the section size does not match the item size.
+    """
+
+    itemsize = array("I").itemsize
+    if len(section) % itemsize:
+        raise ValueError("Index blob column is misaligned")
+    return section.toreadonly().cast("I")
+
+
+class CompactIndex(Mapping[str, T], Generic[T]):
+    """
+    An immutable mapping of names to rows of unsigned 32 bit integers.
+
+    Names are stored sorted in one bytes blob with fixed-width, NUL-padded
+    slots and looked up by binary search; each column is a single array.
+    This costs a few dozen bytes per entry, instead of a dict slot, a str
+    and a tuple of ints. Values are built from a row with the factory on
+    access only.
+
+    Args:
+        names: The names as a single sorted blob of fixed-width slots.
+        width: The width of each name slot, in bytes.
+        columns: One sequence of integers per column, in name order.
+        factory: Called as factory(name, *row) to build each value.
+    """
+
+    def __init__(
+        self,
+        names: bytes | memoryview,
+        width: int,
+        columns: Sequence[Sequence[int]],
+        factory: Callable[..., T],
+    ):
+        self._names = names
+        self._width = width
+        self._count = len(names) // width if width else 0
+        self._columns = columns
+        self._factory = factory
+
+    @classmethod
+    def build(
+        cls,
+        rows: Iterable[tuple[str, Sequence[int]]],
+        factory: Callable[..., T],
+        column_count: int,
+    ) -> "CompactIndex[T]":
+        """
+        Build an index from (name, row) pairs.
+
+        Duplicate names keep the last row, like a dict would.
+
+        Args:
+            rows: The (name, row) pairs; each row holds column_count ints.
+            factory: Called as factory(name, *row) to build each value.
+            column_count: The number of integer columns.
+
+        Returns:
+            The new index.
+        """
+
+        by_name = {name.encode("utf-8"): row for name, row in rows}
+        width = max(map(len, by_name), default=0)
+        ordered = sorted(by_name)
+        names = b"".join(n.ljust(width, b"\x00") for n in ordered)
+        columns = [
+            array("I", (by_name[n][col] for n in ordered))
+            for col in range(column_count)
+        ]
+        return cls(names, width, columns, factory)
+
+    def sections(self) -> list[bytes | array]:
+        """
+        Returns the index as a list of sections for pack_sections().
+
+        The list holds the name width, the name table and one section per
+        column.
+        """
+
+        return [
+            _WIDTH.pack(self._width),
+            bytes(self._names),
+            *(array("I", col) for col in self._columns),
+        ]
+
+    @classmethod
+    def from_sections(
+        cls, sections: Sequence[memoryview], factory: Callable[..., T]
+    ) -> "CompactIndex[T]":
+        """
+        Attach to an index stored with sections(), without copying.
+
+        Args:
+            sections: The sections, as returned by unpack_sections().
+            factory: Called as factory(name, *row) to build each value.
+
+        Returns:
+            An index backed by the given buffers.
+
+        Raises:
+            ValueError: If the sections are inconsistent.
+        """
+
+        if len(sections) < 2 or len(sections[0]) != _WIDTH.size:
+            raise ValueError("Invalid index sections")
+        (width,) = _WIDTH.unpack(sections[0])
+        names = sections[1].toreadonly()
+        if width == 0 and len(names) or width and len(names) % width:
+            raise ValueError("Invalid index name table")
+        index = cls(names, width, [int_column(s) for s in sections[2:]], factory)
+        if any(len(col) != index._count for col in index._columns):
+            raise ValueError("Invalid index column length")
+        return index
+
+    def _find(self, name: str) -> int:
+        if not isinstance(name, str):
+            return -1
+        needle = name.encode("utf-8")
+        if len(needle) > self._width or b"\x00" in needle:
+            return -1
+        needle = needle.ljust(self._width, b"\x00")
+        names, width = self._names, self._width
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(names[mid * width : (mid + 1) * width]) < needle:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and names[lo * width : (lo + 1) * width] == needle:
+            return lo
+        return -1
+
+    def _name(self, idx: int) -> str:
+        start = idx * self._width
+        return (
+            bytes(self._names[start : start + self._width])
+            .rstrip(b"\x00")
+            .decode("utf-8")
+        )
+
+    def row(self, name: str) -> tuple[int, ...] | None:
+        """
+        Get the raw row for a name without building a value.
+
+        Args:
+            name: The name to look up.
+
+        Returns:
+            The row as a tuple of ints, or None if not found.
+        """
+
+        idx = self._find(name)
+        if idx < 0:
+            return None
+        return tuple(col[idx] for col in self._columns)
+
+    def __getitem__(self, name: str) -> T:
+        idx = self._find(name)
+        if idx < 0:
+            raise KeyError(name)
+        return self._factory(name, *(col[idx] for col in self._columns))
+
+    def __contains__(self, name) -> bool:
+        return self._find(name) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return (self._name(i) for i in range(self._count))
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class MappedView(Mapping[str, T], Generic[T]):
+    """
+    A read-only view that applies a function to the values of a mapping
+    on access.
+
+    Args:
+        source: The mapping to wrap.
+        func: Called as func(key, value) to build each value.
+    """
+
+    def __init__(self, source: Mapping, func: Callable[..., T]):
+        self._source = source
+        self._func = func
+
+    def __getitem__(self, key: str) -> T:
+        return self._func(key, self._source[key])
+
+    def __contains__(self, key) -> bool:
+        return key in self._source
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._source)
+
+    def __len__(self) -> int:
+        return len(self._source)
@@ -1,20 +1,51 @@
 """Read and write ERF (Encapsulated Resource Format) archives."""
 
+import mmap
+import os
 import struct
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import NamedTuple, BinaryIO, Mapping
+from typing import NamedTuple, BinaryIO, Iterable, Mapping
 from enum import Enum
 from datetime import date, timedelta
 
 from .types import FileMagic, GenderedLanguage
 from .environ import get_codepage
-from .res import restype_to_extension, extension_to_restype
+from .res import restype_to_extension, extension_to_restype, validate_resrefs
+from .resdir import LocalDirectory
+from ._fileio import (
+    PositionalReader,
+    PositionalWriter,
+    read_ranges,
+    copy_stream,
+    digest_range,
+    digest_view,
+    atomic_write,
+    os_fileno,
+)
+from ._index import CompactIndex, pack_sections, unpack_sections
+from ._diff import Diff, compare, process_digester
+
+# Shared index blob sections: the entry count, key and resource list offsets
+# and file size and mtime (ns) of the archive, then the filename index
+# (width, names, and restype, offset, disk and uncompressed size columns).
+_SHARED_MAGIC = b"NWEI"
+_SHARED_META = struct.Struct("<IIIQQ")
+
+
+def _compact_entry(filename: str, restype, offset, disk_size, uncompressed_size):
+    return Reader.Entry(
+        filename.rsplit(".", 1)[0], restype, offset, disk_size, uncompressed_size
+    )
 
 
 class Reader(Mapping[str, bytes]):
     """
     Class to read and access an ERF archive (MOD, HAK, ERF, ...)
 
+    Resource reads use positional I/O and do not move the file position, so
+    a single Reader can be shared between threads without extra locking.
+
     Example:
         >>> with open("Prelude.mod", "rb") as file:
         ...    erf = Reader(file)
@@ -24,6 +55,21 @@ class Reader(Mapping[str, bytes]):
 
     Args:
         file: The file object to read from, either a filename or a BinaryIO.
+        compact: Keep the index in flat arrays with a sorted name table
+            instead of one Entry per resource, which needs a fraction of the
+            memory for large archives. Entry objects are built on access,
+            with the resref in lower case. Filenames are then listed in
+            sorted order.
+        shared_index: A buffer holding an index written by export_index(),
+            such as shared memory or a mapped file (see nwn.resshare). It
+            is used in place of the key and resource lists of the archive,
+            so any number of processes can share one copy. Implies compact.
+            The buffer must stay valid while the reader is in use. The index
+            is rejected if the key or resource list offsets, or the size or
+            mtime of the archive file differ from when it was exported.
+
+    Raises:
+        ValueError: If the archive or the shared index is not valid.
     """
 
     class Version(Enum):
@@ -57,7 +103,14 @@ class Reader(Mapping[str, bytes]):
     def _seek(self, relative_to_start):
         self._file.seek(self._root_offset + relative_to_start)
 
-    def __init__(self, file: BinaryIO | str | Path, max_entries=65535, max_locstr=100):
+    def __init__(
+        self,
+        file: BinaryIO | str | Path,
+        max_entries=65535,
+        max_locstr=100,
+        compact=False,
+        shared_index=None,
+    ):
         if isinstance(file, (str, Path)):
             self._owns_file = True
             self._file = open(file, "rb")  # pylint: disable=consider-using-with
@@ -65,6 +118,14 @@ class Reader(Mapping[str, bytes]):
             self._owns_file = False
             self._file = file
         self._root_offset = self._file.tell()
+        self._reader = PositionalReader(self._file)
+        # Taken before reading, so an exported index never claims to
+        # match an archive changed since. Streams without one use zeros.
+        fd = os_fileno(self._file)
+        self._file_stat = (0, 0)
+        if fd is not None:
+            st = os.fstat(fd)
+            self._file_stat = (st.st_size, st.st_mtime_ns)
 
         ft = self._file.read(4)
         fv = self.Version(self._file.read(4).decode("ASCII"))
@@ -88,6 +149,13 @@ class Reader(Mapping[str, bytes]):
             )
         }
 
+        self._localized_strings = loc_str
+
+        self._files: Mapping[str, Reader.Entry]
+        if shared_index is not None:
+            self._files = self._read_shared_index(shared_index)
+            return
+
         self._seek(self._header.offset_to_reslist)
         resources = [
             (offset, disk_size, disk_size)
@@ -106,14 +174,80 @@ class Reader(Mapping[str, bytes]):
             )
         ]
 
-        self._localized_strings = loc_str
+        if compact:
+            self._files = CompactIndex.build(
+                (
+                    (
+                        f"{resref.lower()}.{restype_to_extension(restype)}",
+                        (restype, *row),
+                    )
+                    for (resref, restype), row in zip(keys, resources)
+                ),
+                _compact_entry,
+                4,
+            )
+        else:
+            self._files = {
+                f"{resref.lower()}.{restype_to_extension(restype)}": self.Entry(
+                    resref, restype, o, d, u
+                )
+                for (resref, restype), (o, d, u) in zip(keys, resources)
+            }
+
+    def _read_shared_index(self, buffer) -> CompactIndex[Entry]:
+        sections = unpack_sections(buffer, _SHARED_MAGIC)
+        if not sections or len(sections[0]) != _SHARED_META.size:
+            raise ValueError("Invalid shared index")
+        entry_count, keylist, reslist, *file_stat = _SHARED_META.unpack(
+            sections[0]
+        )
+        if (entry_count, keylist, reslist, *file_stat) != (
+            self._header.entry_count,
+            self._header.offset_to_keylist,
+            self._header.offset_to_reslist,
+            *self._file_stat,
+        ):
+            raise ValueError("Shared index does not match the archive")
+        index = CompactIndex.from_sections(sections[1:], _compact_entry)
+        if len(index) > entry_count:
+            raise ValueError("Shared index does not match the archive")
+        return index
 
-        self._files = {
-            f"{resref.lower()}.{restype_to_extension(restype)}": self.Entry(
-                resref, restype, o, d, u
+    def export_index(self) -> bytes:
+        """
+        Serialize the index for use with the shared_index argument.
+
+        The result can be placed in shared memory or written to a file and
+        mapped by other processes, which then open the same archive without
+        parsing its key and resource lists. It depends on the byte order of
+        this machine and must be regenerated when the archive changes.
+
+        Returns:
+            The serialized index.
+        """
+
+        index = self._files
+        if not isinstance(index, CompactIndex):
+            index = CompactIndex.build(
+                (
+                    (fn, (e.restype, e.offset, e.disk_size, e.uncompressed_size))
+                    for fn, e in index.items()
+                ),
+                _compact_entry,
+                4,
             )
-            for (resref, restype), (o, d, u) in zip(keys, resources)
-        }
+        return pack_sections(
+            _SHARED_MAGIC,
+            [
+                _SHARED_META.pack(
+                    self._header.entry_count,
+                    self._header.offset_to_keylist,
+                    self._header.offset_to_reslist,
+                    *self._file_stat,
+                ),
+                *index.sections(),
+            ],
+        )
 
     def __del__(self):
         if self._owns_file:
@@ -152,7 +286,7 @@ class Reader(Mapping[str, bytes]):
         return list(self._files.keys())
 
     @property
-    def filemap(self) -> dict[str, Entry]:
+    def filemap(self) -> Mapping[str, Entry]:
         """
         Returns the mapping of files.
 
@@ -179,12 +313,93 @@ class Reader(Mapping[str, bytes]):
             ValueError: If the filename is of a unknown restype.
         """
         resource = self._files[filename.lower()]
-        self._seek(resource.offset)
-        return self._file.read(resource.disk_size)
+        return self._reader.read_at(
+            self._root_offset + resource.offset, resource.disk_size
+        )
+
+    def read_many(self, filenames: Iterable[str]) -> dict[str, bytes]:
+        """
+        Retrieve the contents of many files at once.
+
+        Requests are sorted by offset and adjacent resources are fetched with
+        a single read, which is much faster than calling read_file() in a loop.
+
+        Args:
+            filenames: The names of the files to retrieve.
+
+        Returns:
+            A dict mapping each filename to its contents, in the order given.
+
+        Raises:
+            KeyError: If any file is not found in the archive.
+        """
+        filenames = list(filenames)
+        resources = [self._files[filename.lower()] for filename in filenames]
+        data = read_ranges(
+            self._reader,
+            [(self._root_offset + r.offset, r.disk_size) for r in resources],
+        )
+        return dict(zip(filenames, data))
+
+    def digests(
+        self, filenames: Iterable[str] | None = None, workers: int | None = None
+    ) -> dict[str, bytes]:
+        """
+        Compute the SHA1 digest of the contents of many files at once.
+
+        If the archive is backed by a real file, it is mapped into memory and
+        resources are hashed from it without copying; otherwise they are read
+        in chunks. Either way, large resources are never held in memory as a
+        whole. Hashing runs on a thread pool.
+
+        For a cached variant that skips unchanged archives, see
+        nwn.reshash.archive_digests().
+
+        Args:
+            filenames: The names of the files to hash. Defaults to all files.
+            workers: The number of threads; defaults to the
+                ThreadPoolExecutor default.
+
+        Returns:
+            A dict mapping each filename to its raw SHA1 digest, in the
+            order given.
+
+        Raises:
+            KeyError: If any file is not found in the archive.
+            ValueError: If a resource is out of bounds.
+        """
+        filenames = list(self.filenames if filenames is None else filenames)
+        resources = [self._files[filename.lower()] for filename in filenames]
+
+        mapping = None
+        fd = os_fileno(self._file)
+        if fd is not None:
+            try:
+                mapping = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                # Empty files and files that cannot be mapped.
+                pass
+
+        def digest(resource: Reader.Entry) -> bytes:
+            offset = self._root_offset + resource.offset
+            if mapping is not None:
+                return digest_view(mapping, offset, resource.disk_size)
+            return digest_range(self._reader, offset, resource.disk_size)
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                digests = list(pool.map(digest, resources))
+        finally:
+            if mapping is not None:
+                mapping.close()
+        return dict(zip(filenames, digests))
 
     def __getitem__(self, item: str) -> bytes:
         return self.read_file(item)
 
+    def __contains__(self, item) -> bool:
+        return isinstance(item, str) and item.lower() in self._files
+
     def __iter__(self):
         return iter(self.filenames)
 
@@ -200,8 +415,7 @@ class Writer:
         >>> with open("Prelude.mod", "wb") as file:
         ...    with Writer(file, file_type="MOD ") as e:
         ...        e.add_localized_string(Language.ENGLISH, "Prelude")
-        ...        with open("item.uti", "rb") as item:
-        ...            e.add_file("item.uti", item)
+        ...        e.add_file_path("item.uti", "item.uti")
     """
 
     class Entry(NamedTuple):
@@ -243,59 +457,613 @@ class Writer:
             filename: The name of the file to add, including its extension.
             data: The binary data of the file to add.
         """
+        base, rt = _split_filename(filename)
         offset = self._file.tell()
         size = len(data)
-        # ensure we have a restype
-        base, ext = filename.split(".")
-        if len(base) > 16:
-            raise ValueError("Resource name too long")
-        rt = extension_to_restype(ext)
         self._entries.append(Writer.Entry(base, rt, offset, size))
         self._file.write(data)
         assert self._file.tell() == offset + size
 
+    def add_file_stream(
+        self, filename: str, fileobj: BinaryIO, size: int | None = None
+    ):
+        """
+        Adds a file to the ERF archive, copying it from a file object.
+
+        The data is copied from the current position of fileobj without
+        loading it into memory as a whole; if both fileobj and the archive
+        are regular files, the copy is done by the kernel where supported.
+
+        Args:
+            filename: The name of the file to add, including its extension.
+            fileobj: The file object to read the data from.
+            size: The number of bytes to copy. If not given, everything up
+                to the end of fileobj is added.
+
+        Raises:
+            ValueError: If fileobj ends before size bytes were read.
+        """
+        base, rt = _split_filename(filename)
+        offset = self._file.tell()
+        size = copy_stream(fileobj, self._file, size)
+        self._entries.append(Writer.Entry(base, rt, offset, size))
+        assert self._file.tell() == offset + size
+
+    def add_file_path(self, filename: str, path: str | Path):
+        """
+        Adds a file on disk to the ERF archive, see add_file_stream().
+
+        Args:
+            filename: The name of the file to add, including its extension.
+            path: The path of the file to copy the data from.
+        """
+        with open(path, "rb") as fileobj:
+            self.add_file_stream(filename, fileobj)
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         if exc_type is not None:
             return False
 
         locstr_offset = self._file.tell()
-        for gendered_lang, text in self._locstr.items():
-            encoded_text = text.encode(get_codepage())
-            self._file.write(struct.pack("I", gendered_lang.to_id()))
-            self._file.write(struct.pack("I", len(encoded_text)))
-            self._file.write(encoded_text)
-        locstr_size = self._file.tell() - locstr_offset
+        locstr = _encode_locstrs(self._locstr)
+        self._file.write(locstr)
 
         keylist_offset = self._file.tell()
-        for resref, restype, offset, size in self._entries:
-            res_ref = resref.ljust(16, "\x00").encode("ASCII")
-            res_id = 0  # res_id unused
-            self._file.write(res_ref)
-            self._file.write(struct.pack("I", res_id))
-            self._file.write(struct.pack("H", restype))
-            self._file.write(b"\x00\x00")  # Unused
+        self._file.write(_encode_keys((e.resref, e.restype) for e in self._entries))
 
         reslist_offset = self._file.tell()
-        for _, _, offset, size in self._entries:
-            self._file.write(struct.pack("i", offset))
-            self._file.write(struct.pack("i", size))
+        self._file.write(_encode_resources((e.offset, e.size) for e in self._entries))
 
         eof_offset = self._file.tell()
 
-        self._file.seek(8)
+        self._file.seek(0)
         self._file.write(
-            struct.pack(
-                "IIIIIIIII",
+            _encode_header(
+                self._file_type,
                 len(self._locstr),
-                locstr_size,
+                len(locstr),
                 len(self._entries),
                 locstr_offset,
                 keylist_offset,
                 reslist_offset,
                 self._build_year,
                 self._build_day,
-                0,  # description_strref
             )
         )
         self._file.seek(eof_offset)
         return False
+
+
+_HEADER_SIZE = 160
+_KEY_SIZE = 24
+_RES_SIZE = 8
+
+
+def _split_filename(filename: str) -> tuple[str, int]:
+    # ensure we have a restype
+    base, ext = filename.split(".")
+    if len(base) > 16:
+        raise ValueError("Resource name too long")
+    return base, extension_to_restype(ext)
+
+
+def _encode_header(
+    file_type: FileMagic,
+    locstr_count: int,
+    locstr_size: int,
+    entry_count: int,
+    locstr_offset: int,
+    keylist_offset: int,
+    reslist_offset: int,
+    build_year: int,
+    build_day: int,
+    description_strref=0,
+) -> bytes:
+    header = (
+        file_type
+        + Reader.Version.V_1_0.value.encode("ASCII")
+        + struct.pack(
+            "IIIIIIIII",
+            locstr_count,
+            locstr_size,
+            entry_count,
+            locstr_offset,
+            keylist_offset,
+            reslist_offset,
+            build_year,
+            build_day,
+            description_strref,
+        )
+    )
+    return header.ljust(_HEADER_SIZE, b"\x00")  # reserved bytes as per spec
+
+
+def _encode_locstrs(locstr: Mapping[GenderedLanguage, str]) -> bytes:
+    parts = []
+    for gendered_lang, text in locstr.items():
+        encoded_text = text.encode(get_codepage())
+        parts.append(struct.pack("II", gendered_lang.to_id(), len(encoded_text)))
+        parts.append(encoded_text)
+    return b"".join(parts)
+
+
+def _encode_keys(keys: Iterable[tuple[str, int]]) -> bytes:
+    # res_id is unused
+    return b"".join(
+        struct.pack("16sIH2s", resref.encode("ASCII"), 0, restype, b"")
+        for resref, restype in keys
+    )
+
+
+def _encode_resources(resources: Iterable[tuple[int, int]]) -> bytes:
+    return b"".join(struct.pack("II", offset, size) for offset, size in resources)
+
+
+def pack_directory(
+    src: str | Path,
+    out: str | Path,
+    file_type: FileMagic = FileMagic(b"HAK "),
+    workers: int | None = None,
+    recursive=False,
+    localized_strings: Mapping[GenderedLanguage, str] | None = None,
+    build_date: date | None = None,
+) -> int:
+    """
+    Pack all resources in a directory into a new ERF archive.
+
+    Unlike Writer, the complete layout (header, localized strings, key
+    list, resource list, then all data) is computed up front from the
+    file sizes, so resource data is copied by several threads at once,
+    each writing at its final offset. The header is written last, and the
+    archive is built in a temporary file that replaces out only once
+    complete.
+
+    Resources are stored sorted by filename. Files that are not valid
+    resource names are skipped, as with LocalDirectory.
+
+    Example:
+        >>> pack_directory("build/myhak", "myhak.hak", workers=8)
+
+    Args:
+        src: The directory to pack.
+        out: The archive file to write.
+        file_type: The file type of the archive.
+        workers: The number of copy threads; defaults to the
+            ThreadPoolExecutor default.
+        recursive: Also pack files in subdirectories of src.
+        localized_strings: Localized descriptions to store in the archive.
+        build_date: The build date to store; defaults to today.
+
+    Returns:
+        The number of resources packed.
+
+    Raises:
+        FileNotFoundError: If src is not a directory.
+        ValueError: If a resource name occurs more than once, a file
+            changed size while packing, or the archive would exceed 4 GiB.
+    """
+
+    src = Path(src)
+    if not src.is_dir():
+        raise FileNotFoundError(f"Not a directory: {src}")
+
+    directories = [Path(root) for root, _, _ in os.walk(src)] if recursive else [src]
+    files: dict[str, Path] = {}
+    for directory in directories:
+        for name, path in LocalDirectory(directory).filemap.items():
+            if name in files:
+                raise ValueError(f"Duplicate resource {name}: {files[name]}, {path}")
+            files[name] = path
+
+    names = sorted(files)
+    keys = validate_resrefs(names)
+    sources = [
+        _Source(
+            keys[name].resref,
+            keys[name].restype,
+            files[name],
+            0,
+            os.stat(files[name]).st_size,
+            whole_file=True,
+        )
+        for name in names
+    ]
+    _write_archive(
+        Path(out),
+        FileMagic(file_type),
+        localized_strings or {},
+        build_date or date.today(),
+        sources,
+        workers,
+    )
+    return len(sources)
+
+
+class _Source(NamedTuple):
+    resref: str
+    restype: int
+    path: Path
+    offset: int
+    size: int
+    whole_file: bool = False
+    """Whether size is the size of the whole file at path."""
+
+
+def _write_archive(
+    out: Path,
+    file_type: FileMagic,
+    localized_strings: Mapping[GenderedLanguage, str],
+    build_date: date,
+    sources: list[_Source],
+    workers: int | None,
+    description_strref=0,
+):
+    # Layout: header | locstr | keys | resources | data, written to a
+    # temporary file that replaces out once complete.
+    locstr = _encode_locstrs(localized_strings)
+    keylist_offset = _HEADER_SIZE + len(locstr)
+    reslist_offset = keylist_offset + _KEY_SIZE * len(sources)
+    offsets = []
+    end = reslist_offset + _RES_SIZE * len(sources)
+    for source in sources:
+        offsets.append(end)
+        end += source.size
+    if end > 0xFFFFFFFF:
+        raise ValueError("Archive too large")
+
+    header = _encode_header(
+        file_type,
+        len(localized_strings),
+        len(locstr),
+        len(sources),
+        _HEADER_SIZE,
+        keylist_offset,
+        reslist_offset,
+        build_date.year - 1900,
+        build_date.timetuple().tm_yday - 1,
+        description_strref,
+    )
+    tables = (
+        locstr
+        + _encode_keys((s.resref, s.restype) for s in sources)
+        + _encode_resources((o, s.size) for o, s in zip(offsets, sources))
+    )
+
+    with atomic_write(out) as tmp:
+        tmp.truncate(end)
+        writer = PositionalWriter(tmp)
+        writer.write_at(_HEADER_SIZE, tables)
+
+        def copy(source: _Source, offset: int):
+            with open(source.path, "rb") as f:
+                f.seek(source.offset)
+                # A shrunk file ends early; copy_at raises for that.
+                writer.copy_at(offset, f, source.size)
+                if source.whole_file and os.fstat(f.fileno()).st_size != source.size:
+                    raise ValueError(f"{source.path} changed size while packing")
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for job in [
+                pool.submit(copy, source, offset)
+                for source, offset in zip(sources, offsets)
+            ]:
+                job.result()
+
+        writer.write_at(0, header)
+
+
+class Updater:
+    """
+    Modify an existing ERF archive in place.
+
+    New and replaced resources are appended to the end of the archive, and
+    on commit only new key and resource lists and the header are written,
+    so the cost of an update is proportional to the data changed, not to
+    the size of the archive. Data is flushed to disk before the header is
+    rewritten, so an interrupted update leaves the previous contents
+    readable.
+
+    Replaced and removed resources, as well as previous lists, remain in the
+    file as dead space. Once it makes up more than compact_threshold of the
+    archive, commit rewrites the archive without it instead.
+
+    Example:
+        >>> with Updater("module.mod") as up:
+        ...     up.add_file_path("myscript.ncs", "build/myscript.ncs")
+        ...     up.remove("oldscript.ncs")
+
+    Args:
+        path: The archive to update.
+        compact_threshold: The fraction of dead space above which commit
+            compacts the archive. None disables compaction.
+        build_date: The build date to store; defaults to today.
+
+    Raises:
+        ValueError: If the archive is not valid.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        compact_threshold: float | None = 0.5,
+        build_date: date | None = None,
+    ):
+        self._path = Path(path)
+        self._compact_threshold = compact_threshold
+        self._build_date = build_date or date.today()
+        self._file = open(self._path, "r+b")  # pylint: disable=consider-using-with
+        try:
+            reader = Reader(self._file)
+            self._file_type = reader.file_type
+            self._description_strref = reader.description_strref
+            self._locstr = dict(reader.localized_strings)
+            self._entries: dict[str, _Source] = {
+                fn: _Source(e.resref, e.restype, self._path, e.offset, e.disk_size)
+                for fn, e in reader.filemap.items()
+            }
+            self._original_size = self._file.seek(0, os.SEEK_END)
+        except BaseException:
+            self._file.close()
+            raise
+        self._end = self._original_size
+
+    @property
+    def filenames(self) -> list[str]:
+        """The filenames the archive will contain when committed."""
+        return list(self._entries)
+
+    @property
+    def dead_space(self) -> int:
+        """
+        The number of bytes in the archive not used by the header or by
+        live resource data, including the current key and resource lists.
+        """
+
+        live = sum(e.size for e in self._entries.values())
+        return self._end - _HEADER_SIZE - live
+
+    def _check_open(self):
+        if self._file.closed:
+            raise ValueError("Updater is closed")
+
+    def add_localized_string(self, gendered_lang: GenderedLanguage, text):
+        self._check_open()
+        self._locstr[gendered_lang] = text
+
+    def _append(self, filename: str, write) -> None:
+        self._check_open()
+        base, rt = _split_filename(filename)
+        self._file.seek(self._end)
+        size = write()
+        if self._end + size > 0xFFFFFFFF:
+            raise ValueError("Archive too large")
+        self._entries.pop(filename.lower(), None)
+        self._entries[filename.lower()] = _Source(base, rt, self._path, self._end, size)
+        self._end += size
+
+    def add_file_data(self, filename: str, data: bytes):
+        """
+        Adds or replaces a file in the archive.
+
+        Args:
+            filename: The name of the file, including its extension.
+            data: The binary data of the file.
+        """
+        self._append(filename, lambda: self._file.write(data))
+
+    def add_file_stream(
+        self, filename: str, fileobj: BinaryIO, size: int | None = None
+    ):
+        """
+        Adds or replaces a file in the archive, copying it from a file object.
+
+        See Writer.add_file_stream().
+
+        Args:
+            filename: The name of the file, including its extension.
+            fileobj: The file object to read the data from.
+            size: The number of bytes to copy. If not given, everything up
+                to the end of fileobj is added.
+        """
+        self._append(filename, lambda: copy_stream(fileobj, self._file, size))
+
+    def add_file_path(self, filename: str, path: str | Path):
+        """
+        Adds or replaces a file in the archive, copying it from disk.
+
+        Args:
+            filename: The name of the file, including its extension.
+            path: The path of the file to copy the data from.
+        """
+        with open(path, "rb") as fileobj:
+            self.add_file_stream(filename, fileobj)
+
+    def remove(self, filename: str):
+        """
+        Removes a file from the archive.
+
+        Args:
+            filename: The name of the file, including its extension.
+
+        Raises:
+            KeyError: If the file is not in the archive.
+        """
+        self._check_open()
+        del self._entries[filename.lower()]
+
+    def commit(self, compact: bool | None = None):
+        """
+        Write the updated lists and header, and close the archive.
+
+        Args:
+            compact: Rewrite the archive without dead space. By default,
+                this is done if the dead space exceeds compact_threshold.
+        """
+
+        self._check_open()
+        if compact is None:
+            compact = (
+                self._compact_threshold is not None
+                and self.dead_space > self._compact_threshold * self._end
+            )
+
+        if compact:
+            # Appended data must be on disk for the copy; on failure, the
+            # archive is left as it was, plus unreferenced appended data.
+            self._file.close()
+            _write_archive(
+                self._path,
+                self._file_type,
+                self._locstr,
+                self._build_date,
+                list(self._entries.values()),
+                None,
+                self._description_strref,
+            )
+            return
+
+        try:
+            entries = list(self._entries.values())
+            locstr = _encode_locstrs(self._locstr)
+            locstr_offset = self._end
+            keylist_offset = locstr_offset + len(locstr)
+            reslist_offset = keylist_offset + _KEY_SIZE * len(entries)
+            self._file.seek(self._end)
+            self._file.write(locstr)
+            self._file.write(_encode_keys((e.resref, e.restype) for e in entries))
+            self._file.write(_encode_resources((e.offset, e.size) for e in entries))
+            if self._file.tell() > 0xFFFFFFFF:
+                raise ValueError("Archive too large")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+            self._file.seek(0)
+            self._file.write(
+                _encode_header(
+                    self._file_type,
+                    len(self._locstr),
+                    len(locstr),
+                    len(entries),
+                    locstr_offset,
+                    keylist_offset,
+                    reslist_offset,
+                    self._build_date.year - 1900,
+                    self._build_date.timetuple().tm_yday - 1,
+                    self._description_strref,
+                )
+            )
+        except BaseException:
+            self._file.truncate(self._original_size)
+            raise
+        finally:
+            self._file.close()
+
+    def abort(self):
+        """Discard all changes and close the archive."""
+
+        if self._file.closed:
+            return
+        try:
+            self._file.truncate(self._original_size)
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._file.closed:
+            return False
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+
+def _same_file(a: Reader, b: Reader) -> bool:
+    try:
+        return os.path.sameopenfile(a._file.fileno(), b._file.fileno())
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+def diff(
+    old: Reader | str | Path,
+    new: Reader | str | Path,
+    workers: int | None = None,
+    processes: int | None = None,
+) -> Diff:
+    """
+    Compare two versions of an ERF archive.
+
+    Files are compared by their size from the index first; only files of
+    equal size are hashed, and files at the same place in the same
+    underlying file are not hashed at all. A full read of both archives is
+    never needed when most sizes differ.
+
+    Example:
+        >>> changes = diff("build/mymod.mod", "production/mymod.mod")
+        ... redeploy = changes.added + changes.changed
+
+    Args:
+        old: The old version, as a Reader or a path.
+        new: The new version, as a Reader or a path.
+        workers: The number of hashing threads per archive; defaults to the
+            ThreadPoolExecutor default.
+        processes: Hash in this many worker processes instead of threads,
+            which scales beyond the GIL for large archives. Requires old
+            and new to be given as paths.
+
+    Returns:
+        The added, removed and changed filenames, each sorted.
+
+    Raises:
+        ValueError: If an archive is not valid, or processes is given
+            with open readers.
+    """
+
+    paths = [p for p in (old, new) if isinstance(p, (str, Path))]
+    if processes is not None and len(paths) != 2:
+        raise ValueError("Hashing in processes needs archive paths")
+    opened = []
+    try:
+        if isinstance(old, (str, Path)):
+            opened.append(open(old, "rb"))  # pylint: disable=consider-using-with
+            old = Reader(opened[-1])
+        if isinstance(new, (str, Path)):
+            opened.append(open(new, "rb"))  # pylint: disable=consider-using-with
+            new = Reader(opened[-1])
+
+        old_map, new_map = old.filemap, new.filemap
+        sizes = [
+            {fn: e.uncompressed_size for fn, e in m.items()}
+            for m in (old_map, new_map)
+        ]
+
+        def same_place(filename: str) -> bool:
+            a, b = old_map[filename], new_map[filename]
+            return (
+                old._root_offset + a.offset == new._root_offset + b.offset
+                and a.disk_size == b.disk_size
+            )
+
+        unchanged = same_place if _same_file(old, new) else None
+
+        if processes is None:
+            return compare(
+                *sizes,
+                lambda fns: old.digests(fns, workers),
+                lambda fns: new.digests(fns, workers),
+                unchanged,
+            )
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            return compare(
+                *sizes,
+                process_digester(Reader, Path(paths[0]), pool, processes),
+                process_digester(Reader, Path(paths[1]), pool, processes),
+                unchanged,
+            )
+    finally:
+        for file in opened:
+            file.close()
@@ -35,6 +35,7 @@ from nwn.gff._types import (
     CExoLocString,
     VOID,
     Struct,
+    LazyStruct,
     List,
     type_label_to_type,
 )
@@ -60,6 +61,7 @@ __all__ = [
     "VOID",
     "List",
     "Struct",
+    "LazyStruct",
     "struct_to_json",
     "struct_from_json",
     "type_label_to_type",
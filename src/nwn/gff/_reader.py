@@ -1,4 +1,5 @@
 import struct
+from functools import partial
 from typing import BinaryIO
 
 from nwn.types import GenderedLanguage, FileMagic
@@ -8,6 +9,7 @@ from nwn.gff._types import (
     ResRef,
     CExoLocString,
     Struct,
+    LazyStruct,
     List,
     Double,
     Int64,
@@ -19,7 +21,136 @@ from nwn.environ import get_codepage
 from nwn.gff._impl import FieldKind, Header, FieldEntry, StructEntry
 
 
-def read(file: BinaryIO) -> tuple[Struct, FileMagic]:
+_UINT = struct.Struct("<I")
+_FIELD = struct.Struct("<III")
+_STRUCT = struct.Struct("<III")
+
+
+def _read_field_data(kind: FieldKind, data_or_offset: int, field_data: bytes):
+    """Decode a field value that is not a struct or list."""
+
+    if kind in SIMPLE_TYPES:
+        cls = SIMPLE_TYPES[kind]
+        us = cls.SIMPLE_DATA_FORMAT
+        data = struct.pack("<I", data_or_offset)[: struct.calcsize(us)]
+        up = struct.unpack("<" + us, data)
+        return cls(up[0])
+
+    pos = data_or_offset
+
+    if kind == FieldKind.DOUBLE:
+        return Double(struct.unpack_from("<d", field_data, pos)[0])
+
+    if kind == FieldKind.DWORD64:
+        return Dword64(struct.unpack_from("<Q", field_data, pos)[0])
+
+    if kind == FieldKind.INT64:
+        return Int64(struct.unpack_from("<q", field_data, pos)[0])
+
+    if kind == FieldKind.CEXOSTRING:
+        sz = _UINT.unpack_from(field_data, pos)[0]
+        if sz > 0xFFFF:
+            raise ValueError("String too long")
+        return CExoString(field_data[pos + 4 : pos + 4 + sz].decode(get_codepage()))
+
+    if kind == FieldKind.RESREF:
+        sz = struct.unpack_from("<b", field_data, pos)[0]
+        if sz > 16:
+            raise ValueError("Resref too long")
+        return ResRef(field_data[pos + 1 : pos + 1 + sz].decode(get_codepage()))
+
+    if kind == FieldKind.CEXOLOCSTRING:
+        strref, count = struct.unpack_from("<II", field_data, pos + 4)
+        pos += 12
+        entries = {}
+        for _ in range(count):
+            lid, sz = struct.unpack_from("<II", field_data, pos)
+            pos += 8
+            entries[GenderedLanguage.from_id(lid)] = field_data[pos : pos + sz].decode(
+                get_codepage()
+            )
+            pos += sz
+        return CExoLocString(Dword(strref), entries)
+
+    if kind == FieldKind.VOID:
+        sz = _UINT.unpack_from(field_data, pos)[0]
+        return VOID(field_data[pos + 4 : pos + 4 + sz])
+
+    raise NotImplementedError(f"Field kind {kind} not implemented")
+
+
+class _LazyTables:
+    """
+    The raw tables of a GFF file, decoded into LazyStructs on demand.
+
+    Only labels are decoded up front; fields, structs and indices stay in
+    their on-disk form and are unpacked when a struct is first accessed.
+    """
+
+    def __init__(self, file: BinaryIO, root_offset: int, header: Header, labels):
+        def section(offset: int, size: int) -> bytes:
+            file.seek(root_offset + offset)
+            return file.read(size)
+
+        self._labels = labels
+        self._fields = section(header.field_offset, header.field_count * 12)
+        self._structs = section(header.struct_offset, header.struct_count * 12)
+        self._field_indices = section(
+            header.field_indices_offset, header.field_indices_size
+        )
+        self._list_indices = section(
+            header.list_indices_offset, header.list_indices_size
+        )
+        self._field_data = section(header.field_data_offset, header.field_data_size)
+        self._resolved: dict[int, LazyStruct] = {}
+        self._parents: dict[int, int | None] = {}
+
+    def struct(self, parent: int | None, struct_idx: int) -> LazyStruct:
+        """Get the proxy for a struct, referenced by the field parent."""
+
+        if struct_idx in self._resolved:
+            if self._parents[struct_idx] != parent:
+                raise ValueError("Struct already resolved with different parent")
+            return self._resolved[struct_idx]
+
+        if not 0 <= struct_idx < len(self._structs) // 12:
+            raise ValueError("Struct index out of bounds")
+        struct_id = _STRUCT.unpack_from(self._structs, struct_idx * 12)[0]
+        proxy = LazyStruct(struct_id, partial(self._load_struct, struct_idx))
+        self._resolved[struct_idx] = proxy
+        self._parents[struct_idx] = parent
+        return proxy
+
+    def _load_struct(self, struct_idx: int) -> dict:
+        _, data_or_offset, field_count = _STRUCT.unpack_from(
+            self._structs, struct_idx * 12
+        )
+        if field_count == 0:
+            field_array_indices = ()
+        elif field_count == 1:
+            field_array_indices = [data_or_offset]
+        else:
+            field_array_indices = struct.unpack_from(
+                f"<{field_count}I", self._field_indices, data_or_offset
+            )
+
+        result = {}
+        for field_idx in field_array_indices:
+            kind, label_index, data = _FIELD.unpack_from(self._fields, field_idx * 12)
+            kind = FieldKind(kind)
+            if kind == FieldKind.STRUCT:
+                value = self.struct(field_idx, data)
+            elif kind == FieldKind.LIST:
+                (size,) = _UINT.unpack_from(self._list_indices, data)
+                ids = struct.unpack_from(f"<{size}I", self._list_indices, data + 4)
+                value = List([self.struct(field_idx, lid) for lid in ids])
+            else:
+                value = _read_field_data(kind, data, self._field_data)
+            result[self._labels[label_index]] = value
+        return result
+
+
+def read(file: BinaryIO, lazy=False) -> tuple[Struct, FileMagic]:
     """
     Read a GFF data from a binary stream.
 
@@ -30,6 +161,10 @@ def read(file: BinaryIO) -> tuple[Struct, FileMagic]:
 
     Args:
         file: The binary stream to read from.
+        lazy: Only read the raw tables, and return a LazyStruct that
+            decodes the fields of each struct on first access. Much faster
+            for queries that only touch a few fields of a large file. Use
+            LazyStruct.materialize() to convert the whole tree.
 
     Returns:
         A tuple containing the root struct and the file type.
@@ -60,6 +195,10 @@ def read(file: BinaryIO) -> tuple[Struct, FileMagic]:
         )
     ]
 
+    if lazy:
+        tables = _LazyTables(file, root_offset, header, labels)
+        return tables.struct(None, 0), FileMagic(header.file_type)
+
     file.seek(root_offset + header.field_offset)
     fields = [
         FieldEntry(FieldKind(kind), data_or_offset, label_index)
@@ -94,51 +233,6 @@ def read(file: BinaryIO) -> tuple[Struct, FileMagic]:
     field_data = file.read(header.field_data_size)
 
     def _read_field_value(field):
-        if field.type in SIMPLE_TYPES:
-            cls = SIMPLE_TYPES[field.type]
-            us = cls.SIMPLE_DATA_FORMAT
-            data = struct.pack("<I", field.data_or_offset)[: struct.calcsize(us)]
-            up = struct.unpack("<" + us, data)
-            return cls(up[0])
-
-        file.seek(root_offset + header.field_data_offset + field.data_or_offset)
-
-        if field.type == FieldKind.DOUBLE:
-            return Double(struct.unpack("<d", file.read(8))[0])
-
-        if field.type == FieldKind.DWORD64:
-            return Dword64(struct.unpack("<Q", file.read(8))[0])
-
-        if field.type == FieldKind.INT64:
-            return Int64(struct.unpack("<q", file.read(8))[0])
-
-        if field.type == FieldKind.CEXOSTRING:
-            sz = struct.unpack("<I", file.read(4))[0]
-            if sz > 0xFFFF:
-                raise ValueError("String too long")
-            return CExoString(file.read(sz).decode(get_codepage()))
-
-        if field.type == FieldKind.RESREF:
-            sz = struct.unpack("<b", file.read(1))[0]
-            if sz > 16:
-                raise ValueError("Resref too long")
-            return ResRef(file.read(sz).decode(get_codepage()))
-
-        if field.type == FieldKind.CEXOLOCSTRING:
-            _ = struct.unpack("<I", file.read(4))[0]
-            strref = Dword(struct.unpack("<I", file.read(4))[0])
-            count = struct.unpack("<I", file.read(4))[0]
-            entries = {}
-            for _ in range(count):
-                fid = GenderedLanguage.from_id(struct.unpack("<I", file.read(4))[0])
-                sz = struct.unpack("<I", file.read(4))[0]
-                entries[fid] = file.read(sz).decode(get_codepage())
-            return CExoLocString(strref, entries)
-
-        if field.type == FieldKind.VOID:
-            sz = struct.unpack("<I", file.read(4))[0]
-            return VOID(file.read(sz))
-
         if field.type == FieldKind.LIST:
             offset = field.data_or_offset // 4
             size = list_indices[offset]
@@ -150,7 +244,7 @@ def read(file: BinaryIO) -> tuple[Struct, FileMagic]:
         if field.type == FieldKind.STRUCT:
             return _read_struct(field, field.data_or_offset)
 
-        raise NotImplementedError(f"Field {field} not implemented")
+        return _read_field_data(field.type, field.data_or_offset, field_data)
 
     def _read_struct(parent, struct_idx) -> Struct:
         if struct_idx in resolved_structs:
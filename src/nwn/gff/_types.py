@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Callable
 
 from nwn.types import GenderedLanguage
 from nwn.gff._impl import FieldKind
@@ -171,6 +172,89 @@ class Struct(dict):
         self[name] = value
 
 
+class LazyStruct(Struct):
+    """
+    A Struct that decodes its fields on first access.
+
+    Returned by read() in lazy mode. Nested structs (also in lists) are
+    LazyStructs as well, so only the parts of a file that are accessed
+    are ever decoded. Apart from that, it behaves just like a Struct.
+    """
+
+    def __init__(self, struct_id, loader: Callable[[], dict]):
+        super().__init__(struct_id)
+        object.__setattr__(self, "_loader", loader)
+
+    def _load(self):
+        loader = vars(self).get("_loader")
+        if loader is not None:
+            dict.update(self, loader())
+            object.__setattr__(self, "_loader", None)
+
+    def __eq__(self, other):
+        self._load()
+        if isinstance(other, LazyStruct):
+            other._load()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def materialize(self) -> Struct:
+        """
+        Decode all fields, recursively.
+
+        Returns:
+            A plain Struct tree with the same contents.
+        """
+
+        return Struct(
+            self.struct_id, **{k: _materialize(v) for k, v in self.items()}
+        )
+
+
+def _loading(name: str):
+    method = getattr(dict, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._load()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    wrapper.__qualname__ = f"LazyStruct.{name}"
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+# Every other dict method (and thus dict(), json and the writer, which go
+# through them for dict subclasses) loads the fields first.
+for _name in (
+    "__getitem__",
+    "__setitem__",
+    "__delitem__",
+    "__contains__",
+    "__iter__",
+    "__reversed__",
+    "__len__",
+    "__repr__",
+    "__or__",
+    "__ror__",
+    "__ior__",
+    "get",
+    "keys",
+    "values",
+    "items",
+    "copy",
+    "pop",
+    "popitem",
+    "setdefault",
+    "update",
+    "clear",
+):
+    setattr(LazyStruct, _name, _loading(_name))
+
+
 class List(list[Struct]):
     """
     GFF Lists are just python lists of Structs. They carry no metadata.
@@ -188,6 +272,14 @@ class List(list[Struct]):
         super().__init__(value)
 
 
+def _materialize(value):
+    if isinstance(value, LazyStruct):
+        return value.materialize()
+    if isinstance(value, List):
+        return List([_materialize(v) for v in value])
+    return value
+
+
 SIMPLE_TYPES = {
     FieldKind.BYTE: Byte,
     FieldKind.CHAR: Char,
@@ -2,13 +2,38 @@
 Read keyfiles, which store base game resources in the installation directory.
 """
 
+import logging
 import os
+import mmap
 import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from functools import partial
 from pathlib import Path
 from datetime import datetime, timedelta, date
-from typing import NamedTuple, BinaryIO, Mapping
-
-from .res import restype_to_extension
+from typing import NamedTuple, BinaryIO, Iterable, Iterator, Mapping
+
+from .res import restype_to_extension, extension_to_restype
+from ._fileio import (
+    PositionalReader,
+    read_ranges,
+    digest_range,
+    digest_view,
+    atomic_write,
+)
+from ._diff import Diff, compare, process_digester
+from ._index import (
+    CompactIndex,
+    MappedView,
+    pack_sections,
+    unpack_sections,
+    int_column,
+)
+
+_logger = logging.getLogger(__name__)
 
 
 class _VariableResource(NamedTuple):
@@ -18,41 +43,94 @@ class _VariableResource(NamedTuple):
     res_type: int
 
 
-class Reader(Mapping[str, bytes]):
-    """
-    Open a keyfile for reading.
+class _CompactTable(Mapping[int, _VariableResource]):
+    # A BIF resource table as parallel arrays, sorted by resource index.
+
+    def __init__(self, keys, ids, offsets, sizes, types):
+        self._keys = keys
+        self._ids = ids
+        self._offsets = offsets
+        self._sizes = sizes
+        self._types = types
+
+    @classmethod
+    def from_table(cls, table: Mapping[int, _VariableResource]) -> "_CompactTable":
+        order = sorted(table)
+        return cls(
+            array("I", order),
+            array("I", (table[k].id for k in order)),
+            array("I", (table[k].io_offset for k in order)),
+            array("I", (table[k].io_size for k in order)),
+            array("I", (table[k].res_type for k in order)),
+        )
 
-    Example:
-        >>> with Reader("nwn_base.key") as rd:
-        ...     data = rd.read_file("doortype.2da")
-        ...     print(data)
+    def columns(self) -> list:
+        return [self._keys, self._ids, self._offsets, self._sizes, self._types]
 
-    Args:
-        filename: The name of the keyfile to open.
-        bif_directory: The directory to search for BIF files in. If not provided,
-            the directory containing the keyfile is used.
+    def __getitem__(self, res_idx: int) -> _VariableResource:
+        pos = bisect_left(self._keys, res_idx)
+        if pos == len(self._keys) or self._keys[pos] != res_idx:
+            raise KeyError(res_idx)
+        return _VariableResource(
+            self._ids[pos], self._offsets[pos], self._sizes[pos], self._types[pos]
+        )
 
-    Raises:
-        ValueError: If the keyfile is not valid.
-        FileNotFoundError: If the keyfile or a BIF file is not found.
-    """
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._keys)
 
-    class _BIFF(NamedTuple):
-        filename: Path
-        file: BinaryIO
-        variable_resources: dict[int, _VariableResource]
-
-    class Entry(NamedTuple):
-        resref: str
-        size: int
-        bif: str
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+def _res_id(_filename: str, res_id: int) -> int:
+    return res_id
+
+
+def _compact_lookup(lookup: Mapping[str, int]) -> CompactIndex[int]:
+    if isinstance(lookup, CompactIndex):
+        return lookup
+    return CompactIndex.build(
+        ((fn, (res_id,)) for fn, res_id in lookup.items()), _res_id, 1
+    )
+
+
+class _Index(NamedTuple):
+    build_year: int
+    build_day: int
+    bif_filenames: list[Path]
+    resref_id_lookup: dict[str, int]
+    variable_resources: list[Mapping[int, _VariableResource] | None]
+
+
+def _read_bif_table(bif_file: BinaryIO) -> dict[int, _VariableResource]:
+    magic = bif_file.read(4)
+    if magic != b"BIFF":
+        raise ValueError("Not a BIF file")
+    version = bif_file.read(4)
+    if version != b"V1  ":
+        raise ValueError("Unsupported BIF version")
+    var_res_count, fixed_res_count, variable_table_offset = struct.unpack(
+        "<III", bif_file.read(12)
+    )
+    if fixed_res_count != 0:
+        raise ValueError("Fixed resources not supported")
+    variable_resources = {}
+    bif_file.seek(variable_table_offset)
+    resource_data = bif_file.read(var_res_count * 16)
+    for full_id, offset, file_size, res_type in struct.iter_unpack(
+        "<IIII", resource_data
+    ):
+        variable_resources[full_id & 0xFFFFF] = _VariableResource(
+            id=full_id,
+            io_offset=offset,
+            io_size=file_size,
+            res_type=res_type,
+        )
+    return variable_resources
 
-    def __init__(self, filename: str | Path, bif_directory=None):
-        filename = Path(filename)
-        bif_directory = bif_directory or filename.parent / ".."
-        self._bif_files = {}
-        file = self._file = open(filename, "rb")  # pylint: disable=consider-using-with
 
+def _read_index(filename: Path, bif_directory: Path, parse_bifs=True) -> _Index:
+    with open(filename, "rb") as file:
         magic = file.read(4)
         if magic != b"KEY ":
             raise ValueError("Not a keyfile")
@@ -65,8 +143,8 @@ class Reader(Mapping[str, bytes]):
             key_count,
             offset_to_file_table,
             offset_to_key_table,
-            self._build_year,
-            self._build_day,
+            build_year,
+            build_day,
         ) = struct.unpack("<IIIIII", file.read(24))
 
         file.seek(offset_to_file_table)
@@ -75,43 +153,11 @@ class Reader(Mapping[str, bytes]):
         filename_table = []
         for entry in file_table:
             file.seek(entry[1])
-            filename = file.read(entry[2]).decode("ASCII").replace("\\", "/")
-            filename_table.append(Path(filename))
-
-        def read_bif(bif_filename: Path):
-            # pylint: disable=consider-using-with
-            bif_file = open(bif_directory / bif_filename, "rb")
-            magic = bif_file.read(4)
-            if magic != b"BIFF":
-                raise ValueError("Not a BIF file")
-            version = bif_file.read(4)
-            if version != b"V1  ":
-                raise ValueError("Unsupported BIF version")
-            var_res_count, fixed_res_count, variable_table_offset = struct.unpack(
-                "<III", bif_file.read(12)
-            )
-            if fixed_res_count != 0:
-                raise ValueError("Fixed resources not supported")
-            variable_resources = {}
-            bif_file.seek(variable_table_offset)
-            resource_data = bif_file.read(var_res_count * 16)
-            for full_id, offset, file_size, res_type in struct.iter_unpack(
-                "<IIII", resource_data
-            ):
-                variable_resources[full_id & 0xFFFFF] = _VariableResource(
-                    id=full_id,
-                    io_offset=offset,
-                    io_size=file_size,
-                    res_type=res_type,
-                )
-            return self._BIFF(
-                bif_filename,
-                bif_file,
-                variable_resources,
-            )
+            bif_filename = file.read(entry[2]).decode("ASCII").replace("\\", "/")
+            filename_table.append(Path(bif_filename))
 
         file.seek(offset_to_key_table)
-        self._resref_id_lookup = {}
+        resref_id_lookup = {}
         key_table_data = file.read(key_count * 22)
         for (
             resref_bytes,
@@ -123,21 +169,421 @@ class Reader(Mapping[str, bytes]):
             if bif_idx < 0 or bif_idx >= len(file_table):
                 raise ValueError("Invalid BIF index")
             resext = restype_to_extension(res_type)
-            self._resref_id_lookup[f"{resref}.{resext}"] = res_id
+            resref_id_lookup[f"{resref}.{resext}"] = res_id
+
+    variable_resources = []
+    for bif_filename in filename_table:
+        if not parse_bifs:
+            variable_resources.append(None)
+            continue
+        with open(bif_directory / bif_filename, "rb") as bif_file:
+            variable_resources.append(_read_bif_table(bif_file))
+
+    return _Index(
+        build_year,
+        build_day,
+        filename_table,
+        resref_id_lookup,
+        variable_resources,
+    )
+
+
+# Index cache file layout (all little-endian):
+#   header:  magic, version, build year, build day, key size, key mtime_ns,
+#            bif count, entry count, length of the key path
+#   key path (utf-8)
+#   per BIF: size, mtime_ns, path length, path (utf-8, as listed in the KEY)
+#   per key entry: resref, restype, res_id, offset, size
+_CACHE_MAGIC = b"NWKX"
+_CACHE_VERSION = 1
+_CACHE_HEADER = struct.Struct("<4sIIIQQIIH")
+_CACHE_BIF = struct.Struct("<QQH")
+_CACHE_ENTRY = struct.Struct("<16sHIII")
+
+
+def _stat_key(st: os.stat_result) -> tuple[int, int]:
+    return st.st_size, st.st_mtime_ns
+
+
+def _load_index_cache(
+    cache_file: Path, filename: Path, bif_directory: Path
+) -> _Index | None:
+    try:
+        with open(cache_file, "rb") as f:
+            data = f.read()
+        (
+            magic,
+            version,
+            build_year,
+            build_day,
+            key_size,
+            key_mtime,
+            bif_count,
+            entry_count,
+            path_len,
+        ) = _CACHE_HEADER.unpack_from(data, 0)
+        if magic != _CACHE_MAGIC or version != _CACHE_VERSION:
+            return None
+        pos = _CACHE_HEADER.size
+        key_path = data[pos : pos + path_len].decode("utf-8")
+        pos += path_len
+        if key_path != str(filename.resolve()):
+            return None
+        if (key_size, key_mtime) != _stat_key(os.stat(filename)):
+            return None
+
+        bif_filenames = []
+        for _ in range(bif_count):
+            size, mtime, name_len = _CACHE_BIF.unpack_from(data, pos)
+            pos += _CACHE_BIF.size
+            bif_filename = Path(data[pos : pos + name_len].decode("utf-8"))
+            pos += name_len
+            if (size, mtime) != _stat_key(os.stat(bif_directory / bif_filename)):
+                return None
+            bif_filenames.append(bif_filename)
+
+        resref_id_lookup = {}
+        variable_resources = [{} for _ in bif_filenames]
+        for resref_bytes, res_type, res_id, offset, size in _CACHE_ENTRY.iter_unpack(
+            data[pos : pos + entry_count * _CACHE_ENTRY.size]
+        ):
+            resref = resref_bytes.rstrip(b"\x00").decode("ASCII")
+            resref_id_lookup[f"{resref}.{restype_to_extension(res_type)}"] = res_id
+            variable_resources[res_id >> 20][res_id & 0xFFFFF] = _VariableResource(
+                res_id, offset, size, res_type
+            )
+        if len(resref_id_lookup) != entry_count:
+            return None
+    except (OSError, ValueError, IndexError, struct.error):
+        # Missing, unreadable, truncated or otherwise stale: rebuild.
+        return None
+
+    return _Index(
+        build_year,
+        build_day,
+        bif_filenames,
+        resref_id_lookup,
+        variable_resources,
+    )
+
+
+def _write_index_cache(
+    cache_file: Path, filename: Path, bif_directory: Path, index: _Index
+):
+    key_path = str(filename.resolve()).encode("utf-8")
+    parts = [
+        _CACHE_HEADER.pack(
+            _CACHE_MAGIC,
+            _CACHE_VERSION,
+            index.build_year,
+            index.build_day,
+            *_stat_key(os.stat(filename)),
+            len(index.bif_filenames),
+            len(index.resref_id_lookup),
+            len(key_path),
+        ),
+        key_path,
+    ]
+    for bif_filename in index.bif_filenames:
+        name = bif_filename.as_posix().encode("utf-8")
+        parts.append(
+            _CACHE_BIF.pack(
+                *_stat_key(os.stat(bif_directory / bif_filename)), len(name)
+            )
+        )
+        parts.append(name)
+    for fn, res_id in index.resref_id_lookup.items():
+        resref, ext = fn.rsplit(".", 1)
+        res = index.variable_resources[res_id >> 20][res_id & 0xFFFFF]
+        parts.append(
+            _CACHE_ENTRY.pack(
+                resref.encode("ASCII"),
+                extension_to_restype(ext),
+                res_id,
+                res.io_offset,
+                res.io_size,
+            )
+        )
 
-        self._bif_files = [read_bif(fn) for fn in filename_table]
+    # Write to a temporary file and move it into place, so concurrent
+    # readers never see a partially written cache.
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(cache_file) as tmp:
+            tmp.write(b"".join(parts))
+    except OSError:
+        # The cache is optional; the index is already parsed.
+        _logger.warning("Could not write index cache %s", cache_file, exc_info=True)
+
+
+# Shared index blob sections: build year, build day, BIF count, and size
+# and mtime of the keyfile; BIF filenames (NUL-separated); the filename index
+# (width, names, res_id); then keys, ids, offsets, sizes and types of each
+# BIF table.
+_SHARED_MAGIC = b"NWKI"
+_SHARED_META = struct.Struct("<IIIQQ")
+_SHARED_TABLE_COLUMNS = 5
+
+
+def _read_shared_index(buffer, key_stat: tuple[int, int]) -> _Index:
+    sections = unpack_sections(buffer, _SHARED_MAGIC)
+    if len(sections) < 5 or len(sections[0]) != _SHARED_META.size:
+        raise ValueError("Invalid shared index")
+    build_year, build_day, bif_count, key_size, key_mtime = _SHARED_META.unpack(
+        sections[0]
+    )
+    if (key_size, key_mtime) != key_stat:
+        raise ValueError("Shared index does not match the keyfile")
+    if len(sections) != 5 + bif_count * _SHARED_TABLE_COLUMNS:
+        raise ValueError("Invalid shared index")
+    names = bytes(sections[1]).decode("utf-8")
+    bif_filenames = [Path(n) for n in names.split("\x00")] if bif_count else []
+    if len(bif_filenames) != bif_count:
+        raise ValueError("Invalid shared index")
+    tables = []
+    for bif_idx in range(bif_count):
+        start = 5 + bif_idx * _SHARED_TABLE_COLUMNS
+        columns = [
+            int_column(s) for s in sections[start : start + _SHARED_TABLE_COLUMNS]
+        ]
+        if len({len(c) for c in columns}) != 1:
+            raise ValueError("Invalid shared index")
+        tables.append(_CompactTable(*columns))
+    return _Index(
+        build_year,
+        build_day,
+        bif_filenames,
+        CompactIndex.from_sections(sections[2:5], _res_id),
+        tables,
+    )
 
-        self._entries = {
-            fn: self.Entry(
-                resref=fn,
-                size=self._bif_files[res_id >> 20]
-                .variable_resources[res_id & 0xFFFFF]
-                .io_size,
-                bif=self._bif_files[res_id >> 20].filename,
+
+class Reader(Mapping[str, bytes]):
+    """
+    Open a keyfile for reading.
+
+    Reads use positional I/O (or slice the mapping in mmap mode), so a single
+    Reader can be shared between threads without extra locking.
+
+    Example:
+        >>> with Reader("nwn_base.key") as rd:
+        ...     data = rd.read_file("doortype.2da")
+        ...     print(data)
+
+    Args:
+        filename: The name of the keyfile to open.
+        bif_directory: The directory to search for BIF files in. If not provided,
+            the directory containing the keyfile is used.
+        use_mmap: Map each BIF into memory once instead of reading through a
+            file object. Reads then slice the mapping, and read_view() returns
+            zero-copy views into it.
+        index_cache: Path to an index cache file. If given, the resolved
+            index is loaded from it instead of parsing the KEY and all BIF
+            tables. The cache is (re)written whenever it is missing or the
+            size or mtime of the keyfile or any BIF has changed. If it
+            cannot be written, a warning is logged and the reader works
+            without it.
+        lazy: Do not open BIF files up front; open each one (and parse its
+            resource table, unless loaded from the index cache) on the first
+            read from it.
+        max_open_bifs: Keep at most this many BIF files open, closing the
+            least recently used one when the limit is hit. Implies lazy.
+            Reads are serialised while a limit is set, as handles may be
+            closed by other threads.
+        compact: Keep the index in flat arrays with a sorted name table
+            instead of dicts of Python objects, which needs a fraction of
+            the memory for large keyfiles. Lookups use binary search, and
+            filemap builds Entry objects on access. Filenames are then
+            listed in sorted order.
+        shared_index: A buffer holding an index written by export_index(),
+            such as shared memory or a mapped file (see nwn.resshare). The
+            index is used in place instead of reading the KEY and BIF
+            tables, so any number of processes can share one copy. Implies
+            compact; index_cache is ignored. The buffer must stay valid
+            while the reader is in use. The index is rejected if the size
+            or mtime of the keyfile differ from when it was exported.
+
+    Raises:
+        ValueError: If the keyfile or the shared index is not valid, or the
+            shared index does not match the keyfile.
+        FileNotFoundError: If the keyfile or a BIF file is not found.
+    """
+
+    class _BIFF(NamedTuple):
+        filename: Path
+        file: BinaryIO | None
+        mapping: mmap.mmap | None = None
+        reader: PositionalReader | None = None
+
+    class Entry(NamedTuple):
+        resref: str
+        size: int
+        bif: str
+
+    def __init__(
+        self,
+        filename: str | Path,
+        bif_directory=None,
+        use_mmap=False,
+        index_cache: str | Path | None = None,
+        lazy=False,
+        max_open_bifs: int | None = None,
+        compact=False,
+        shared_index=None,
+    ):
+        if shared_index is not None:
+            compact = True
+        if max_open_bifs is not None:
+            if max_open_bifs < 1:
+                raise ValueError("max_open_bifs must be at least 1")
+            lazy = True
+
+        filename = Path(filename)
+        # Taken before reading, so an exported index never claims to
+        # match a keyfile changed since.
+        self._key_stat = _stat_key(os.stat(filename))
+        self._bif_directory = Path(bif_directory or filename.parent / "..")
+        self._use_mmap = use_mmap
+        self._max_open_bifs = max_open_bifs
+        self._bif_files: OrderedDict[int, Reader._BIFF] = OrderedDict()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._entries = None
+        self._compact = compact
+
+        index = None
+        if shared_index is not None:
+            index = _read_shared_index(shared_index, self._key_stat)
+        elif index_cache is not None:
+            index_cache = Path(index_cache)
+            index = _load_index_cache(index_cache, filename, self._bif_directory)
+        if index is None:
+            # The cache needs the BIF tables, so only skip them if not writing one.
+            index = _read_index(
+                filename,
+                self._bif_directory,
+                parse_bifs=not lazy or index_cache is not None,
             )
-            for fn, res_id in self._resref_id_lookup.items()
-            if res_id >> 20 < len(self._bif_files)
-        }
+            if index_cache is not None:
+                _write_index_cache(index_cache, filename, self._bif_directory, index)
+
+        self._build_year = index.build_year
+        self._build_day = index.build_day
+        self._bif_filenames = index.bif_filenames
+        self._variable_resources = index.variable_resources
+        self._resref_id_lookup = index.resref_id_lookup
+        if compact:
+            self._resref_id_lookup = _compact_lookup(index.resref_id_lookup)
+            for bif_idx, table in enumerate(self._variable_resources):
+                if table is not None:
+                    self._set_table(bif_idx, table)
+
+        if not lazy:
+            try:
+                for bif_idx in range(len(self._bif_filenames)):
+                    self._bif_files[bif_idx] = self._open_bif(bif_idx)
+            except BaseException:
+                self.close()
+                raise
+
+    def _open_bif(self, bif_idx: int) -> _BIFF:
+        bif_filename = self._bif_filenames[bif_idx]
+        # pylint: disable=consider-using-with
+        bif_file = open(self._bif_directory / bif_filename, "rb")
+        try:
+            if self._variable_resources[bif_idx] is None:
+                self._set_table(bif_idx, _read_bif_table(bif_file))
+            else:
+                if bif_file.read(4) != b"BIFF":
+                    raise ValueError("Not a BIF file")
+            if self._use_mmap:
+                # The mapping keeps its own handle, so the file can be closed.
+                mapping = mmap.mmap(bif_file.fileno(), 0, access=mmap.ACCESS_READ)
+                bif_file.close()
+                return self._BIFF(bif_filename, None, mapping)
+        except BaseException:
+            bif_file.close()
+            raise
+        return self._BIFF(bif_filename, bif_file, reader=PositionalReader(bif_file))
+
+    @staticmethod
+    def _close_bif(bif: _BIFF):
+        if bif.mapping is not None:
+            try:
+                bif.mapping.close()
+            except BufferError:
+                # Views returned by read_view() are still alive; the
+                # mapping is released once the last one goes away.
+                pass
+        else:
+            bif.file.close()
+
+    def _with_bif(self, bif_idx: int, func):
+        with self._lock:
+            if self._closed:
+                raise ValueError("Reader is closed")
+            bif = self._bif_files.get(bif_idx)
+            if bif is None:
+                bif = self._bif_files[bif_idx] = self._open_bif(bif_idx)
+                if (
+                    self._max_open_bifs is not None
+                    and len(self._bif_files) > self._max_open_bifs
+                ):
+                    _, evicted = self._bif_files.popitem(last=False)
+                    self._close_bif(evicted)
+            elif self._max_open_bifs is not None:
+                self._bif_files.move_to_end(bif_idx)
+
+            if self._max_open_bifs is not None:
+                # Other threads may evict this handle, so read under the lock.
+                return func(bif)
+        return func(bif)
+
+    def _ensure_tables(self):
+        for bif_idx, table in enumerate(self._variable_resources):
+            if table is None:
+                with open(
+                    self._bif_directory / self._bif_filenames[bif_idx], "rb"
+                ) as bif_file:
+                    self._set_table(bif_idx, _read_bif_table(bif_file))
+
+    def _set_table(self, bif_idx: int, table: Mapping[int, _VariableResource]):
+        if self._compact and not isinstance(table, _CompactTable):
+            table = _CompactTable.from_table(table)
+        self._variable_resources[bif_idx] = table
+
+    def export_index(self) -> bytes:
+        """
+        Serialize the index for use with the shared_index argument.
+
+        The result can be placed in shared memory or written to a file and
+        mapped by other processes, which then open the same keyfile without
+        parsing it or holding a private copy of the index. It depends on
+        the byte order of this machine and must be regenerated when the
+        keyfile or any BIF changes.
+
+        In lazy mode, this parses all BIF tables that have not been read yet.
+
+        Returns:
+            The serialized index.
+        """
+
+        self._ensure_tables()
+        sections = [
+            _SHARED_META.pack(
+                self._build_year,
+                self._build_day,
+                len(self._bif_filenames),
+                *self._key_stat,
+            ),
+            "\x00".join(p.as_posix() for p in self._bif_filenames).encode("utf-8"),
+            *_compact_lookup(self._resref_id_lookup).sections(),
+        ]
+        for table in self._variable_resources:
+            if not isinstance(table, _CompactTable):
+                table = _CompactTable.from_table(table)
+            sections.extend(table.columns())
+        return pack_sections(_SHARED_MAGIC, sections)
 
     def __enter__(self):
         return self
@@ -147,17 +593,17 @@ class Reader(Mapping[str, bytes]):
 
     def close(self):
         """
-        Closes the main file and all associated BIF files. You should call
-        this method when you are done with the keyfile. It is also called
-        automatically when the object is deleted (eg. via context manager).
+        Closes all associated BIF files. You should call this method when
+        you are done with the keyfile. It is also called automatically when
+        the object is deleted (eg. via context manager). Reading files
+        afterwards raises ValueError.
         """
 
-        if self._file:
-            self._file.close()
-            self._file = None
-            for bif_file in self._bif_files:
-                bif_file.file.close()
-            self._bif_files = []
+        with self._lock:
+            self._closed = True
+            for bif in self._bif_files.values():
+                self._close_bif(bif)
+            self._bif_files.clear()
 
     @property
     def build_date(self) -> date:
@@ -169,6 +615,14 @@ class Reader(Mapping[str, bytes]):
             days=self._build_day - 1
         )
 
+    @property
+    def bif_files(self) -> list[Path]:
+        """
+        Returns the paths of all BIF files referenced by the keyfile.
+        """
+
+        return [self._bif_directory / fn for fn in self._bif_filenames]
+
     @property
     def filenames(self) -> list[str]:
         """
@@ -178,13 +632,54 @@ class Reader(Mapping[str, bytes]):
         return list(self._resref_id_lookup.keys())
 
     @property
-    def filemap(self) -> dict[str, Entry]:
+    def filemap(self) -> Mapping[str, Entry]:
         """
         Returns a mapping of filenames to Entry objects.
+
+        In lazy mode, this parses all BIF tables that have not been read yet.
+        In compact mode, Entry objects are built on access instead of up front.
         """
 
+        if self._entries is None:
+            self._ensure_tables()
+            if self._compact:
+                self._entries = MappedView(self._resref_id_lookup, self._make_entry)
+            else:
+                self._entries = {
+                    fn: self._make_entry(fn, res_id)
+                    for fn, res_id in self._resref_id_lookup.items()
+                }
         return self._entries
 
+    def _make_entry(self, filename: str, res_id: int) -> Entry:
+        return self.Entry(
+            resref=filename,
+            size=self._variable_resources[res_id >> 20][res_id & 0xFFFFF].io_size,
+            bif=self._bif_filenames[res_id >> 20],
+        )
+
+    def _read(self, filename: str, view: bool):
+        res_id = self._resref_id_lookup.get(filename)
+        if res_id is None:
+            raise KeyError(f"File {filename} not found in keyfile")
+        bif_idx = res_id >> 20
+        res_idx = res_id & 0xFFFFF
+
+        def read(bif: Reader._BIFF):
+            resource = self._variable_resources[bif_idx][res_idx]
+            start = resource.io_offset
+            end = start + resource.io_size
+            if bif.mapping is not None:
+                if end > len(bif.mapping):
+                    raise ValueError(f"Resource {filename} out of bounds")
+                if view:
+                    return memoryview(bif.mapping)[start:end]
+                return bif.mapping[start:end]
+            data = bif.reader.read_at(start, resource.io_size)
+            return memoryview(data) if view else data
+
+        return self._with_bif(bif_idx, read)
+
     def read_file(self, filename: str) -> bytes:
         """
         Reads the content of a file from the resource archive.
@@ -196,25 +691,247 @@ class Reader(Mapping[str, bytes]):
             The content of the file.
 
         Raises:
-            ValueError: If the internal state is invalid.
+            ValueError: If the internal state is invalid or the reader is
+                closed.
             KeyError: If the file is not found in the archive.
         """
 
-        res_id = self._resref_id_lookup.get(filename)
-        if res_id is None:
-            raise KeyError(f"File {filename} not found in keyfile")
-        bif_idx = res_id >> 20
-        res_idx = res_id & 0xFFFFF
-        bif = self._bif_files[bif_idx]
-        resource = bif.variable_resources[res_idx]
-        bif.file.seek(resource.io_offset)
-        return bif.file.read(resource.io_size)
+        return self._read(filename, view=False)
+
+    def read_view(self, filename: str) -> memoryview:
+        """
+        Returns the content of a file as a read-only memoryview.
+
+        If the reader was opened with use_mmap=True, the view points directly
+        into the mapped BIF and no data is copied; otherwise the file is read
+        as with read_file().
+
+        Views keep the mapping alive. Release them (or let them go out of
+        scope) once you are done, especially before calling close().
+
+        Args:
+            filename: The name of the file to read, including extension.
+
+        Returns:
+            A memoryview of the file content.
+
+        Raises:
+            ValueError: If the internal state is invalid or the reader is
+                closed.
+            KeyError: If the file is not found in the archive.
+        """
+
+        return self._read(filename, view=True)
+
+    def _group_by_bif(self, filenames: list[str]) -> dict[int, list[tuple[str, int]]]:
+        """Group filenames by BIF index, as (filename, resource index) pairs."""
+
+        by_bif: dict[int, list[tuple[str, int]]] = {}
+        for filename in filenames:
+            res_id = self._resref_id_lookup.get(filename)
+            if res_id is None:
+                raise KeyError(f"File {filename} not found in keyfile")
+            by_bif.setdefault(res_id >> 20, []).append((filename, res_id & 0xFFFFF))
+        return by_bif
+
+    def read_many(self, filenames: Iterable[str]) -> dict[str, bytes]:
+        """
+        Reads many files at once.
+
+        Requests are grouped by BIF and sorted by offset, and adjacent
+        resources are fetched with a single read. This is considerably
+        faster than calling read_file() in a loop for bulk jobs.
+
+        Args:
+            filenames: The names of the files to read, including extension.
+
+        Returns:
+            A dict mapping each filename to its content, in the order given.
+
+        Raises:
+            ValueError: If the internal state is invalid or the reader is
+                closed.
+            KeyError: If any file is not found in the archive.
+        """
+
+        filenames = list(filenames)
+        by_bif = self._group_by_bif(filenames)
+        result = {}
+        for bif_idx in sorted(by_bif):
+            requests = by_bif[bif_idx]
+
+            def read(bif: Reader._BIFF, bif_idx=bif_idx, requests=requests):
+                table = self._variable_resources[bif_idx]
+                ranges = [
+                    (table[res_idx].io_offset, table[res_idx].io_size)
+                    for _, res_idx in requests
+                ]
+                if bif.mapping is not None:
+                    if any(o + s > len(bif.mapping) for o, s in ranges):
+                        raise ValueError("Resource out of bounds")
+                    return [bif.mapping[o : o + s] for o, s in ranges]
+                return read_ranges(bif.reader, ranges)
+
+            for (filename, _), data in zip(requests, self._with_bif(bif_idx, read)):
+                result[filename] = data
+
+        return {filename: result[filename] for filename in filenames}
+
+    def digests(
+        self, filenames: Iterable[str] | None = None, workers: int | None = None
+    ) -> dict[str, bytes]:
+        """
+        Computes the SHA1 digest of many files at once.
+
+        Files are hashed in place: directly from the mapping in mmap mode
+        (without copying), and in chunks otherwise, so large resources are
+        never held in memory as a whole. BIFs are processed in parallel.
+
+        For a cached variant that skips unchanged keyfiles, see
+        nwn.reshash.archive_digests().
+
+        Args:
+            filenames: The names of the files to hash. Defaults to all files.
+            workers: The number of threads; defaults to the
+                ThreadPoolExecutor default.
+
+        Returns:
+            A dict mapping each filename to its raw SHA1 digest, in the
+            order given.
+
+        Raises:
+            ValueError: If the internal state is invalid or the reader is
+                closed.
+            KeyError: If any file is not found in the archive.
+        """
+
+        filenames = list(self.filenames if filenames is None else filenames)
+        by_bif = self._group_by_bif(filenames)
+
+        def digest_bif(bif_idx: int, requests: list[tuple[str, int]]):
+            def run(bif: Reader._BIFF):
+                table = self._variable_resources[bif_idx]
+                result = []
+                for filename, res_idx in requests:
+                    resource = table[res_idx]
+                    if bif.mapping is not None:
+                        digest = digest_view(
+                            bif.mapping, resource.io_offset, resource.io_size
+                        )
+                    else:
+                        digest = digest_range(
+                            bif.reader, resource.io_offset, resource.io_size
+                        )
+                    result.append((filename, digest))
+                return result
+
+            return self._with_bif(bif_idx, run)
+
+        result = {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            jobs = [pool.submit(digest_bif, *item) for item in sorted(by_bif.items())]
+            for job in jobs:
+                result.update(job.result())
+        return {filename: result[filename] for filename in filenames}
 
     def __getitem__(self, key: str) -> bytes:
         return self.read_file(key)
 
+    def __contains__(self, key) -> bool:
+        return key in self._resref_id_lookup
+
     def __iter__(self):
         return iter(self.filenames)
 
     def __len__(self) -> int:
-        return len(self._entries)
+        return len(self._resref_id_lookup)
+
+
+def diff(
+    old: Reader | str | Path,
+    new: Reader | str | Path,
+    workers: int | None = None,
+    processes: int | None = None,
+) -> Diff:
+    """
+    Compare two versions of a keyfile and its BIFs.
+
+    Files are compared by their size from the index first; only files of
+    equal size are hashed. Files at the same offset of the same BIF file
+    (as when both keyfiles share unchanged BIFs) are not hashed at all.
+
+    Example:
+        >>> changes = diff("old/data/nwn_base.key", "data/nwn_base.key")
+        ... print(len(changes.changed), "changed files")
+
+    Args:
+        old: The old version, as a Reader or a path.
+        new: The new version, as a Reader or a path. Paths are opened with
+            the default BIF directory.
+        workers: The number of hashing threads per keyfile; defaults to the
+            ThreadPoolExecutor default.
+        processes: Hash in this many worker processes instead of threads,
+            which scales beyond the GIL for large keyfiles. Requires old
+            and new to be given as paths.
+
+    Returns:
+        The added, removed and changed filenames, each sorted.
+
+    Raises:
+        ValueError: If a keyfile is not valid, or processes is given with
+            open readers.
+        FileNotFoundError: If a keyfile or a BIF file is not found.
+    """
+
+    paths = [p for p in (old, new) if isinstance(p, (str, Path))]
+    if processes is not None and len(paths) != 2:
+        raise ValueError("Hashing in processes needs keyfile paths")
+    opener = partial(Reader, use_mmap=True, lazy=True)
+    opened = []
+    try:
+        if isinstance(old, (str, Path)):
+            old = opener(old)
+            opened.append(old)
+        if isinstance(new, (str, Path)):
+            new = opener(new)
+            opened.append(new)
+
+        # filemap also reads the BIF tables of lazy readers.
+        sizes = [{fn: e.size for fn, e in rd.filemap.items()} for rd in (old, new)]
+        old_bifs, new_bifs = old.bif_files, new.bif_files
+        same_bif: dict[tuple[int, int], bool] = {}
+
+        def unchanged(filename: str) -> bool:
+            old_id = old._resref_id_lookup[filename]
+            new_id = new._resref_id_lookup[filename]
+            pair = (old_id >> 20, new_id >> 20)
+            if pair not in same_bif:
+                try:
+                    same_bif[pair] = os.path.samefile(
+                        old_bifs[pair[0]], new_bifs[pair[1]]
+                    )
+                except OSError:
+                    same_bif[pair] = False
+            if not same_bif[pair]:
+                return False
+            a = old._variable_resources[pair[0]][old_id & 0xFFFFF]
+            b = new._variable_resources[pair[1]][new_id & 0xFFFFF]
+            return (a.io_offset, a.io_size) == (b.io_offset, b.io_size)
+
+        if processes is None:
+            return compare(
+                *sizes,
+                lambda fns: old.digests(fns, workers),
+                lambda fns: new.digests(fns, workers),
+                unchanged,
+            )
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            return compare(
+                *sizes,
+                process_digester(opener, Path(paths[0]), pool, processes),
+                process_digester(opener, Path(paths[1]), pool, processes),
+                unchanged,
+            )
+    finally:
+        for reader in opened:
+            reader.close()
@@ -171,14 +171,10 @@ def write(file: BinaryIO, manifest: Manifest):
     mappings = []
     seen_sha1 = {}
 
-    sorted_entries = [
-        (
-            entry,
-            entry.resref.split(".")[0],
-            extension_to_restype(entry.resref.split(".")[1]),
-        )
-        for entry in manifest.entries
-    ]
+    sorted_entries = []
+    for entry in manifest.entries:
+        resref_base, _, ext = entry.resref.partition(".")
+        sorted_entries.append((entry, resref_base, extension_to_restype(ext)))
     sorted_entries.sort(key=lambda x: (x[0].sha1, x[1]))
 
     for entry, resref_base, restype in sorted_entries:
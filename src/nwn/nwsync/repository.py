@@ -0,0 +1,338 @@
+"""
+A content-addressed resource store in the NWSync repository layout.
+
+Every distinct resource is stored once, compressed, under
+``data/sha1/xx/yy/<sha1>``; each ingested archive (or directory) becomes a
+manifest under ``manifests/<sha1 of the manifest>``. Ingesting many
+versions of the same haks and modules therefore only stores the resources
+that actually changed, and any ingested version can be read back as a
+Container.
+
+Example:
+
+    >>> from nwn.nwsync.repository import Repository
+    ...
+    ... repo = Repository("/srv/store")
+    ... manifest_id = repo.ingest("hak/myhak.hak", name="myhak")
+    ... hak = repo.open("myhak")
+    ... data = hak["myscript.nss"]
+"""
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+from typing import Iterable, Iterator, Mapping
+
+from .. import compressedbuf, erf, key
+from ..compressedbuf import Algorithm
+from .._fileio import atomic_write
+from ..res import Container
+from ..resdir import LocalDirectory
+from ..types import FileMagic
+from . import manifest as mf
+
+DATA_MAGIC = FileMagic("NSYC")
+"""The compressedbuf file magic of resource data in a repository."""
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_write(path) as file:
+        file.write(data)
+
+
+@contextmanager
+def _open_source(source: str | Path) -> Iterator[Mapping[str, bytes]]:
+    source = Path(source)
+    if source.is_dir():
+        yield LocalDirectory(source)
+    elif source.suffix.lower() == ".key":
+        with key.Reader(source, use_mmap=True, lazy=True) as reader:
+            yield reader
+    else:
+        with open(source, "rb") as file:
+            yield erf.Reader(file)
+
+
+def _sizes(source: Mapping[str, bytes]) -> Mapping[str, int] | None:
+    if isinstance(source, erf.Reader):
+        return {fn: e.uncompressed_size for fn, e in source.filemap.items()}
+    if isinstance(source, key.Reader):
+        return {fn: e.size for fn, e in source.filemap.items()}
+    if isinstance(source, LocalDirectory):
+        return {fn: os.stat(p).st_size for fn, p in source.filemap.items()}
+    return None
+
+
+class RepositoryView(Container):
+    """
+    A read-only view of one manifest in a Repository.
+
+    Args:
+        repository: The repository holding the data.
+        manifest: The manifest listing the resources.
+    """
+
+    def __init__(self, repository: "Repository", manifest: mf.Manifest):
+        self._repository = repository
+        self._manifest = manifest
+        self._entries = {e.resref.lower(): e for e in manifest.entries}
+
+    @property
+    def manifest(self) -> mf.Manifest:
+        """The manifest of this view."""
+        return self._manifest
+
+    def __getitem__(self, key: str) -> bytes:
+        return self._repository.read_blob(self._entries[key.lower()].sha1)
+
+    def read_many(
+        self, filenames: Iterable[str], workers: int | None = None
+    ) -> dict[str, bytes]:
+        """
+        Read many resources at once, decompressing them on a thread pool.
+
+        Args:
+            filenames: The names of the resources to read.
+            workers: The number of threads; defaults to the
+                ThreadPoolExecutor default.
+
+        Returns:
+            A dict mapping each filename to its contents, in the order given.
+
+        Raises:
+            KeyError: If any resource is not in the manifest.
+        """
+
+        filenames = list(filenames)
+        sha1s = [self._entries[fn.lower()].sha1 for fn in filenames]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return dict(zip(filenames, pool.map(self._repository.read_blob, sha1s)))
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and key.lower() in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"RepositoryView({self._repository!r}, count={len(self)})"
+
+
+class Repository:
+    """
+    A content-addressed resource store in the NWSync repository layout.
+
+    Resource data is deduplicated by SHA1 and stored as compressedbuf
+    files, so a repository written by this class can be served to NWSync
+    clients as is, and existing NWSync repositories can be read.
+
+    Named versions are kept as text files under ``refs/``, each holding the
+    id (hex SHA1) of a manifest.
+
+    Args:
+        root: The repository root directory. Created on first write.
+        algorithm: The compression algorithm for new resource data.
+    """
+
+    def __init__(self, root: str | Path, algorithm: Algorithm = Algorithm.ZSTD):
+        self._root = Path(root)
+        self._algorithm = algorithm
+
+    def __repr__(self):
+        return f"Repository({str(self._root)!r})"
+
+    @property
+    def root(self) -> Path:
+        """The repository root directory."""
+        return self._root
+
+    def blob_path(self, sha1: bytes) -> Path:
+        """
+        Get the path at which data with the given digest is stored.
+
+        Args:
+            sha1: The raw SHA1 digest of the data.
+
+        Returns:
+            The path of the compressed data file.
+        """
+
+        relative = mf.ManifestEntry(sha1, 0, "").repository_path
+        return self._root / "data" / "sha1" / relative
+
+    def has_blob(self, sha1: bytes) -> bool:
+        """Whether data with the given digest is stored."""
+        return self.blob_path(sha1).is_file()
+
+    def read_blob(self, sha1: bytes) -> bytes:
+        """
+        Read stored data by its digest.
+
+        Args:
+            sha1: The raw SHA1 digest of the data.
+
+        Returns:
+            The uncompressed data.
+
+        Raises:
+            FileNotFoundError: If no such data is stored.
+            ValueError: If the stored file is invalid.
+        """
+
+        with open(self.blob_path(sha1), "rb") as file:
+            data, _, _ = compressedbuf.read(file, DATA_MAGIC)
+        return data
+
+    def write_blob(self, data: bytes, sha1: bytes | None = None) -> bytes:
+        """
+        Store data, unless data with the same digest is already stored.
+
+        Args:
+            data: The data to store.
+            sha1: The raw SHA1 digest of the data, if already known.
+
+        Returns:
+            The raw SHA1 digest of the data.
+        """
+
+        sha1 = sha1 or hashlib.sha1(data).digest()
+        path = self.blob_path(sha1)
+        if not path.is_file():
+            compressed = compressedbuf.compress(data, DATA_MAGIC, self._algorithm)
+            _write_atomic(path, compressed)
+        return sha1
+
+    @property
+    def manifests(self) -> list[str]:
+        """The ids of all stored manifests."""
+        directory = self._root / "manifests"
+        if not directory.is_dir():
+            return []
+        return sorted(p.name for p in directory.iterdir() if len(p.name) == 40)
+
+    @property
+    def refs(self) -> dict[str, str]:
+        """A mapping of version names to manifest ids."""
+        directory = self._root / "refs"
+        if not directory.is_dir():
+            return {}
+        return {
+            p.name: p.read_text("ascii").strip()
+            for p in sorted(directory.iterdir())
+            if p.is_file() and not p.name.endswith(".tmp")
+        }
+
+    def read_manifest(self, ref: str) -> mf.Manifest:
+        """
+        Read a manifest by id or version name.
+
+        Args:
+            ref: A manifest id or a version name.
+
+        Returns:
+            The manifest.
+
+        Raises:
+            KeyError: If there is no such manifest or version.
+        """
+
+        manifest_id = self.refs.get(ref, ref)
+        path = self._root / "manifests" / manifest_id
+        if "/" in manifest_id or not path.is_file():
+            raise KeyError(ref)
+        with open(path, "rb") as file:
+            return mf.read(file)
+
+    def open(self, ref: str) -> RepositoryView:
+        """
+        Open an ingested version as a read-only Container.
+
+        Args:
+            ref: A manifest id or a version name.
+
+        Returns:
+            A view of the resources listed in the manifest.
+
+        Raises:
+            KeyError: If there is no such manifest or version.
+        """
+
+        return RepositoryView(self, self.read_manifest(ref))
+
+    def ingest(
+        self,
+        source: Mapping[str, bytes] | str | Path,
+        name: str | None = None,
+        workers: int | None = None,
+    ) -> str:
+        """
+        Store all resources of an archive or directory.
+
+        Resources already stored are skipped without being read (for
+        archive readers, which hash in place) or written. Hashing and
+        compression run on a thread pool.
+
+        Args:
+            source: A directory, a keyfile or ERF path, or any resource
+                mapping (such as an open reader or a LocalDirectory).
+            name: Also record the manifest under this version name,
+                replacing the previous version of that name.
+            workers: The number of threads; defaults to the
+                ThreadPoolExecutor default.
+
+        Returns:
+            The id of the manifest of the ingested resources.
+
+        Raises:
+            ValueError: If the source is empty, a resource name cannot be
+                stored in a manifest, or the version name is invalid.
+        """
+
+        if name is not None and (not name or "/" in name or name.startswith(".")):
+            raise ValueError(f"Invalid version name: {name}")
+        if isinstance(source, (str, Path)):
+            with _open_source(source) as reader:
+                return self.ingest(reader, name, workers)
+
+        filenames = list(source)
+        if not filenames:
+            raise ValueError("Nothing to ingest")
+
+        sizes = _sizes(source)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            if sizes is not None and hasattr(source, "digests"):
+                digests = source.digests(filenames, workers=workers)
+                missing = [fn for fn in filenames if not self.has_blob(digests[fn])]
+                list(
+                    pool.map(
+                        lambda fn: self.write_blob(source[fn], digests[fn]), missing
+                    )
+                )
+                entries = [
+                    mf.ManifestEntry(digests[fn], sizes[fn], fn) for fn in filenames
+                ]
+            else:
+
+                def store(filename: str) -> mf.ManifestEntry:
+                    data = source[filename]
+                    return mf.ManifestEntry(self.write_blob(data), len(data), filename)
+
+                entries = list(pool.map(store, filenames))
+
+        out = BytesIO()
+        mf.write(out, mf.Manifest(entries))
+        data = out.getvalue()
+        manifest_id = hashlib.sha1(data).hexdigest()
+        path = self._root / "manifests" / manifest_id
+        if not path.is_file():
+            _write_atomic(path, data)
+        if name is not None:
+            _write_atomic(self._root / "refs" / name, manifest_id.encode("ascii"))
+        return manifest_id
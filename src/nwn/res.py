@@ -2,7 +2,7 @@
 Types and classes for ResMan (resource management) functionality.
 """
 
-from typing import Mapping
+from typing import Iterable, Mapping, NamedTuple
 from collections import UserDict
 from abc import ABC
 
@@ -104,6 +104,8 @@ RESTYPE_MAP = {
     0xFFFF: "___",
 }
 
+_EXTENSION_MAP = {v: k for k, v in RESTYPE_MAP.items()}
+
 
 def restype_to_extension(restype: int) -> str:
     """
@@ -139,11 +141,69 @@ def extension_to_restype(extension: str) -> int:
     """
 
     try:
-        return {v: k for k, v in RESTYPE_MAP.items()}[extension.lower()]
+        return _EXTENSION_MAP[extension.lower()]
     except KeyError as e:
         raise ValueError(f"Unknown extension: {extension}") from e
 
 
+class ResRefKey(NamedTuple):
+    """
+    A resource identified by its (lowercase) resref and restype.
+
+    This is the canonical, hashable form of a resource name like
+    "nwscript.nss", and avoids formatting and splitting filename strings
+    when comparing or indexing resources.
+    """
+
+    resref: str
+    restype: int
+
+    @classmethod
+    def from_filename(cls, filename: str) -> "ResRefKey":
+        """
+        Parse a filename such as "nwscript.nss".
+
+        Args:
+            filename: The filename, including extension.
+
+        Returns:
+            The corresponding ResRefKey; the resref is lowercased.
+
+        Raises:
+            ValueError: If the filename is not a valid resref.
+        """
+
+        key = _parse_resref(filename)
+        if key is None:
+            raise ValueError(f"Invalid resref: {filename}")
+        return key
+
+    @property
+    def extension(self) -> str:
+        """The file extension for the restype."""
+        return restype_to_extension(self.restype)
+
+    @property
+    def filename(self) -> str:
+        """The filename, e.g. "nwscript.nss"."""
+        return f"{self.resref}.{restype_to_extension(self.restype)}"
+
+    def __str__(self):
+        return self.filename
+
+
+def _parse_resref(f: str) -> ResRefKey | None:
+    if "/" in f or "\\" in f or f.count(".") != 1:
+        return None
+    name, ext = f.split(".")
+    if len(name) > 16 or not name:
+        return None
+    restype = _EXTENSION_MAP.get(ext.lower())
+    if restype is None:
+        return None
+    return ResRefKey(name.lower(), restype)
+
+
 def is_valid_resref(f: str) -> bool:
     """
     Check if a given filename is a valid NWN resref.
@@ -154,16 +214,27 @@ def is_valid_resref(f: str) -> bool:
     Returns:
         True if the filename is a valid resref, False otherwise.
     """
-    if "/" in f or "\\" in f or f.count(".") != 1:
-        return False
-    name, ext = f.rsplit(".", 1)
-    if len(name) > 16 or not name:
-        return False
-    try:
-        extension_to_restype(ext)
-        return True
-    except ValueError:
-        return False
+    return _parse_resref(f) is not None
+
+
+def validate_resrefs(filenames: Iterable[str]) -> dict[str, ResRefKey]:
+    """
+    Validate many filenames at once.
+
+    Args:
+        filenames: The filenames to check.
+
+    Returns:
+        A dict mapping each valid filename (as given) to its ResRefKey.
+        Invalid filenames are omitted.
+    """
+
+    result = {}
+    for f in filenames:
+        key = _parse_resref(f)
+        if key is not None:
+            result[f] = key
+    return result
 
 
 class Container(Mapping[str, bytes], ABC):
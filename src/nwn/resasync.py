@@ -0,0 +1,207 @@
+"""
+Asyncio access to resource containers.
+
+All readers in this package (keyfiles, ERFs, directories and a ResMan over
+them) are safe to share between threads, so blocking reads can simply be
+offloaded to a thread pool without stalling the event loop.
+
+Example:
+
+    >>> from nwn.resman import create as create_resman
+    ... from nwn.resasync import AsyncResMan
+    ...
+    ... async def main():
+    ...     async with AsyncResMan(create_resman()) as arm:
+    ...         nss = await arm.get("nwscript.nss")
+    ...         async for name, data in arm.stream(["a.2da", "b.2da"]):
+    ...             ...
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Hashable, Iterable, Mapping
+
+from nwn.key import Reader as KeyReader
+from nwn.resman import ResMan
+
+
+def _origin(source: Mapping[str, bytes], key: str) -> Hashable:
+    # pylint: disable=protected-access
+    if isinstance(source, ResMan):
+        owner = source._lookup(key)
+        if owner is None:
+            return None
+        source, key = owner
+    if isinstance(source, KeyReader):
+        res_id = source._resref_id_lookup.get(key)
+        return (id(source), None if res_id is None else res_id >> 20)
+    return (id(source),)
+
+
+class AsyncResMan:
+    """
+    An asyncio façade over a ResMan or any single resource container.
+
+    Reads run on a bounded thread pool. In addition, at most
+    per_file_concurrency reads are in flight for each underlying file (each
+    BIF of a keyfile, each ERF, each directory), so a slow archive cannot
+    occupy the whole pool.
+
+    Use as an async context manager, or call aclose() (or close() outside
+    the event loop) when done, to shut down the internal executor.
+
+    Args:
+        source: The mapping to read resources from.
+        max_workers: Size of the thread pool used for reads.
+        per_file_concurrency: Maximum concurrent reads per underlying file.
+        executor: Use this executor instead of creating one. It is not shut
+            down by close() or aclose().
+    """
+
+    def __init__(
+        self,
+        source: Mapping[str, bytes],
+        max_workers: int = 8,
+        per_file_concurrency: int = 4,
+        executor: ThreadPoolExecutor | None = None,
+    ):
+        if max_workers < 1 or per_file_concurrency < 1:
+            raise ValueError("Concurrency limits must be at least 1")
+        self._source = source
+        self._max_workers = max_workers
+        self._per_file_concurrency = per_file_concurrency
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="nwn-resasync"
+        )
+        self._semaphores: dict[Hashable, asyncio.Semaphore] = {}
+
+    @property
+    def source(self) -> Mapping[str, bytes]:
+        """The wrapped resource mapping."""
+        return self._source
+
+    def __contains__(self, key) -> bool:
+        # Index lookups are in-memory and do not need to be offloaded.
+        return key in self._source
+
+    async def get(self, key: str) -> bytes:
+        """
+        Read a resource without blocking the event loop.
+
+        Args:
+            key: The resource name.
+
+        Returns:
+            The resource data.
+
+        Raises:
+            KeyError: If the resource is not found.
+        """
+
+        origin = _origin(self._source, key)
+        sem = self._semaphores.get(origin)
+        if sem is None:
+            sem = self._semaphores[origin] = asyncio.Semaphore(
+                self._per_file_concurrency
+            )
+        loop = asyncio.get_running_loop()
+        async with sem:
+            return await loop.run_in_executor(
+                self._executor, self._source.__getitem__, key
+            )
+
+    async def _get_named(self, key: str) -> tuple[str, bytes]:
+        return key, await self.get(key)
+
+    async def stream(self, keys: Iterable[str]) -> AsyncIterator[tuple[str, bytes]]:
+        """
+        Read many resources concurrently, yielding them as they complete.
+
+        Only a bounded number of reads is scheduled at any time, so keys
+        may be a long (or lazy) iterable. Results arrive in completion
+        order, not in the order given.
+
+        Args:
+            keys: The resource names to read.
+
+        Yields:
+            Tuples of (name, data).
+
+        Raises:
+            KeyError: If a resource is not found. Reads still pending are
+                cancelled.
+        """
+
+        keys = iter(keys)
+        limit = self._max_workers * 2
+        pending: set[asyncio.Future] = set()
+        done: set[asyncio.Future] = set()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < limit:
+                    try:
+                        key = next(keys)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.add(asyncio.ensure_future(self._get_named(key)))
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                while done:
+                    yield done.pop().result()
+        finally:
+            for task in pending:
+                task.cancel()
+            for task in done:
+                # Finished but not yielded; retrieve the outcome so that
+                # asyncio does not log an exception as never retrieved.
+                if not task.cancelled():
+                    task.exception()
+
+    async def read_many(self, keys: Iterable[str]) -> dict[str, bytes]:
+        """
+        Read many resources concurrently.
+
+        Args:
+            keys: The resource names to read.
+
+        Returns:
+            A dict mapping each name to its data, in the order given.
+
+        Raises:
+            KeyError: If any resource is not found.
+        """
+
+        keys = list(keys)
+        result = {name: data async for name, data in self.stream(keys)}
+        return {key: result[key] for key in keys}
+
+    def close(self):
+        """
+        Shut down the internal executor, waiting for pending reads.
+
+        This blocks the calling thread; use aclose() from the event loop.
+        """
+
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+
+    async def aclose(self):
+        """
+        Shut down the internal executor, waiting for pending reads without
+        blocking the event loop.
+        """
+
+        if self._owns_executor:
+            await asyncio.to_thread(self._executor.shutdown, wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
@@ -0,0 +1,193 @@
+"""
+Caching layers for resource containers.
+
+Example:
+
+    >>> from nwn.resman import create as create_resman
+    ... from nwn.rescache import CachedContainer
+    ...
+    ... rm = CachedContainer(create_resman(), max_bytes=256 * 1024 * 1024)
+    ... nss = rm["nwscript.nss"]     # read from the keyfile
+    ... nss = rm["nwscript.nss"]     # served from memory
+    ... print(rm.stats)
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Iterable, Mapping, NamedTuple
+
+from nwn.res import Container
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    """Number of lookups served from the cache."""
+    misses: int
+    """Number of lookups that had to read from the source."""
+    evictions: int
+    """Number of entries dropped to stay within the byte budget."""
+    size: int
+    """Total size of all cached entries, in bytes."""
+    count: int
+    """Number of cached entries."""
+
+
+class CachedContainer(Container):
+    """
+    A read-only container that keeps recently read resources in memory.
+
+    Wraps any resource mapping (a ResMan, a keyfile, an ERF, ...) and caches
+    the data returned from it, up to a total byte budget. When the budget
+    is exceeded, the least recently used entries are evicted. Resources
+    larger than the whole budget are passed through without caching.
+
+    The cache does not notice changes in the source; call invalidate() when
+    the underlying data changes.
+
+    Instances are safe to share between threads.
+
+    Args:
+        source: The mapping to read resources from.
+        max_bytes: The maximum total size of cached data, in bytes.
+    """
+
+    def __init__(self, source: Mapping[str, bytes], max_bytes: int = 64 * 1024 * 1024):
+        if max_bytes < 0:
+            raise ValueError("max_bytes must not be negative")
+        self._source = source
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    @property
+    def source(self) -> Mapping[str, bytes]:
+        """The wrapped resource mapping."""
+        return self._source
+
+    @property
+    def max_bytes(self) -> int:
+        """The configured byte budget."""
+        return self._max_bytes
+
+    @property
+    def stats(self) -> CacheStats:
+        """A snapshot of the cache counters."""
+        with self._lock:
+            return CacheStats(
+                self._hits,
+                self._misses,
+                self._evictions,
+                self._size,
+                len(self._entries),
+            )
+
+    def reset_stats(self):
+        """Reset the hit, miss and eviction counters."""
+        with self._lock:
+            self._hits = self._misses = self._evictions = 0
+
+    def invalidate(self, keys: Iterable[str] | None = None):
+        """
+        Drop cached entries.
+
+        Args:
+            keys: The resource names to drop. If not given, the whole cache
+                is cleared.
+        """
+
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+                self._size = 0
+                return
+            for key in keys:
+                data = self._entries.pop(key.lower(), None)
+                if data is not None:
+                    self._size -= len(data)
+
+    def _get_cached(self, norm: str) -> bytes | None:
+        with self._lock:
+            data = self._entries.get(norm)
+            if data is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(norm)
+            self._hits += 1
+            return data
+
+    def _store(self, norm: str, data: bytes):
+        if len(data) > self._max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(norm, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[norm] = data
+            self._size += len(data)
+            while self._size > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self._evictions += 1
+
+    def __getitem__(self, key: str) -> bytes:
+        norm = key.lower()
+        data = self._get_cached(norm)
+        if data is None:
+            data = bytes(self._source[key])
+            self._store(norm, data)
+        return data
+
+    def read_many(self, filenames: Iterable[str]) -> dict[str, bytes]:
+        """
+        Read many resources at once.
+
+        Cached entries are served from memory; all others are fetched from
+        the source in one batch if it provides read_many().
+
+        Args:
+            filenames: The names of the resources to read.
+
+        Returns:
+            A dict mapping each filename to its contents, in the order given.
+
+        Raises:
+            KeyError: If any resource is not found in the source.
+        """
+
+        filenames = list(filenames)
+        result = {}
+        missing = []
+        for filename in filenames:
+            data = self._get_cached(filename.lower())
+            if data is None:
+                missing.append(filename)
+            else:
+                result[filename] = data
+
+        if missing:
+            if hasattr(self._source, "read_many"):
+                fetched = self._source.read_many(missing)
+            else:
+                fetched = {filename: self._source[filename] for filename in missing}
+            for filename, data in fetched.items():
+                data = bytes(data)
+                self._store(filename.lower(), data)
+                result[filename] = data
+
+        return {filename: result[filename] for filename in filenames}
+
+    def __contains__(self, key) -> bool:
+        return key in self._source
+
+    def __iter__(self):
+        return iter(self._source)
+
+    def __len__(self) -> int:
+        return len(self._source)
+
+    def __repr__(self):
+        return f"CachedContainer({self._source!r}, max_bytes={self._max_bytes})"
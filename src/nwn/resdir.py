@@ -3,18 +3,44 @@ Class and library to deal with NWN resources directories.
 """
 
 import os
+import stat
+import time
 from pathlib import Path
+from typing import Iterable, NamedTuple
 
 from nwn.res import Container, is_valid_resref
 
 
+# Directory mtimes closer than this to the current time are not trusted,
+# since further changes within the same timestamp tick would go unnoticed.
+_RACY_MTIME_NS = 2_000_000_000
+
+
+class Changes(NamedTuple):
+    """The set of resource names that changed during a reindex."""
+
+    added: frozenset[str] = frozenset()
+    removed: frozenset[str] = frozenset()
+    modified: frozenset[str] = frozenset()
+
+    @property
+    def names(self) -> frozenset[str]:
+        """All changed resource names."""
+        return self.added | self.removed | self.modified
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+
 class LocalDirectory(Container):
     """
     A resource directory that reads files from a filesystem directory.
 
     Data is indexed once on initialization; you need to explicitly call
     reindex() to refresh the file list if you change the contents of the
-    directory outside of the LocalDirectory instance.
+    directory outside of the LocalDirectory instance. Reindexing is
+    incremental and cheap when nothing changed. To keep directories inside
+    a ResMan up to date automatically, see nwn.reswatch.Watcher.
 
     Missing/non-existent directories are allowed for reading.
 
@@ -28,29 +54,115 @@ class LocalDirectory(Container):
         path: The filesystem path to the resource directory.
     """
 
-    def reindex(self):
-        self._files = (
-            {
-                f.name.lower(): f
-                for f in self._path.iterdir()
-                if f.is_file() and is_valid_resref(f.name)
-            }
-            if self._path.is_dir()
-            else {}
+    def reindex(self, force: bool = False) -> Changes:
+        """
+        Refresh the file index from disk.
+
+        The directory is only rescanned if its mtime changed since the last
+        scan, which covers files being created, deleted or renamed (including
+        the usual write-to-temp-and-rename saves). Files rewritten in place
+        do not touch the directory mtime; pass force=True to detect those.
+
+        Args:
+            force: Always rescan, even if the directory mtime is unchanged.
+
+        Returns:
+            The resource names that were added, removed or modified.
+        """
+
+        try:
+            st = os.stat(self._path)
+            dir_mtime = st.st_mtime_ns if stat.S_ISDIR(st.st_mode) else None
+        except OSError:
+            dir_mtime = None
+
+        if not force and dir_mtime is not None and dir_mtime == self._dir_mtime:
+            return Changes()
+
+        files: dict[str, Path] = {}
+        stats: dict[str, tuple[int, int, int]] = {}
+        if dir_mtime is not None:
+            with os.scandir(self._path) as it:
+                for entry in it:
+                    # is_file() uses the cached dirent type where available.
+                    if not entry.is_file() or not is_valid_resref(entry.name):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    key = entry.name.lower()
+                    files[key] = Path(entry.path)
+                    stats[key] = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+        old = self._stats
+        changes = Changes(
+            added=frozenset(stats.keys() - old.keys()),
+            removed=frozenset(old.keys() - stats.keys()),
+            modified=frozenset(
+                k for k in stats.keys() & old.keys() if stats[k] != old[k]
+            ),
         )
 
+        self._files = files
+        self._stats = stats
+        if dir_mtime is not None and time.time_ns() - dir_mtime < _RACY_MTIME_NS:
+            dir_mtime = None
+        self._dir_mtime = dir_mtime
+        return changes
+
+    def _record(self, key: str, file_path: Path):
+        st = os.stat(file_path)
+        self._files[key] = file_path
+        self._stats[key] = (st.st_ino, st.st_mtime_ns, st.st_size)
+
     def __init__(self, path: str | Path, writable: bool = False):
         self._path = Path(path)
+        self._files: dict[str, Path] = {}
+        self._stats: dict[str, tuple[int, int, int]] = {}
+        self._dir_mtime: int | None = None
         self.reindex()
         self._writable = writable
         if self._writable:
             self._path.mkdir(parents=True, exist_ok=True)
 
+    @property
+    def filemap(self) -> dict[str, Path]:
+        """
+        Returns a mapping of (lowercase) filenames to their paths on disk.
+        """
+
+        return dict(self._files)
+
     def __getitem__(self, key: str) -> bytes:
         file_path = self._files[key.lower()]
         with open(file_path, "rb") as f:
             return f.read()
 
+    def read_many(self, filenames: Iterable[str]) -> dict[str, bytes]:
+        """
+        Read many files at once.
+
+        Args:
+            filenames: The names of the files to read.
+
+        Returns:
+            A dict mapping each filename to its contents, in the order given.
+
+        Raises:
+            KeyError: If any file is not in the index.
+        """
+        filenames = list(filenames)
+        paths = [self._files[filename.lower()] for filename in filenames]
+        result = {}
+        for filename, path in zip(filenames, paths):
+            with open(path, "rb") as f:
+                result[filename] = f.read()
+        return result
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and key.lower() in self._files
+
     def __iter__(self):
         return iter(self._files)
 
@@ -65,12 +177,13 @@ class LocalDirectory(Container):
         file_path = self._path / key
         with open(file_path, "wb") as f:
             f.write(value)
-        self._files[key.lower()] = file_path
+        self._record(key.lower(), file_path)
 
     def __delitem__(self, key: str):
         if not self._writable:
             raise TypeError("ResDir is read-only")
         file_path = self._files.pop(key.lower())
+        self._stats.pop(key.lower(), None)
         os.remove(file_path)
 
     def __repr__(self):
@@ -0,0 +1,214 @@
+"""
+Content digests for all resources in keyfiles and ERF archives.
+
+Digests are computed in bulk by the archive readers (see
+nwn.key.Reader.digests() and nwn.erf.Reader.digests()), and stored in a
+sidecar file keyed by the size and mtime of the archive (and of all BIFs,
+for keyfiles), so unchanged archives are never hashed twice.
+
+Example:
+
+    >>> from nwn.reshash import digest_archives
+    ...
+    ... digests = digest_archives(["data/nwn_base.key", "hak/myhak.hak"])
+    ... for archive, files in digests.items():
+    ...     for filename, sha1 in files.items():
+    ...         print(archive, filename, sha1.hex())
+"""
+
+import hashlib
+import logging
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+from nwn import erf, key
+from nwn._fileio import atomic_write
+
+_logger = logging.getLogger(__name__)
+
+# Sidecar file layout (all little-endian):
+#   header:  magic, version, file count, entry count
+#   per file (the archive, then any BIFs): size, mtime_ns
+#   per entry: filename length, filename (utf-8), SHA1
+_SIDECAR_MAGIC = b"NWDG"
+_SIDECAR_VERSION = 1
+_SIDECAR_HEADER = struct.Struct("<4sIII")
+_SIDECAR_FILE = struct.Struct("<QQ")
+_SIDECAR_NAME = struct.Struct("<H")
+_SHA1_SIZE = 20
+
+SIDECAR_SUFFIX = ".digests"
+"""Suffix of digest sidecar files."""
+
+
+def sidecar_path(archive: str | Path, cache_dir: str | Path | None = None) -> Path:
+    """
+    Get the path of the digest sidecar for an archive.
+
+    Args:
+        archive: The archive (keyfile or ERF).
+        cache_dir: The directory to keep sidecars in. If not given, the
+            sidecar is placed next to the archive.
+
+    Returns:
+        The sidecar path.
+    """
+
+    archive = Path(archive)
+    if cache_dir is None:
+        return archive.with_name(archive.name + SIDECAR_SUFFIX)
+    # Archives of the same name may live in different directories.
+    tag = hashlib.sha1(str(archive.resolve()).encode("utf-8")).hexdigest()[:8]
+    return Path(cache_dir) / f"{archive.name}.{tag}{SIDECAR_SUFFIX}"
+
+
+def _stat_files(paths: list[Path]) -> list[tuple[int, int]]:
+    result = []
+    for path in paths:
+        st = os.stat(path)
+        result.append((st.st_size, st.st_mtime_ns))
+    return result
+
+
+def _load_sidecar(
+    sidecar: Path, stats: list[tuple[int, int]]
+) -> dict[str, bytes] | None:
+    try:
+        data = sidecar.read_bytes()
+        magic, version, file_count, entry_count = _SIDECAR_HEADER.unpack_from(data)
+        if magic != _SIDECAR_MAGIC or version != _SIDECAR_VERSION:
+            return None
+        pos = _SIDECAR_HEADER.size
+        cached = [
+            _SIDECAR_FILE.unpack_from(data, pos + i * _SIDECAR_FILE.size)
+            for i in range(file_count)
+        ]
+        if cached != stats:
+            return None
+        pos += file_count * _SIDECAR_FILE.size
+        digests = {}
+        for _ in range(entry_count):
+            (length,) = _SIDECAR_NAME.unpack_from(data, pos)
+            pos += _SIDECAR_NAME.size
+            name = data[pos : pos + length].decode("utf-8")
+            pos += length
+            digest = data[pos : pos + _SHA1_SIZE]
+            if len(digest) != _SHA1_SIZE:
+                return None
+            digests[name] = digest
+            pos += _SHA1_SIZE
+        return digests
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def _write_sidecar(
+    sidecar: Path, stats: list[tuple[int, int]], digests: dict[str, bytes]
+):
+    parts = [
+        _SIDECAR_HEADER.pack(_SIDECAR_MAGIC, _SIDECAR_VERSION, len(stats), len(digests))
+    ]
+    parts.extend(_SIDECAR_FILE.pack(*st) for st in stats)
+    for name, digest in digests.items():
+        encoded = name.encode("utf-8")
+        parts.append(_SIDECAR_NAME.pack(len(encoded)))
+        parts.append(encoded)
+        parts.append(digest)
+    try:
+        sidecar.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(sidecar) as tmp:
+            tmp.write(b"".join(parts))
+    except OSError:
+        # Archives in read-only locations can still be hashed.
+        _logger.warning("Could not write digest sidecar %s", sidecar, exc_info=True)
+
+
+def archive_digests(
+    path: str | Path,
+    cache: bool = True,
+    cache_dir: str | Path | None = None,
+    workers: int | None = None,
+) -> dict[str, bytes]:
+    """
+    Get the SHA1 digest of every resource in a keyfile or ERF archive.
+
+    Files ending in .key are opened as keyfiles, everything else as ERF.
+
+    Args:
+        path: The archive to hash.
+        cache: Load digests from the sidecar if it is up to date, and
+            (re)write it otherwise.
+        cache_dir: The directory to keep sidecars in, see sidecar_path().
+        workers: The number of hashing threads; defaults to the
+            ThreadPoolExecutor default.
+
+    Returns:
+        A dict mapping each filename to its raw SHA1 digest.
+
+    Raises:
+        ValueError: If the archive is not valid.
+        FileNotFoundError: If the archive or a BIF file is not found.
+    """
+
+    path = Path(path)
+    sidecar = sidecar_path(path, cache_dir)
+    if path.suffix.lower() == ".key":
+        # Lazy, so that a valid sidecar saves opening the BIFs at all.
+        with key.Reader(path, use_mmap=True, lazy=True) as reader:
+            files = [path, *reader.bif_files]
+            stats = _stat_files(files)
+            digests = _load_sidecar(sidecar, stats) if cache else None
+            if digests is not None:
+                return digests
+            digests = reader.digests(workers=workers)
+    else:
+        files = [path]
+        stats = _stat_files(files)
+        digests = _load_sidecar(sidecar, stats) if cache else None
+        if digests is not None:
+            return digests
+        with open(path, "rb") as file:
+            digests = erf.Reader(file).digests(workers=workers)
+
+    # Do not record digests for files that changed while being hashed.
+    if cache and _stat_files(files) == stats:
+        _write_sidecar(sidecar, stats, digests)
+    return digests
+
+
+def digest_archives(
+    paths: Iterable[str | Path],
+    cache: bool = True,
+    cache_dir: str | Path | None = None,
+    workers: int | None = None,
+) -> dict[Path, dict[str, bytes]]:
+    """
+    Get the digests of many archives, hashing them in parallel.
+
+    Args:
+        paths: The archives to hash.
+        cache: Use and update digest sidecars, see archive_digests().
+        cache_dir: The directory to keep sidecars in, see sidecar_path().
+        workers: The number of archives hashed at once; defaults to the
+            ThreadPoolExecutor default.
+
+    Returns:
+        A dict mapping each archive path to the digests of its resources,
+        in the order given.
+
+    Raises:
+        ValueError: If an archive is not valid.
+        FileNotFoundError: If an archive or a BIF file is not found.
+    """
+
+    paths = [Path(p) for p in paths]
+    # A single archive gets the whole pool for its resources instead.
+    inner = workers if len(paths) == 1 else 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        jobs = [
+            pool.submit(archive_digests, p, cache, cache_dir, inner) for p in paths
+        ]
+        return {p: job.result() for p, job in zip(paths, jobs)}
@@ -26,9 +26,20 @@ Example:
 
 """
 
+import io
+import time
+import threading
 from collections import ChainMap
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+from pathlib import Path
+from typing import Any, Callable, Iterable, Mapping, NamedTuple, TextIO
+
+from nwn import gff, twoda, tlk, ssf
 
 from nwn.environ import (
+    get_codepage,
     get_install_directory,
     get_install_language_directory,
     get_user_directory,
@@ -36,18 +47,606 @@ from nwn.environ import (
     Alias,
 )
 from nwn.res import Container
+from nwn.types import FileMagic, Language
 from nwn.resdir import LocalDirectory
 from nwn.key import Reader as Key
+from nwn.erf import Reader as Erf
+
+
+@dataclass
+class LayerStats:
+    """Lookup counters for a single ResMan layer."""
+
+    served: int = 0
+    """Lookups answered by this layer."""
+    missed: int = 0
+    """Lookups that passed this layer because it did not have the resource."""
+    bytes_read: int = 0
+    """Total size of the data returned by this layer."""
+    time: float = 0.0
+    """Total time spent reading from this layer, in seconds."""
+
+
+def _identity(value):
+    return value
+
+
+def _read_only(*_args, **_kwargs):
+    raise TypeError("Cached GFF data is read-only; use get_gff(..., copy=True)")
+
+
+class _FrozenStruct(gff.Struct):
+    """A read-only Struct, as returned by ResMan.get_gff()."""
+
+    __setitem__ = __delitem__ = __setattr__ = __delattr__ = __ior__ = _read_only
+    pop = popitem = setdefault = update = clear = _read_only
+
+    def __deepcopy__(self, memo):
+        return _thaw(self)
+
+    def __reduce_ex__(self, protocol):
+        # Copies and pickles are modifiable.
+        return _identity, (_thaw(self),)
+
+
+class _FrozenList(gff.List):
+    """A read-only List, as returned by ResMan.get_gff()."""
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = remove = pop = clear = sort = reverse = _read_only
+
+    def __deepcopy__(self, memo):
+        return _thaw(self)
+
+    def __reduce_ex__(self, protocol):
+        # Copies and pickles are modifiable.
+        return _identity, (_thaw(self),)
+
+
+class _FrozenLocString(gff.CExoLocString):
+    """A read-only CExoLocString, as returned by ResMan.get_gff()."""
+
+    def __init__(self, value: gff.CExoLocString):
+        object.__setattr__(self, "strref", value.strref)
+        object.__setattr__(self, "entries", MappingProxyType(dict(value.entries)))
+
+    __setattr__ = __delattr__ = _read_only
+
+    def __eq__(self, other):
+        if not isinstance(other, gff.CExoLocString):
+            return NotImplemented
+        return (self.strref, dict(self.entries)) == (other.strref, dict(other.entries))
+
+    def __deepcopy__(self, memo):
+        return _thaw(self)
+
+    def __reduce_ex__(self, protocol):
+        # Copies and pickles are modifiable.
+        return _identity, (_thaw(self),)
+
+
+def _freeze(value):
+    if isinstance(value, gff.Struct):
+        return _FrozenStruct(
+            value.struct_id, **{k: _freeze(v) for k, v in value.items()}
+        )
+    if isinstance(value, gff.List):
+        return _FrozenList([_freeze(v) for v in value])
+    if isinstance(value, gff.CExoLocString):
+        return _FrozenLocString(value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, gff.Struct):
+        return gff.Struct(value.struct_id, **{k: _thaw(v) for k, v in value.items()})
+    if isinstance(value, gff.List):
+        return gff.List([_thaw(v) for v in value])
+    if isinstance(value, gff.CExoLocString):
+        return gff.CExoLocString(value.strref, dict(value.entries))
+    return value
 
 
 class ResMan(ChainMap[str, bytes]):
     """
     A resource manager that chains multiple resource mappings together.
 
-    This is currently a type alias for ChainMap[str, bytes] to indicate its
-    intended use, but may be extended in the future; so make sure to use
-    this type for foward compatibility.
+    This is a ChainMap[str, bytes] that keeps a merged index from the
+    normalized (lowercase) resource name to the layer that owns it, so
+    lookups, membership tests and iteration do not probe each layer in turn.
+    Iteration yields normalized names.
+
+    The index is built on first use and kept up to date for writes made
+    through the ResMan itself. If you modify a layer directly, or change
+    the maps list, call invalidate() afterwards.
+
+    The get_gff(), get_2da(), get_tlk() and get_ssf() helpers memoize the
+    parsed representation of resources; these caches are dropped together
+    with the index on invalidate(). Cached GFF trees are shared, so they
+    are returned read-only unless a copy is requested.
+
+    Per-layer instrumentation can be enabled with instrument(); see stats()
+    and shadowed() for diagnosing which layer answers a lookup.
+
+    start_trace() and stop_trace() record which resources were read, for
+    replaying them later with prefetch().
+
+    invalidate() may be called from another thread (see nwn.reswatch):
+    iteration runs over a snapshot of the index, and parsed resources
+    read before an invalidation are not cached.
+    """
+
+    def __init__(self, *maps: Mapping[str, bytes]):
+        super().__init__(*maps)
+        self._index: dict[str, tuple[Mapping[str, bytes], str]] | None = None
+        self._decoded: dict[str, dict[str, Any]] = {}
+        # Guards changes to the index and decoded caches; the generation
+        # counts invalidations.
+        self._index_lock = threading.Lock()
+        self._generation = 0
+        self._stats: dict[int, LayerStats] | None = None
+        self._stats_lock = threading.Lock()
+        self._trace: dict[str, None] | None = None
+
+    def _get_index(self) -> dict[str, tuple[Mapping[str, bytes], str]]:
+        index = self._index
+        if index is None:
+            with self._index_lock:
+                index = self._index
+                if index is None:
+                    index = {}
+                    # Walk from lowest to highest precedence, so higher
+                    # layers win.
+                    for layer in reversed(self.maps):
+                        for key in layer:
+                            index[key.lower()] = (layer, key)
+                    self._index = index
+        return index
+
+    def _resolve(self, key: str) -> tuple[Mapping[str, bytes], str] | None:
+        for layer in self.maps:
+            if key in layer:
+                return (layer, key)
+        return None
+
+    def _lookup(self, key) -> tuple[Mapping[str, bytes], str] | None:
+        if not isinstance(key, str):
+            return None
+        return self._get_index().get(key.lower())
+
+    def invalidate(self, keys: Iterable[str] | None = None):
+        """
+        Invalidate the lookup index after layers were changed directly.
+
+        Args:
+            keys: The resource names that changed. If not given, the whole
+                index is rebuilt on next use.
+        """
+
+        keys = None if keys is None else list(keys)
+        with self._index_lock:
+            self._generation += 1
+            if keys is None:
+                self._index = None
+                self._decoded = {}
+                return
+            for cache in self._decoded.values():
+                for key in keys:
+                    cache.pop(key.lower(), None)
+            if self._index is None:
+                return
+            for key in keys:
+                owner = self._resolve(key)
+                if owner is None:
+                    self._index.pop(key.lower(), None)
+                else:
+                    self._index[key.lower()] = owner
+
+    def instrument(self, enabled: bool = True):
+        """
+        Enable or disable per-layer instrumentation.
+
+        While enabled, every lookup records which layer served it, which
+        layers above it missed, how many bytes were read and how long the
+        read took. Enabling resets all counters.
+
+        Args:
+            enabled: Whether to record statistics.
+        """
+
+        self._stats = {} if enabled else None
+
+    def stats(self) -> list[tuple[Mapping[str, bytes], LayerStats]]:
+        """
+        Get the recorded per-layer statistics.
+
+        Returns:
+            A list of (layer, stats) in precedence order; empty if
+            instrumentation is disabled.
+        """
+
+        if self._stats is None:
+            return []
+        with self._stats_lock:
+            return [
+                (layer, replace(self._stats.get(id(layer), LayerStats())))
+                for layer in self.maps
+            ]
+
+    def _layer_stats(self, layer) -> LayerStats:
+        # Caller holds _stats_lock.
+        st = self._stats.get(id(layer))
+        if st is None:
+            st = self._stats[id(layer)] = LayerStats()
+        return st
+
+    def _record(self, owner_layer, count: int, nbytes: int, elapsed: float):
+        with self._stats_lock:
+            if self._stats is None:
+                return
+            for layer in self.maps:
+                if layer is owner_layer:
+                    break
+                self._layer_stats(layer).missed += count
+            if owner_layer is not None:
+                st = self._layer_stats(owner_layer)
+                st.served += count
+                st.bytes_read += nbytes
+                st.time += elapsed
+
+    def start_trace(self):
+        """
+        Start recording the resources read through this ResMan.
+
+        Restarts recording if a trace is already running.
+        """
+
+        self._trace = {}
+
+    def stop_trace(self) -> list[str]:
+        """
+        Stop recording and return the trace.
+
+        Returns:
+            The normalized names of all resources read since start_trace(),
+            in order of first access.
+        """
+
+        trace, self._trace = self._trace, None
+        return list(trace or ())
+
+    def _fetch(self, owner: tuple[Mapping[str, bytes], str]) -> bytes:
+        layer, layer_key = owner
+        if self._trace is not None:
+            self._trace[layer_key.lower()] = None
+        if self._stats is None:
+            return layer[layer_key]
+        start = time.perf_counter()
+        data = layer[layer_key]
+        self._record(layer, 1, len(data), time.perf_counter() - start)
+        return data
+
+    def shadowed(self) -> dict[str, list[Mapping[str, bytes]]]:
+        """
+        Report resources that exist in more than one layer.
+
+        This only looks at the layer indexes and does not read any data.
+
+        Returns:
+            A dict mapping each normalized resource name that is present in
+            several layers to those layers, in precedence order. The first
+            layer is the one that answers lookups.
+        """
+
+        owners: dict[str, list[Mapping[str, bytes]]] = {}
+        for layer in self.maps:
+            for key in layer:
+                owners.setdefault(key.lower(), []).append(layer)
+        return {k: v for k, v in owners.items() if len(v) > 1}
+
+    def __getitem__(self, key: str) -> bytes:
+        owner = self._lookup(key)
+        if owner is None:
+            if self._stats is not None:
+                self._record(None, 1, 0, 0.0)
+            return self.__missing__(key)
+        return self._fetch(owner)
+
+    def get(self, key, default=None):
+        owner = self._lookup(key)
+        if owner is None:
+            if self._stats is not None:
+                self._record(None, 1, 0, 0.0)
+            return default
+        return self._fetch(owner)
+
+    def __contains__(self, key) -> bool:
+        return self._lookup(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._get_index())
+
+    def __iter__(self):
+        index = self._get_index()
+        with self._index_lock:
+            return iter(list(index))
+
+    def __bool__(self) -> bool:
+        return bool(self._get_index())
+
+    def __setitem__(self, key: str, value: bytes):
+        super().__setitem__(key, value)
+        with self._index_lock:
+            self._generation += 1
+            for cache in self._decoded.values():
+                cache.pop(key.lower(), None)
+            if self._index is not None:
+                self._index[key.lower()] = (self.maps[0], key)
+
+    def __delitem__(self, key: str):
+        super().__delitem__(key)
+        self.invalidate([key])
+
+    def pop(self, key, *args):
+        owned = key in self.maps[0]
+        value = super().pop(key, *args)
+        if owned:
+            self.invalidate([key])
+        return value
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.invalidate([key])
+        return key, value
+
+    def clear(self):
+        super().clear()
+        self.invalidate()
+
+    def _get_decoded(self, kind: str, key: str, parse: Callable[[bytes], Any]):
+        norm = key.lower()
+        with self._index_lock:
+            generation = self._generation
+            try:
+                return self._decoded[kind][norm]
+            except KeyError:
+                pass
+        value = parse(self[key])
+        with self._index_lock:
+            # Drop values read before an invalidation; they may be stale.
+            if self._generation == generation:
+                self._decoded.setdefault(kind, {})[norm] = value
+        return value
+
+    def get_gff(self, key: str, copy: bool = False) -> tuple[gff.Struct, FileMagic]:
+        """
+        Read and parse a GFF resource, memoizing the result.
+
+        By default, the cached tree itself is returned, so repeated lookups
+        cost nothing. It is read-only: structs, lists and localized strings
+        raise TypeError on modification. copy.deepcopy() of it (or of any
+        part of it) gives a modifiable copy.
+
+        Args:
+            key: The resource name, e.g. "module.ifo".
+            copy: Return a modifiable copy of the cached tree instead. The
+                copy is built on every call, which for large files costs a
+                sizeable fraction of parsing them again, so only use it
+                when you need to modify the result.
+
+        Returns:
+            A tuple of the root struct and the file type, as gff.read().
+
+        Raises:
+            KeyError: If the resource is not found.
+            ValueError: If the resource is not valid GFF data.
+        """
+
+        def parse(data: bytes):
+            root, file_type = gff.read(io.BytesIO(data))
+            return _freeze(root), file_type
+
+        root, file_type = self._get_decoded("gff", key, parse)
+        return (_thaw(root) if copy else root), file_type
+
+    def get_2da(self, key: str) -> tuple[Mapping[str, twoda.CELL], ...]:
+        """
+        Read and parse a 2DA resource, memoizing the result.
+
+        Args:
+            key: The resource name, e.g. "baseitems.2da".
+
+        Returns:
+            A tuple of read-only rows, indexed by row number. Each row maps
+            column names to cell values.
+
+        Raises:
+            KeyError: If the resource is not found.
+            ValueError: If the resource is not a valid 2DA file.
+        """
+
+        def parse(data: bytes):
+            text = io.StringIO(data.decode(get_codepage()))
+            return tuple(MappingProxyType(row) for row in twoda.read(text))
+
+        return self._get_decoded("2da", key, parse)
+
+    def get_tlk(self, key: str) -> tuple[tuple[tlk.Entry, ...], Language]:
+        """
+        Read and parse a TLK resource, memoizing the result.
+
+        Args:
+            key: The resource name, e.g. "dialog.tlk".
+
+        Returns:
+            A tuple of the (immutable) entries and the language.
+
+        Raises:
+            KeyError: If the resource is not found.
+            ValueError: If the resource is not a valid TLK file.
+        """
+
+        def parse(data: bytes):
+            entries, language = tlk.read(io.BytesIO(data))
+            return tuple(entries), language
+
+        return self._get_decoded("tlk", key, parse)
+
+    def get_ssf(self, key: str) -> tuple[ssf.Entry, ...]:
+        """
+        Read and parse a SSF resource, memoizing the result.
+
+        Args:
+            key: The resource name, e.g. "c_cat.ssf".
+
+        Returns:
+            A tuple of the soundset entries.
+
+        Raises:
+            KeyError: If the resource is not found.
+            ValueError: If the resource is not a valid SSF file.
+        """
+
+        return self._get_decoded(
+            "ssf", key, lambda data: tuple(ssf.read(io.BytesIO(data)))
+        )
+
+    def read_many(self, filenames: Iterable[str]) -> dict[str, bytes]:
+        """
+        Read many resources at once.
+
+        Each filename is routed to the layer that would answer a plain
+        lookup. Layers that provide their own read_many() (keyfiles, ERFs,
+        directories) receive all their requests in a single batch.
+
+        Args:
+            filenames: The names of the resources to read.
+
+        Returns:
+            A dict mapping each filename to its contents, in the order given.
+
+        Raises:
+            KeyError: If any resource is not found in any layer.
+        """
+
+        filenames = list(filenames)
+        if self._trace is not None:
+            self._trace.update((filename.lower(), None) for filename in filenames)
+        by_layer: dict[int, tuple[Mapping[str, bytes], list[tuple[str, str]]]] = {}
+        for filename in filenames:
+            owner = self._lookup(filename)
+            if owner is None:
+                raise KeyError(filename)
+            layer, layer_key = owner
+            by_layer.setdefault(id(layer), (layer, []))[1].append(
+                (filename, layer_key)
+            )
+
+        result = {}
+        for layer, names in by_layer.values():
+            start = time.perf_counter()
+            if hasattr(layer, "read_many"):
+                data = layer.read_many([layer_key for _, layer_key in names])
+                batch = {fn: data[layer_key] for fn, layer_key in names}
+            else:
+                batch = {fn: layer[layer_key] for fn, layer_key in names}
+            if self._stats is not None:
+                self._record(
+                    layer,
+                    len(names),
+                    sum(len(d) for d in batch.values()),
+                    time.perf_counter() - start,
+                )
+            result.update(batch)
+        return {filename: result[filename] for filename in filenames}
+
+
+def write_trace(file: TextIO, names: Iterable[str]):
+    """
+    Write a resource trace (as returned by ResMan.stop_trace()) to a file.
+
+    Args:
+        file: A text file to write to; one name is written per line.
+        names: The resource names to write.
+    """
+
+    for name in names:
+        file.write(name + "\n")
+
+
+def read_trace(file: TextIO) -> list[str]:
+    """
+    Read a resource trace written by write_trace().
+
+    Args:
+        file: A text file to read from.
+
+    Returns:
+        The resource names, in order.
+    """
+
+    return [ln.strip() for ln in file if ln.strip()]
+
+
+def prefetch(
+    source: Mapping[str, bytes],
+    names: Iterable[str],
+    workers: int = 4,
+    chunk_size: int = 64,
+) -> Future:
     """
+    Read the given resources in the background to warm up caches.
+
+    Reading through a ResMan warms the OS page cache; reading through a
+    CachedContainer (see nwn.rescache) additionally fills the in-process
+    cache. Names not present in source are skipped, so stale traces are
+    harmless.
+
+    Example:
+
+        >>> rm = create()
+        ... cache = CachedContainer(rm)
+        ... with open("module.trace") as f:
+        ...     warmup = prefetch(cache, read_trace(f))
+        ... ...                  # start up; reads hit the warm cache
+        ... warmup.result()      # optionally wait for completion
+
+    Args:
+        source: The mapping to read from.
+        names: The resource names to read, in priority order.
+        workers: Number of worker threads.
+        chunk_size: Number of resources handed to a worker at once; chunks
+            are read with read_many() if the source supports it.
+
+    Returns:
+        A Future that resolves to the number of resources read.
+    """
+
+    names = [name for name in names if name in source]
+    chunks = [names[i : i + chunk_size] for i in range(0, len(names), chunk_size)]
+
+    def read_chunk(chunk: list[str]) -> int:
+        if hasattr(source, "read_many"):
+            source.read_many(chunk)
+        else:
+            for name in chunk:
+                _ = source[name]
+        return len(chunk)
+
+    future: Future = Future()
+    future.set_running_or_notify_cancel()
+
+    def run():
+        try:
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="nwn-prefetch"
+            ) as pool:
+                future.set_result(sum(pool.map(read_chunk, chunks)))
+        except BaseException as e:  # pylint: disable=broad-exception-caught
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="nwn-prefetch", daemon=True).start()
+    return future
 
 
 def create(*maps: Container, include_user: bool = True) -> ResMan:
@@ -118,3 +717,133 @@ def create(*maps: Container, include_user: bool = True) -> ResMan:
         Key(dataroot / "nwn_base.key"),
     ]
     return ResMan(*[s for s in stack if s is not None])
+
+
+class ModuleStack(NamedTuple):
+    """The result of create_for_module()."""
+
+    resman: ResMan
+    """The ResMan with module, haks and base game data."""
+    ifo: gff.Struct
+    """The parsed module.ifo root struct."""
+    haks: list[Erf]
+    """The opened haks, in precedence order."""
+    custom_tlk: Path | None
+    """Path to the custom TLK file, if the module uses one."""
+    timings: dict[Path, float]
+    """Seconds spent opening and indexing each archive."""
+
+
+def _alias_directories(include_user: bool, *aliases: Alias) -> list[Path]:
+    dirs = []
+    for alias in aliases:
+        if not include_user and not alias.name.endswith("INSTALL"):
+            continue
+        try:
+            dirs.append(resolve_alias(alias))
+        except FileNotFoundError:
+            pass
+    return dirs
+
+
+def _find_file(name: str, directories: list[Path]) -> Path:
+    for directory in directories:
+        candidate = directory / name
+        if candidate.is_file():
+            return candidate
+        # Module files often disagree with the on-disk case of hak names.
+        if directory.is_dir():
+            for entry in directory.iterdir():
+                if entry.name.lower() == name.lower() and entry.is_file():
+                    return entry
+    raise FileNotFoundError(f"{name} not found in {', '.join(map(str, directories))}")
+
+
+def create_for_module(
+    path: str | Path,
+    *maps: Container,
+    include_user: bool = True,
+    hak_directories: list[Path] | None = None,
+    tlk_directories: list[Path] | None = None,
+    workers: int | None = None,
+) -> ModuleStack:
+    """
+    Create a resman for running a module: the module archive, all haks
+    listed in its module.ifo, and the default stack from create().
+
+    Haks are opened and indexed concurrently. The resulting precedence is:
+    maps, haks (in Mod_HakList order), the module itself, then everything
+    create() adds (user directories and keyfiles).
+
+    Example:
+
+        >>> stack = create_for_module("mymodule.mod")
+        ... print(stack.timings)
+        ... utc = stack.resman["mycreature.utc"]
+
+    Args:
+        path: Path to the module file (.mod).
+        maps: Additional resource maps with the highest precedence.
+        include_user: Whether to include the user directory aliases, both
+            in the stack and when looking for haks and TLKs.
+        hak_directories: Directories to search for haks. Defaults to the
+            user and install hak aliases.
+        tlk_directories: Directories to search for the custom TLK. Defaults
+            to the user and install tlk aliases.
+        workers: Number of threads used to open haks.
+
+    Returns:
+        A ModuleStack with the ResMan, the module.ifo struct, the opened
+        haks, the custom TLK path and per-archive timings.
+
+    Raises:
+        FileNotFoundError: If the module, a hak or the custom TLK cannot be
+            found.
+        ValueError: If the module or a hak is not a valid ERF.
+    """
+
+    path = Path(path)
+    if hak_directories is None:
+        hak_directories = _alias_directories(
+            include_user, Alias.HAK, Alias.HAKINSTALL
+        )
+    if tlk_directories is None:
+        tlk_directories = _alias_directories(
+            include_user, Alias.TLK, Alias.TLKINSTALL
+        )
+
+    def open_archive(archive_path: Path) -> tuple[Erf, float]:
+        start = time.perf_counter()
+        archive = Erf(archive_path)
+        return archive, time.perf_counter() - start
+
+    timings: dict[Path, float] = {}
+    module, timings[path] = open_archive(path)
+    ifo, _ = gff.read(io.BytesIO(module["module.ifo"]))
+
+    hak_names = [str(entry["Mod_Hak"]) for entry in ifo.get("Mod_HakList", [])]
+    if not hak_names and ifo.get("Mod_Hak"):
+        # Pre-HotU modules only have a single hak field.
+        hak_names = [str(ifo["Mod_Hak"])]
+    hak_paths = [_find_file(f"{name}.hak", hak_directories) for name in hak_names]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        opened = list(pool.map(open_archive, hak_paths))
+    haks = []
+    for hak_path, (hak, elapsed) in zip(hak_paths, opened):
+        haks.append(hak)
+        timings[hak_path] = elapsed
+
+    custom_tlk = None
+    if tlk_name := str(ifo.get("Mod_CustomTlk", "")):
+        custom_tlk = _find_file(
+            f"{tlk_name.removesuffix('.tlk')}.tlk", tlk_directories
+        )
+
+    return ModuleStack(
+        resman=create(*maps, *haks, module, include_user=include_user),
+        ifo=ifo,
+        haks=haks,
+        custom_tlk=custom_tlk,
+        timings=timings,
+    )
@@ -0,0 +1,167 @@
+"""
+Share archive indexes between processes.
+
+Keyfile and ERF readers can export their index as a single blob and attach
+to such a blob in place (see the shared_index argument of nwn.key.Reader
+and nwn.erf.Reader). This module publishes blobs in shared memory or in a
+file mapped by every process, so N worker processes hold one copy of the
+base game and hak indexes instead of N.
+
+Example:
+
+    >>> from concurrent.futures import ProcessPoolExecutor
+    ... from nwn import key
+    ... from nwn.resshare import SharedIndex
+    ...
+    ... def init(name):
+    ...     global reader
+    ...     shared = SharedIndex.attach(name)
+    ...     reader = key.Reader("nwn_base.key", shared_index=shared.buffer)
+    ...
+    ... with key.Reader("nwn_base.key") as rd, SharedIndex.publish(rd) as shared:
+    ...     with ProcessPoolExecutor(8, initializer=init, initargs=(shared.name,)):
+    ...         ...
+"""
+
+import mmap
+import os
+import sys
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Protocol
+
+from ._fileio import atomic_write
+
+# Whether attaching to shared memory registers it with the resource tracker.
+_TRACKED = os.name == "posix" and sys.version_info < (3, 13)
+
+
+class Exportable(Protocol):
+    """A reader that can serialize its index, like nwn.key.Reader."""
+
+    def export_index(self) -> bytes: ...
+
+
+class SharedIndex:
+    """
+    An exported archive index in shared memory.
+
+    Create one with publish() in the parent process and pass its name to
+    workers, which attach() to it. The publishing side owns the memory and
+    removes it when closed; attached handles only detach.
+
+    Readers hold views into the shared memory. Keep the SharedIndex open
+    for as long as readers attached to it are in use.
+    """
+
+    def __init__(self, shm: SharedMemory, owner: bool):
+        self._shm = shm
+        self._owner = owner
+
+    @classmethod
+    def publish(cls, reader: Exportable) -> "SharedIndex":
+        """
+        Export the index of a reader into a new shared memory block.
+
+        Args:
+            reader: The reader whose index to share.
+
+        Returns:
+            The owning handle.
+        """
+
+        data = reader.export_index()
+        shm = SharedMemory(create=True, size=len(data))
+        shm.buf[: len(data)] = data
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedIndex":
+        """
+        Attach to an index published by another process.
+
+        Args:
+            name: The name of the shared memory block.
+
+        Returns:
+            A non-owning handle.
+
+        Raises:
+            FileNotFoundError: If no such block exists.
+        """
+
+        if sys.version_info >= (3, 13):
+            return cls(SharedMemory(name=name, track=False), owner=False)
+        shm = SharedMemory(name=name)
+        if _TRACKED:
+            # Before 3.13, attaching registers the block with the resource
+            # tracker of this process, which would remove it on exit.
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    @property
+    def name(self) -> str:
+        """The name to pass to attach()."""
+        return self._shm.name
+
+    @property
+    def buffer(self) -> memoryview:
+        """The shared memory, for the shared_index argument of readers."""
+        return self._shm.buf
+
+    def close(self):
+        """
+        Detach from the shared memory, and remove it if this handle owns it.
+
+        Raises:
+            BufferError: If readers still hold views into the memory.
+        """
+
+        self._shm.close()
+        if self._owner:
+            if _TRACKED:
+                # An attach() in a process sharing our resource tracker may
+                # have dropped the registration that unlink() removes.
+                resource_tracker.register(self._shm._name, "shared_memory")
+            self._shm.unlink()
+            self._owner = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def save_index(reader: Exportable, path: str | Path):
+    """
+    Export the index of a reader to a file, for use with map_index().
+
+    The file is replaced atomically, so processes that mapped an older
+    version keep a consistent view.
+
+    Args:
+        reader: The reader whose index to save.
+        path: The file to write.
+    """
+
+    with atomic_write(path) as tmp:
+        tmp.write(reader.export_index())
+
+
+def map_index(path: str | Path) -> mmap.mmap:
+    """
+    Map an index file written by save_index() read-only into memory.
+
+    All processes mapping the same file share its pages.
+
+    Args:
+        path: The file to map.
+
+    Returns:
+        The mapping, for the shared_index argument of readers.
+    """
+
+    with open(path, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
@@ -0,0 +1,155 @@
+"""
+Watch LocalDirectory layers of a ResMan for changes on disk.
+
+The watcher polls each directory layer via LocalDirectory.reindex(), keeps
+the ResMan index in sync and notifies subscribers about what changed.
+
+Example:
+
+    >>> from nwn.resman import create as create_resman
+    ... from nwn.rescache import CachedContainer
+    ... from nwn.reswatch import Watcher
+    ...
+    ... rm = create_resman()
+    ... cache = CachedContainer(rm)
+    ... with Watcher(rm, interval=0.5) as watcher:
+    ...     watcher.subscribe(lambda layer, changes: cache.invalidate(changes.names))
+    ...     ...  # serve from cache; edits in override/ are picked up
+"""
+
+import logging
+import threading
+from typing import Callable
+
+from nwn.resdir import Changes, LocalDirectory
+from nwn.resman import ResMan
+
+_logger = logging.getLogger(__name__)
+
+Subscriber = Callable[[LocalDirectory, Changes], None]
+"""Callback invoked with the changed layer and its Changes."""
+
+
+class Watcher:
+    """
+    Polls the LocalDirectory layers of a ResMan and applies changes.
+
+    On every poll, each directory layer is reindexed; if anything changed,
+    the affected names are invalidated in the ResMan (index and parsed
+    object caches), and all subscribers are called with the layer and the
+    Changes.
+
+    Polling can be driven manually with poll(), or in a background thread
+    with start()/stop() or by using the watcher as a context manager.
+
+    Args:
+        resman: The ResMan whose directory layers to watch. Layers are
+            looked up on every poll, so changes to resman.maps are honoured.
+        interval: Seconds between polls in the background thread.
+        force: Rescan directories and stat every file on each poll, even if
+            the directory mtime did not change. This picks up files
+            overwritten in place (such as "cp new.2da override/"), which do
+            not touch the directory mtime. Pass False to only rescan
+            directories whose mtime changed; that is cheaper for large
+            directories, but misses such edits.
+    """
+
+    def __init__(self, resman: ResMan, interval: float = 1.0, force: bool = True):
+        self._resman = resman
+        self._interval = interval
+        self._force = force
+        self._subscribers: list[Subscriber] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def subscribe(self, callback: Subscriber) -> Callable[[], None]:
+        """
+        Register a callback for change events.
+
+        Callbacks are invoked from the polling thread, after the ResMan has
+        been updated.
+
+        Args:
+            callback: Called with (layer, changes) for every changed layer.
+
+        Returns:
+            A function that removes the subscription again.
+        """
+
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def poll(self) -> list[tuple[LocalDirectory, Changes]]:
+        """
+        Check all directory layers once and apply changes.
+
+        Returns:
+            A list of (layer, changes) for every layer that changed.
+        """
+
+        changed = []
+        with self._lock:
+            for layer in list(self._resman.maps):
+                if not isinstance(layer, LocalDirectory):
+                    continue
+                changes = layer.reindex(force=self._force)
+                if changes:
+                    self._resman.invalidate(changes.names)
+                    changed.append((layer, changes))
+            subscribers = list(self._subscribers)
+
+        for layer, changes in changed:
+            for callback in subscribers:
+                callback(layer, changes)
+        return changed
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                self.poll()
+            except Exception:  # pylint: disable=broad-exception-caught
+                _logger.exception("Error while polling resource directories")
+
+    @property
+    def running(self) -> bool:
+        """Whether the background thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Start polling in a background (daemon) thread.
+
+        Raises:
+            RuntimeError: If the watcher is already running.
+        """
+
+        if self.running:
+            raise RuntimeError("Watcher is already running")
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="nwn-reswatch", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and wait for it to finish."""
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
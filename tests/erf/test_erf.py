@@ -1,8 +1,15 @@
 from io import BytesIO
 from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+import gzip
 import hashlib
+import os
+import stat
 
-from nwn.erf import Reader, Writer
+import pytest
+
+from nwn import erf
+from nwn.erf import Reader, Writer, Updater, diff, pack_directory
 from nwn.types import GenderedLanguage
 from nwn.types import Gender, Language
 
@@ -57,3 +64,348 @@ def test_write_read():
     assert reader.localized_strings[english_male] == "Test."
     assert reader.read_file("test.txt") == payload
     assert reader.file_type == b"HI  "
+
+
+def test_concurrent_reads():
+    reader = Reader("tests/erf/test.hak")
+    expect = {fn: reader.read_file(fn) for fn in reader.filenames}
+    names = reader.filenames * 200
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(reader.read_file, names))
+    assert results == [expect[fn] for fn in names]
+
+
+def test_concurrent_reads_bytesio():
+    payloads = {f"file{i}.txt": bytes([i]) * (i + 1) for i in range(32)}
+    file = BytesIO()
+    with Writer(file) as w:
+        for fn, data in payloads.items():
+            w.add_file_data(fn, data)
+    reader = Reader(BytesIO(file.getvalue()))
+    names = list(payloads) * 50
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(reader.read_file, names))
+    assert results == [payloads[fn] for fn in names]
+
+
+def test_gzip_stream(tmp_path):
+    # GzipFile reports the descriptor of the compressed file underneath.
+    with open("tests/erf/test.hak", "rb") as f:
+        expect = Reader(f)
+        payloads = {fn: expect[fn] for fn in expect}
+    path = tmp_path / "test.hak.gz"
+    with gzip.open(path, "wb") as f:
+        with open("tests/erf/test.hak", "rb") as src:
+            f.write(src.read())
+
+    with gzip.open(path, "rb") as f:
+        reader = Reader(f)
+        assert {fn: reader[fn] for fn in reader} == payloads
+        assert reader.digests() == {
+            fn: hashlib.sha1(data).digest() for fn, data in payloads.items()
+        }
+
+    out = tmp_path / "out.hak"
+    with open(out, "wb") as file, Writer(file) as w, gzip.open(path, "rb") as src:
+        w.add_file_stream("test.txt", src)
+    with open("tests/erf/test.hak", "rb") as f:
+        assert Reader(out)["test.txt"] == f.read()
+
+
+def test_read_many():
+    payloads = {f"file{i}.txt": bytes([i]) * (i + 1) for i in range(16)}
+    file = BytesIO()
+    with Writer(file) as w:
+        for fn, data in payloads.items():
+            w.add_file_data(fn, data)
+    reader = Reader(BytesIO(file.getvalue()))
+    names = ["FILE3.txt", "file1.txt", "file2.txt", "file15.txt"]
+    result = reader.read_many(names)
+    assert list(result) == names
+    assert result == {fn: payloads[fn.lower()] for fn in names}
+    assert "FILE3.TXT" in reader
+    assert "nope.txt" not in reader
+
+
+def test_compact():
+    reader = Reader("tests/erf/test.hak")
+    compact = Reader("tests/erf/test.hak", compact=True)
+    assert compact.filenames == sorted(reader.filenames)
+    assert len(compact) == len(reader)
+    assert "SKYBOXES.2da" in compact
+    assert "nope.txt" not in compact
+    assert compact.filemap["skyboxes.2da"] == reader.filemap["skyboxes.2da"]
+    for fn in reader.filenames:
+        assert compact[fn] == reader[fn]
+    assert compact.read_many(reader.filenames) == reader.read_many(reader.filenames)
+
+
+def test_shared_index():
+    reader = Reader("tests/erf/test.hak")
+    blob = reader.export_index()
+    shared = Reader("tests/erf/test.hak", shared_index=blob)
+    assert shared.filenames == sorted(reader.filenames)
+    assert dict(shared.filemap) == dict(reader.filemap)
+    for fn in reader.filenames:
+        assert shared[fn] == reader[fn]
+    assert shared.export_index() == blob
+
+    other = BytesIO()
+    with Writer(other) as w:
+        w.add_file_data("test.txt", b"x")
+    with pytest.raises(ValueError):
+        Reader(BytesIO(other.getvalue()), shared_index=blob)
+
+
+def test_add_file_stream(tmp_path):
+    big = bytes(range(256)) * 5000
+    src = tmp_path / "big.tga"
+    src.write_bytes(big)
+    out = tmp_path / "out.hak"
+    with open(out, "wb") as file, Writer(file, file_type="HAK ") as w:
+        w.add_file_data("first.txt", b"first")
+        w.add_file_path("big.tga", src)
+        with open(src, "rb") as f:
+            f.seek(10)
+            w.add_file_stream("part.tga", f, size=100)
+            assert f.tell() == 110
+        w.add_file_stream("mem.txt", BytesIO(b"in memory"))
+        w.add_file_data("last.txt", b"last")
+    reader = Reader(out)
+    assert reader.read_file("first.txt") == b"first"
+    assert reader.read_file("big.tga") == big
+    assert reader.read_file("part.tga") == big[10:110]
+    assert reader.read_file("mem.txt") == b"in memory"
+    assert reader.read_file("last.txt") == b"last"
+
+
+def test_add_file_stream_short():
+    file = BytesIO()
+    with Writer(file) as w:
+        with pytest.raises(ValueError):
+            w.add_file_stream("short.txt", BytesIO(b"abc"), size=10)
+
+
+def test_pack_directory(tmp_path):
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    payloads = {f"file{i}.txt": bytes([i]) * (i * 1000 + 1) for i in range(20)}
+    for fn, data in payloads.items():
+        (src / fn).write_bytes(data)
+    (src / "sub" / "nested.2da").write_bytes(b"2DA V2.0")
+    (src / "name_longer_than_16.txt").write_bytes(b"skipped")
+
+    english = GenderedLanguage(Language.ENGLISH, Gender.MALE)
+    out = tmp_path / "out.hak"
+    count = pack_directory(
+        src, out, workers=4, localized_strings={english: "My hak"}
+    )
+    assert count == len(payloads)
+    reader = Reader(out)
+    assert reader.file_type == b"HAK "
+    assert reader.build_date == date.today()
+    assert reader.localized_strings == {english: "My hak"}
+    assert reader.filenames == sorted(payloads)
+    assert {fn: reader[fn] for fn in reader} == payloads
+
+    assert pack_directory(src, out, file_type="ERF ", recursive=True) == 21
+    reader = Reader(out)
+    assert reader.file_type == b"ERF "
+    assert reader["nested.2da"] == b"2DA V2.0"
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions")
+def test_pack_directory_mode(tmp_path):
+    (tmp_path / "a.txt").write_bytes(b"a")
+    umask = os.umask(0o022)
+    try:
+        pack_directory(tmp_path, tmp_path / "out.hak")
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE((tmp_path / "out.hak").stat().st_mode) == 0o644
+
+
+def test_pack_directory_duplicate(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b.txt").write_bytes(b"1")
+    (tmp_path / "a" / "b.txt").write_bytes(b"2")
+    with pytest.raises(ValueError):
+        pack_directory(tmp_path, tmp_path / "out.hak", recursive=True)
+    with pytest.raises(FileNotFoundError):
+        pack_directory(tmp_path / "missing", tmp_path / "out.hak")
+
+
+@pytest.mark.parametrize("change", [b"grown", b""])
+def test_pack_directory_changed_size(tmp_path, monkeypatch, change):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "a.txt").write_bytes(b"aaaa")
+    out = tmp_path / "out.hak"
+    real_stat = os.stat
+
+    def stat_then_change(path, *args, **kwargs):
+        # Changes the file after pack_directory took its size.
+        st = real_stat(path, *args, **kwargs)
+        if os.fspath(path) == os.fspath(src / "a.txt"):
+            with open(path, "ab" if change else "wb") as f:
+                f.write(change)
+        return st
+
+    monkeypatch.setattr(os, "stat", stat_then_change)
+    with pytest.raises(ValueError):
+        pack_directory(src, out)
+    assert not out.exists()
+
+
+def _write_archive(path, payloads):
+    with open(path, "wb") as file, Writer(file, file_type="MOD ") as w:
+        for fn, data in payloads.items():
+            w.add_file_data(fn, data)
+
+
+def test_shared_index_stale(tmp_path):
+    path = tmp_path / "test.mod"
+    _write_archive(path, {"a.txt": b"aaaa", "b.txt": b"bbbb"})
+    blob = Reader(path).export_index()
+    assert Reader(path, shared_index=blob)["a.txt"] == b"aaaa"
+
+    with Updater(path, compact_threshold=None) as up:
+        up.add_file_data("a.txt", b"NEWDATA!")
+    with pytest.raises(ValueError):
+        Reader(path, shared_index=blob)
+
+    blob = Reader(path).export_index()
+    os.utime(path, ns=(0, 0))
+    with pytest.raises(ValueError):
+        Reader(path, shared_index=blob)
+
+
+def test_updater(tmp_path):
+    path = tmp_path / "test.mod"
+    payloads = {f"file{i}.txt": bytes([i]) * 1000 for i in range(10)}
+    _write_archive(path, payloads)
+    size = path.stat().st_size
+
+    with Updater(path, compact_threshold=None) as up:
+        up.add_file_data("file3.txt", b"replaced")
+        up.add_file_stream("new.txt", BytesIO(b"new"))
+        up.remove("file5.txt")
+        with pytest.raises(KeyError):
+            up.remove("missing.txt")
+        assert up.dead_space > 2000
+
+    payloads["file3.txt"] = b"replaced"
+    payloads["new.txt"] = b"new"
+    del payloads["file5.txt"]
+    reader = Reader(path)
+    assert reader.file_type == b"MOD "
+    assert {fn: reader[fn] for fn in reader} == payloads
+    # Only the new data and lists were appended.
+    assert path.stat().st_size < size + 1000
+
+
+def test_updater_compact(tmp_path):
+    path = tmp_path / "test.mod"
+    payloads = {f"file{i}.txt": bytes([i]) * 1000 for i in range(10)}
+    _write_archive(path, payloads)
+
+    with Updater(path, compact_threshold=0.5) as up:
+        for i in range(6):
+            up.add_file_data(f"file{i}.txt", b"small")
+    for i in range(6):
+        payloads[f"file{i}.txt"] = b"small"
+    reader = Reader(path)
+    assert {fn: reader[fn] for fn in reader} == payloads
+    assert path.stat().st_size < 5000
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions")
+def test_updater_compact_keeps_mode(tmp_path):
+    path = tmp_path / "test.mod"
+    _write_archive(path, {"a.txt": b"a" * 1000})
+    path.chmod(0o640)
+    with Updater(path) as up:
+        up.add_file_data("a.txt", b"b")
+        up.commit(compact=True)
+    assert Reader(path)["a.txt"] == b"b"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
+
+
+def test_updater_compact_syncs(tmp_path, monkeypatch):
+    path = tmp_path / "test.mod"
+    _write_archive(path, {"a.txt": b"a" * 1000})
+    calls = []
+    fsync, replace = os.fsync, os.replace
+    monkeypatch.setattr(os, "fsync", lambda fd: calls.append("fsync") or fsync(fd))
+    monkeypatch.setattr(
+        os, "replace", lambda *a: calls.append("replace") or replace(*a)
+    )
+    with Updater(path) as up:
+        up.commit(compact=True)
+    assert calls == ["fsync", "replace"]
+    assert Reader(path)["a.txt"] == b"a" * 1000
+
+
+def test_updater_abort(tmp_path):
+    path = tmp_path / "test.mod"
+    _write_archive(path, {"a.txt": b"a"})
+    before = path.read_bytes()
+    with pytest.raises(RuntimeError):
+        with Updater(path) as up:
+            up.add_file_data("b.txt", b"b" * 1000)
+            raise RuntimeError()
+    assert path.read_bytes() == before
+
+
+def test_digests(tmp_path):
+    reader = Reader("tests/erf/test.hak")
+    digests = reader.digests()
+    assert digests["skyboxes.2da"].hex() == "869fa0ad3aebd1cb8dfec90b5f46ce3463d4ad1e"
+    assert digests == {fn: hashlib.sha1(reader[fn]).digest() for fn in reader}
+
+    payloads = {"a.txt": b"a" * 5000, "b.txt": b"", "c.txt": b"c"}
+    file = BytesIO()
+    with Writer(file) as w:
+        for fn, data in payloads.items():
+            w.add_file_data(fn, data)
+    reader = Reader(BytesIO(file.getvalue()))
+    assert reader.digests(workers=2) == {
+        fn: hashlib.sha1(data).digest() for fn, data in payloads.items()
+    }
+
+
+def test_diff(tmp_path, monkeypatch):
+    old, new = tmp_path / "old.mod", tmp_path / "new.mod"
+    payloads = {f"file{i}.txt": bytes([i]) * 100 for i in range(5)}
+    _write_archive(old, payloads)
+    payloads["file1.txt"] = b"grown" * 100
+    payloads["file2.txt"] = bytes([9]) * 100
+    del payloads["file3.txt"]
+    payloads["new.txt"] = b"new"
+    _write_archive(new, payloads)
+
+    expected = (["new.txt"], ["file3.txt"], ["file1.txt", "file2.txt"])
+    opened = []
+
+    def tracking_open(*args, **kwargs):
+        opened.append(open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(erf, "open", tracking_open, raising=False)
+    # Closed by diff itself, not when the readers are collected.
+    monkeypatch.setattr(Reader, "__del__", lambda self: None)
+    assert diff(old, new) == expected
+    assert len(opened) == 2 and all(f.closed for f in opened)
+    monkeypatch.undo()
+    assert diff(old, new, processes=2) == expected
+    with open(old, "rb") as file:
+        assert diff(Reader(file), new, workers=2) == expected
+        with pytest.raises(ValueError):
+            diff(Reader(file), new, processes=2)
+
+    # The same file is compared by location, without hashing.
+    monkeypatch.setattr(Reader, "digests", None)
+    with open(new, "rb") as a, open(new, "rb") as b:
+        assert diff(Reader(a), Reader(b)) == ([], [], [])
@@ -130,3 +130,44 @@ def test_list_fail():
     root = gff.Struct(0, Nested=[])
     with pytest.raises(ValueError):
         gff.write(BytesIO(), root, FileMagic("TEST"))
+
+
+@pytest.mark.parametrize("file_name", gff_corpus_files())
+def test_read_lazy(file_name):
+    with open(file_name, "rb") as f:
+        root, file_type = gff.read(f)
+        f.seek(0)
+        lazy, lazy_ft = gff.read(f, lazy=True)
+
+    assert lazy_ft == file_type
+    assert isinstance(lazy, gff.LazyStruct)
+    assert isinstance(lazy, gff.Struct)
+    assert lazy.struct_id == root.struct_id
+    assert lazy == root
+    assert dict(lazy) == dict(root)
+
+    materialized = lazy.materialize()
+    assert type(materialized) is gff.Struct
+    assert materialized == root
+
+    out = BytesIO()
+    gff.write(out, lazy, file_type)
+    out.seek(0)
+    assert gff.read(out)[0] == root
+
+
+def test_read_lazy_on_access():
+    with open("tests/gff/corpus/area001.are", "rb") as f:
+        root, _ = gff.read(f, lazy=True)
+
+    assert root.Tag
+    # Only the root has been decoded; nested structs are unloaded proxies.
+    structs = [v for v in root.values() if isinstance(v, gff.LazyStruct)]
+    structs += [s for v in root.values() if isinstance(v, gff.List) for s in v]
+    assert structs
+    assert all(vars(s)["_loader"] is not None for s in structs)
+    structs[0].keys()
+    assert vars(structs[0])["_loader"] is None
+
+    root.Tag = gff.CExoString("changed")
+    assert root["Tag"] == "changed"
@@ -1,8 +1,11 @@
+import os
+import shutil
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
-from nwn.key import Reader
+from nwn.key import Reader, diff
 
 
 @pytest.fixture
@@ -42,3 +45,222 @@ def test_len_and_iter(reader):
         "fswater.shd",
         "ruleset.2da",
     }
+
+
+def test_mmap_read():
+    with Reader("tests/key/data/test.key", use_mmap=True) as rd:
+        nws = rd.read_file("nwscript.nss")
+        assert isinstance(nws, bytes)
+        assert (
+            hashlib.sha1(nws).hexdigest() == "8a4d7d70d664416999b2d4a454793b8a135ab71d"
+        )
+        view = rd.read_view("nwscript.nss")
+        assert view.readonly
+        assert view == nws
+        view.release()
+
+
+def test_read_view_without_mmap(reader):
+    view = reader.read_view("ruleset.2da")
+    assert view.tobytes() == reader.read_file("ruleset.2da")
+    with pytest.raises(KeyError):
+        reader.read_view("missing_file.txt")
+
+
+def test_mmap_close_with_live_view():
+    rd = Reader("tests/key/data/test.key", use_mmap=True)
+    view = rd.read_view("nwscript.nss")
+    rd.close()
+    assert len(view.tobytes()) == len(view)
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_concurrent_reads(use_mmap):
+    with Reader("tests/key/data/test.key", use_mmap=use_mmap) as rd:
+        expect = {fn: rd.read_file(fn) for fn in rd.filenames}
+        names = rd.filenames * 100
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(rd.read_file, names))
+        assert results == [expect[fn] for fn in names]
+
+
+def test_index_cache(tmp_path):
+    cache = tmp_path / "test.key.idx"
+    with Reader("tests/key/data/test.key", index_cache=cache) as rd:
+        expect = {fn: rd.read_file(fn) for fn in rd.filenames}
+        expect_date = rd.build_date
+    assert cache.is_file()
+
+    with Reader("tests/key/data/test.key", index_cache=cache) as rd:
+        assert rd.filenames == list(expect)
+        assert rd.build_date == expect_date
+        assert {fn: rd.read_file(fn) for fn in rd} == expect
+        assert rd.filemap["nwscript.nss"].size == len(expect["nwscript.nss"])
+
+
+def test_index_cache_stale(tmp_path):
+    data = tmp_path / "data"
+    shutil.copytree("tests/key/data", data)
+    cache = tmp_path / "test.key.idx"
+    Reader(data / "test.key", index_cache=cache).close()
+    written = cache.read_bytes()
+
+    # Touching a BIF invalidates the cache and rewrites it.
+    bif = data / "a.bif"
+    st = bif.stat()
+    os.utime(bif, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    with Reader(data / "test.key", index_cache=cache) as rd:
+        assert len(rd) == 4
+    assert cache.read_bytes() != written
+
+
+def test_index_cache_unwritable(tmp_path, caplog):
+    blocker = tmp_path / "file"
+    blocker.write_bytes(b"")
+    with Reader("tests/key/data/test.key", index_cache=blocker / "test.idx") as rd:
+        assert rd["nwscript.nss"]
+    assert "Could not write index cache" in caplog.text
+
+
+def test_index_cache_corrupt(tmp_path):
+    cache = tmp_path / "test.key.idx"
+    cache.write_bytes(b"NWKX garbage")
+    with Reader("tests/key/data/test.key", index_cache=cache) as rd:
+        assert len(rd) == 4
+    assert cache.read_bytes().startswith(b"NWKX")
+    assert len(cache.read_bytes()) > 12
+
+
+def test_lazy_opens_on_demand():
+    with Reader("tests/key/data/test.key", lazy=True) as rd:
+        assert len(rd) == 4
+        assert not rd._bif_files
+        nws = rd.read_file("nwscript.nss")
+        assert (
+            hashlib.sha1(nws).hexdigest() == "8a4d7d70d664416999b2d4a454793b8a135ab71d"
+        )
+        assert len(rd._bif_files) == 1
+        assert rd.filemap["ruleset.2da"].size == len(rd["ruleset.2da"])
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_read_after_close(lazy):
+    rd = Reader("tests/key/data/test.key", lazy=lazy)
+    rd.close()
+    with pytest.raises(ValueError):
+        rd.read_file("nwscript.nss")
+    with pytest.raises(ValueError):
+        rd.read_many(["nwscript.nss"])
+    assert not rd._bif_files
+    assert "nwscript.nss" in rd.filenames
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_max_open_bifs(use_mmap, reader):
+    expect = {fn: reader.read_file(fn) for fn in reader.filenames}
+    with Reader(
+        "tests/key/data/test.key", max_open_bifs=1, use_mmap=use_mmap
+    ) as rd:
+        for _ in range(3):
+            for fn, data in expect.items():
+                assert rd.read_file(fn) == data
+                assert len(rd._bif_files) == 1
+
+
+def test_max_open_bifs_invalid():
+    with pytest.raises(ValueError):
+        Reader("tests/key/data/test.key", max_open_bifs=0)
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_read_many(use_mmap):
+    with Reader("tests/key/data/test.key", use_mmap=use_mmap) as rd:
+        names = list(reversed(rd.filenames))
+        result = rd.read_many(names)
+        assert list(result) == names
+        assert result == {fn: rd.read_file(fn) for fn in names}
+        assert rd.read_many(fn for fn in names) == result
+        with pytest.raises(KeyError):
+            rd.read_many(["nwscript.nss", "missing_file.txt"])
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_compact(lazy, reader):
+    with Reader("tests/key/data/test.key", compact=True, lazy=lazy) as rd:
+        assert rd.filenames == sorted(reader.filenames)
+        assert len(rd) == len(reader)
+        assert "nwscript.nss" in rd
+        assert "missing_file.txt" not in rd
+        assert 42 not in rd
+        with pytest.raises(KeyError):
+            _ = rd["missing_file.txt"]
+        for fn in reader.filenames:
+            assert rd[fn] == reader[fn]
+        assert dict(rd.filemap) == dict(reader.filemap)
+        assert rd.read_many(reader.filenames) == reader.read_many(reader.filenames)
+
+
+def test_shared_index(reader):
+    blob = reader.export_index()
+    with Reader("tests/key/data/test.key", shared_index=memoryview(blob)) as rd:
+        assert rd.filenames == sorted(reader.filenames)
+        assert rd.build_date == reader.build_date
+        assert dict(rd.filemap) == dict(reader.filemap)
+        for fn in reader.filenames:
+            assert rd[fn] == reader[fn]
+        assert "missing_file.txt" not in rd
+        assert rd.export_index() == blob
+
+
+def test_shared_index_invalid():
+    with pytest.raises(ValueError):
+        Reader("tests/key/data/test.key", shared_index=b"NWKX" + bytes(64))
+
+
+def test_shared_index_stale(tmp_path):
+    shutil.copytree("tests/key/data", tmp_path / "data")
+    keyfile = tmp_path / "data" / "test.key"
+    with Reader(keyfile) as rd:
+        blob = rd.export_index()
+    st = keyfile.stat()
+    os.utime(keyfile, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    with pytest.raises(ValueError):
+        Reader(keyfile, shared_index=blob)
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_digests(use_mmap):
+    with Reader("tests/key/data/test.key", use_mmap=use_mmap) as rd:
+        digests = rd.digests(workers=2)
+        assert list(digests) == rd.filenames
+        assert digests == {fn: hashlib.sha1(rd[fn]).digest() for fn in rd}
+        assert digests["nwscript.nss"].hex() == (
+            "8a4d7d70d664416999b2d4a454793b8a135ab71d"
+        )
+        assert list(rd.digests(["ruleset.2da"])) == ["ruleset.2da"]
+        with pytest.raises(KeyError):
+            rd.digests(["missing_file.txt"])
+
+
+def test_diff(tmp_path, monkeypatch):
+    shutil.copytree("tests/key/data", tmp_path / "data")
+    with Reader("tests/key/data/test.key") as rd:
+        nws = rd["nwscript.nss"]
+        bif = rd.filemap["nwscript.nss"].bif
+    bif_path = tmp_path / bif
+    data = bif_path.read_bytes()
+    pos = data.find(nws) + 100
+    bif_path.write_bytes(data[:pos] + bytes([data[pos] ^ 1]) + data[pos + 1 :])
+
+    new = tmp_path / "data" / "test.key"
+    assert diff("tests/key/data/test.key", new) == ([], [], ["nwscript.nss"])
+    assert diff("tests/key/data/test.key", new, processes=2).changed == [
+        "nwscript.nss"
+    ]
+
+    # Shared BIFs are compared by location, without hashing.
+    monkeypatch.setattr(Reader, "digests", None)
+    with Reader(new) as a, Reader(new, lazy=True) as b:
+        assert diff(a, b) == ([], [], [])
+        with pytest.raises(ValueError):
+            diff(a, b, processes=2)
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import stat
+
+import pytest
+
+from nwn import erf, key
+from nwn.nwsync.repository import Repository
+
+FIXTURE_MANIFEST = "3cf66c49bff6188f0b4ce8d0ea3fae945237a357"
+
+
+def test_open_existing():
+    repo = Repository("tests/nwsync/root")
+    assert repo.manifests == [FIXTURE_MANIFEST]
+    view = repo.open(FIXTURE_MANIFEST)
+    assert len(view) == len(view.manifest.entries)
+    assert "x3_it_rubygem.uti" in view
+    data = view["X3_IT_RUBYGEM.UTI"]
+    assert len(data) == 719
+    assert hashlib.sha1(data).hexdigest() == "1d4abcd8de80b40de2fee055d1cfd14861aa8132"
+    with pytest.raises(KeyError):
+        repo.open("missing")
+
+
+def test_ingest_dedup(tmp_path):
+    repo = Repository(tmp_path / "repo")
+    manifest_id = repo.ingest("tests/erf/test.hak", name="test")
+    assert repo.refs == {"test": manifest_id}
+    assert repo.manifests == [manifest_id]
+
+    with open("tests/erf/test.hak", "rb") as f:
+        hak = erf.Reader(f)
+        view = repo.open("test")
+        assert sorted(view) == sorted(hak)
+        assert view.read_many(hak) == {fn: hak[fn] for fn in hak}
+
+        # Same content from a directory: no new data, same manifest.
+        src = tmp_path / "src"
+        src.mkdir()
+        for fn in hak:
+            (src / fn).write_bytes(hak[fn])
+    blobs = set((tmp_path / "repo" / "data").rglob("*"))
+    assert repo.ingest(src) == manifest_id
+
+    (src / "extra.txt").write_bytes(b"extra")
+    second = repo.ingest(dict(repo.open(manifest_id), **{"extra.txt": b"extra"}))
+    assert second != manifest_id
+    assert repo.ingest(src, name="test") == second
+    assert repo.refs == {"test": second}
+    added = set((tmp_path / "repo" / "data").rglob("*")) - blobs
+    assert {p.name for p in added if p.is_file()} == {
+        hashlib.sha1(b"extra").hexdigest()
+    }
+    assert repo.open("test")["extra.txt"] == b"extra"
+    assert len(repo.open(manifest_id)) == len(repo.open(second)) - 1
+
+
+def test_ingest_empty(tmp_path):
+    with pytest.raises(ValueError):
+        Repository(tmp_path).ingest({})
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions")
+def test_file_mode(tmp_path):
+    repo = Repository(tmp_path)
+    umask = os.umask(0o022)
+    try:
+        repo.ingest({"a.txt": b"a"}, name="v1")
+    finally:
+        os.umask(umask)
+    files = [p for p in tmp_path.rglob("*") if p.is_file()]
+    assert len(files) == 3
+    assert all(stat.S_IMODE(p.stat().st_mode) == 0o644 for p in files)
+
+
+def test_ingest_closes_reader(tmp_path, monkeypatch):
+    closed = []
+    close = key.Reader.close
+
+    def tracking_close(self):
+        closed.append(self)
+        close(self)
+
+    monkeypatch.setattr(key.Reader, "close", tracking_close)
+    repo = Repository(tmp_path)
+    view = repo.open(repo.ingest("tests/key/data/test.key"))
+    assert len(closed) == 1
+    assert sorted(view) == sorted(
+        ["inc_common.shd", "nwscript.nss", "fswater.shd", "ruleset.2da"]
+    )
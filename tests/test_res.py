@@ -1,4 +1,7 @@
+import pytest
+
 from nwn import is_valid_resref
+from nwn.res import ResRefKey, extension_to_restype, validate_resrefs
 
 
 def test_is_valid_resref_valid():
@@ -16,3 +19,28 @@ def test_is_valid_resref_invalid():
     assert not is_valid_resref(".txt")  # empty name
     assert not is_valid_resref("a1234567890123456.txt")  # 17 chars
     assert not is_valid_resref("foo.invalidext")  # invalid extension
+
+
+def test_extension_to_restype():
+    assert extension_to_restype("nss") == 2009
+    assert extension_to_restype("NSS") == 2009
+    with pytest.raises(ValueError):
+        extension_to_restype("invalidext")
+
+
+def test_resref_key():
+    key = ResRefKey.from_filename("NWScript.NSS")
+    assert key == ResRefKey("nwscript", 2009)
+    assert key.extension == "nss"
+    assert key.filename == str(key) == "nwscript.nss"
+    assert hash(key) == hash(ResRefKey("nwscript", 2009))
+    with pytest.raises(ValueError):
+        ResRefKey.from_filename("foo.invalidext")
+
+
+def test_validate_resrefs():
+    result = validate_resrefs(["foo.txt", "foo", "BAR.NSS", "foo/abc.txt"])
+    assert result == {
+        "foo.txt": ResRefKey("foo", 10),
+        "BAR.NSS": ResRefKey("bar", 2009),
+    }
@@ -0,0 +1,139 @@
+import asyncio
+import gc
+import threading
+import time
+
+import pytest
+
+from nwn.res import ResDict
+from nwn.resasync import AsyncResMan
+from nwn import key
+from nwn import resman
+
+
+def test_get_and_stream():
+    rm = resman.create(include_user=False)
+
+    async def main():
+        async with AsyncResMan(rm, max_workers=2) as arm:
+            assert "nwscript.nss" in arm
+            assert await arm.get("nwscript.nss") == rm["nwscript.nss"]
+            names = list(rm)
+            got = {name: data async for name, data in arm.stream(names)}
+            assert got == {name: rm[name] for name in names}
+            many = await arm.read_many(reversed(names))
+            assert list(many) == list(reversed(names))
+            with pytest.raises(KeyError):
+                await arm.get("missing.txt")
+
+    asyncio.run(main())
+
+
+def test_keyfile_source():
+    rd = key.Reader("tests/key/data/test.key")
+
+    async def main():
+        async with AsyncResMan(rd) as arm:
+            result = await arm.read_many(rd.filenames)
+            assert result == {fn: rd.read_file(fn) for fn in rd.filenames}
+
+    asyncio.run(main())
+
+
+class SlowDict(ResDict):
+    def __init__(self):
+        super().__init__()
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.01)
+        with self._lock:
+            self.active -= 1
+        return super().__getitem__(key)
+
+
+def test_per_file_concurrency():
+    slow = SlowDict()
+    for i in range(20):
+        slow[f"file{i}.txt"] = b"x"
+
+    async def main():
+        async with AsyncResMan(slow, max_workers=8, per_file_concurrency=2) as arm:
+            await arm.read_many(list(slow))
+
+    asyncio.run(main())
+    assert slow.peak <= 2
+
+
+def test_stream_error_cancels():
+    inmem = ResDict()
+    inmem["a.txt"] = b"a"
+
+    async def main():
+        async with AsyncResMan(inmem) as arm:
+            with pytest.raises(KeyError):
+                async for _ in arm.stream(["a.txt", "missing.txt"]):
+                    pass
+
+    asyncio.run(main())
+
+
+def test_stream_error_retrieves_all():
+    barrier = threading.Barrier(4)
+
+    class Failing(ResDict):
+        def __getitem__(self, key):
+            barrier.wait(timeout=5)
+            raise KeyError(key)
+
+    failing = Failing()
+    for i in range(4):
+        failing[f"file{i}.txt"] = b"x"
+    errors = []
+
+    async def main():
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: errors.append(context)
+        )
+        async with AsyncResMan(failing, max_workers=4) as arm:
+            # Not pytest.raises, whose traceback would keep the tasks alive
+            # past the end of the loop.
+            try:
+                async for _ in arm.stream(list(failing)):
+                    pass
+            except KeyError:
+                pass
+            else:
+                pytest.fail("KeyError not raised")
+        gc.collect()
+
+    asyncio.run(main())
+    assert not errors
+
+
+def test_aclose_does_not_block_loop():
+    release = threading.Event()
+
+    class Blocking(ResDict):
+        def __getitem__(self, key):
+            release.wait(timeout=5)
+            return super().__getitem__(key)
+
+    blocking = Blocking()
+    blocking["a.txt"] = b"a"
+
+    async def main():
+        async with AsyncResMan(blocking) as arm:
+            read = asyncio.ensure_future(arm.get("a.txt"))
+            await asyncio.sleep(0.01)
+            # Only runs while the executor shuts down if the loop is free.
+            asyncio.get_running_loop().call_later(0.05, release.set)
+        assert release.is_set()
+        assert await read == b"a"
+
+    asyncio.run(main())
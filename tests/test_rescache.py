@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from nwn.res import ResDict
+from nwn.rescache import CachedContainer
+from nwn import resman
+
+
+class CountingDict(ResDict):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def __getitem__(self, key):
+        self.reads += 1
+        return super().__getitem__(key)
+
+
+@pytest.fixture
+def source():
+    d = CountingDict()
+    for i in range(10):
+        d[f"file{i}.txt"] = bytes([i]) * 10
+    return d
+
+
+def test_hits_and_misses(source):
+    cache = CachedContainer(source, max_bytes=1000)
+    assert cache["file1.txt"] == b"\x01" * 10
+    assert cache["FILE1.TXT"] == b"\x01" * 10
+    assert source.reads == 1
+    stats = cache.stats
+    assert (stats.hits, stats.misses, stats.evictions) == (1, 1, 0)
+    assert (stats.size, stats.count) == (10, 1)
+    cache.reset_stats()
+    assert cache.stats.hits == 0
+    assert cache.stats.count == 1
+
+
+def test_lru_eviction(source):
+    cache = CachedContainer(source, max_bytes=30)
+    for i in range(3):
+        _ = cache[f"file{i}.txt"]
+    _ = cache["file0.txt"]  # file1 is now least recently used
+    _ = cache["file3.txt"]
+    assert cache.stats.evictions == 1
+    assert cache.stats.size == 30
+    reads = source.reads
+    _ = cache["file0.txt"]
+    assert source.reads == reads
+    _ = cache["file1.txt"]
+    assert source.reads == reads + 1
+
+
+def test_oversized_not_cached(source):
+    cache = CachedContainer(source, max_bytes=5)
+    _ = cache["file1.txt"]
+    _ = cache["file1.txt"]
+    assert source.reads == 2
+    assert cache.stats.count == 0
+
+
+def test_invalidate(source):
+    cache = CachedContainer(source)
+    _ = cache["file1.txt"]
+    source["file1.txt"] = b"changed"
+    assert cache["file1.txt"] == b"\x01" * 10
+    cache.invalidate(["FILE1.txt"])
+    assert cache["file1.txt"] == b"changed"
+    cache.invalidate()
+    assert cache.stats.size == 0
+
+
+def test_mapping_interface(source):
+    cache = CachedContainer(source)
+    assert len(cache) == 10
+    assert "file3.txt" in cache
+    assert set(cache) == set(source)
+    with pytest.raises(KeyError):
+        _ = cache["missing.txt"]
+
+
+def test_read_many_over_resman():
+    cache = CachedContainer(resman.create(include_user=False))
+    first = cache.read_many(["nwscript.nss", "ruleset.2da"])
+    assert cache.stats.misses == 2
+    second = cache.read_many(["ruleset.2da", "nwscript.nss"])
+    assert cache.stats.hits == 2
+    assert first == second
+
+
+def test_concurrent_access(source):
+    cache = CachedContainer(source, max_bytes=50)
+    names = [f"file{i % 10}.txt" for i in range(1000)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(cache.__getitem__, names))
+    assert results == [source[n] for n in names]
+    assert cache.stats.size <= 50
@@ -0,0 +1,55 @@
+import hashlib
+import os
+from pathlib import Path
+
+from nwn import erf
+from nwn.reshash import archive_digests, digest_archives, sidecar_path
+
+KEYFILE = "tests/key/data/test.key"
+HAKFILE = "tests/erf/test.hak"
+
+
+def _write_hak(path, payloads):
+    with open(path, "wb") as file, erf.Writer(file, file_type="HAK ") as w:
+        for fn, data in payloads.items():
+            w.add_file_data(fn, data)
+
+
+def test_archive_digests_sidecar(tmp_path):
+    path = tmp_path / "test.hak"
+    payloads = {"a.txt": b"a", "b.txt": b"b"}
+    _write_hak(path, payloads)
+
+    digests = archive_digests(path)
+    assert digests == {fn: hashlib.sha1(d).digest() for fn, d in payloads.items()}
+    sidecar = sidecar_path(path)
+    assert sidecar.exists()
+
+    # An up to date sidecar is used as is.
+    sidecar_mtime = sidecar.stat().st_mtime_ns
+    assert archive_digests(path) == digests
+    assert sidecar.stat().st_mtime_ns == sidecar_mtime
+
+    # A changed archive is rehashed.
+    payloads["a.txt"] = b"changed"
+    _write_hak(path, payloads)
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert archive_digests(path)["a.txt"] == hashlib.sha1(b"changed").digest()
+
+
+def test_archive_digests_no_cache(tmp_path):
+    path = tmp_path / "test.hak"
+    _write_hak(path, {"a.txt": b"a"})
+    archive_digests(path, cache=False)
+    assert not sidecar_path(path).exists()
+
+
+def test_digest_archives(tmp_path):
+    cache_dir = tmp_path / "cache"
+    result = digest_archives([KEYFILE, HAKFILE], cache_dir=cache_dir, workers=2)
+    assert list(result) == [Path(KEYFILE), Path(HAKFILE)]
+    assert result[Path(KEYFILE)]["nwscript.nss"].hex() == "8a4d7d70d664416999b2d4a454793b8a135ab71d"
+    assert len(list(cache_dir.iterdir())) == 2
+    # Served from the sidecars the second time.
+    assert digest_archives([KEYFILE, HAKFILE], cache_dir=cache_dir) == result
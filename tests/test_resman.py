@@ -1,9 +1,15 @@
+import copy
 import os
+from io import BytesIO
 
 import pytest
 
+from nwn import gff
+from nwn.erf import Writer as ErfWriter
+from nwn.types import FileMagic
 from nwn.resdir import LocalDirectory
 from nwn.res import ResDict
+from nwn.rescache import CachedContainer
 from nwn import key
 from nwn import resman
 
@@ -111,3 +117,331 @@ def test_resman_inmem_writable(user_dir):
     rm = resman.create(inmem)
     rm["tempfile.txt"] = b"temporary data"
     assert rm["tempfile.txt"] == b"temporary data"
+
+
+def test_resdir_read_many(temp_resdir):
+    path, valid_files = temp_resdir
+    resdir = LocalDirectory(path)
+    assert resdir.read_many(["TEST2.nss", "test1.txt"]) == {
+        "TEST2.nss": b"world",
+        "test1.txt": b"hello",
+    }
+
+
+def test_resman_read_many():
+    inmem = ResDict()
+    inmem["nwscript.nss"] = b"shadowed"
+    inmem["tempfile.txt"] = b"temporary data"
+    rm = resman.create(inmem, include_user=False)
+    result = rm.read_many(["ruleset.2da", "nwscript.nss", "tempfile.txt"])
+    assert list(result) == ["ruleset.2da", "nwscript.nss", "tempfile.txt"]
+    assert result["nwscript.nss"] == b"shadowed"
+    assert result["ruleset.2da"] == rm["ruleset.2da"]
+    with pytest.raises(KeyError):
+        rm.read_many(["doesnotexist.txt"])
+
+
+def test_resman_index_precedence_and_case():
+    upper = ResDict()
+    upper["nwscript.nss"] = b"shadowed"
+    rm = resman.create(upper, include_user=False)
+    assert rm["NWScript.nss"] == b"shadowed"
+    assert "RULESET.2DA" in rm
+    assert rm.get("missing.txt") is None
+    assert len(rm) == 67
+    assert set(rm) == {k.lower() for m in rm.maps for k in m}
+
+
+def test_resman_index_writes_and_invalidate():
+    upper = ResDict()
+    lower = ResDict()
+    lower["foo.txt"] = b"lower"
+    rm = resman.ResMan(upper, lower)
+    assert rm["foo.txt"] == b"lower"
+
+    rm["foo.txt"] = b"upper"
+    assert rm["foo.txt"] == b"upper"
+    del rm["foo.txt"]
+    assert rm["foo.txt"] == b"lower"
+
+    # Direct layer modifications need explicit invalidation.
+    lower["bar.txt"] = b"bar"
+    assert "bar.txt" not in rm
+    rm.invalidate(["bar.txt"])
+    assert rm["bar.txt"] == b"bar"
+    del lower["foo.txt"]
+    lower["baz.txt"] = b"baz"
+    rm.invalidate()
+    assert set(rm) == {"bar.txt", "baz.txt"}
+
+    rm["qux.txt"] = b"qux"
+    assert rm.pop("qux.txt") == b"qux"
+    assert "qux.txt" not in rm
+
+
+def test_resman_get_gff_cached():
+    inmem = ResDict()
+    with open("tests/gff/corpus/x3_it_rubygem.uti", "rb") as f:
+        inmem["x3_it_rubygem.uti"] = f.read()
+    rm = resman.ResMan(inmem)
+
+    parsed, _ = gff.read(BytesIO(inmem["x3_it_rubygem.uti"]))
+
+    shared, file_type = rm.get_gff("x3_it_rubygem.uti")
+    assert file_type == b"UTI "
+    assert shared is rm.get_gff("X3_IT_RUBYGEM.uti")[0]
+    assert isinstance(shared, gff.Struct)
+    assert shared == parsed
+    with pytest.raises(TypeError):
+        shared.Tag = "CHANGED"
+    with pytest.raises(TypeError):
+        shared.PropertiesList.append(gff.Struct(0))
+    with pytest.raises(TypeError):
+        shared.Description.strref = 0
+
+    root, _ = rm.get_gff("x3_it_rubygem.uti", copy=True)
+    assert root == parsed
+    root.Tag = "CHANGED"
+    root.Description.entries.clear()
+    assert shared.Tag == "X3_IT_RUBYGEM"
+    assert shared.Description == parsed.Description
+    clone = copy.deepcopy(shared)
+    clone.Tag = "CHANGED"
+    assert shared.Tag == "X3_IT_RUBYGEM"
+
+    rm["x3_it_rubygem.uti"] = inmem["x3_it_rubygem.uti"]
+    assert rm.get_gff("x3_it_rubygem.uti")[0] is not shared
+
+
+def test_resman_get_2da_cached():
+    inmem = ResDict()
+    inmem["test.2da"] = b"2DA V2.0\n\nA B\n0 x ****\n1 \"y z\" w\n"
+    rm = resman.ResMan(inmem)
+    rows = rm.get_2da("test.2da")
+    assert rows[0]["A"] == "x"
+    assert rows[0]["B"] is None
+    assert rows[1]["A"] == "y z"
+    assert rm.get_2da("test.2da") is rows
+    with pytest.raises(TypeError):
+        rows[0]["A"] = "changed"
+
+    inmem["test.2da"] = b"2DA V2.0\n\nA\n0 q\n"
+    assert rm.get_2da("test.2da") is rows
+    rm.invalidate(["test.2da"])
+    assert rm.get_2da("test.2da")[0]["A"] == "q"
+
+
+def test_resman_invalidate_while_in_use():
+    old, new = b"2DA V2.0\n\nA\n0 old\n", b"2DA V2.0\n\nA\n0 new\n"
+
+    class Layer(dict):
+        # Simulates a Watcher invalidating while a resource is being read.
+        def __getitem__(self, key):
+            data = super().__getitem__(key)
+            if data == old:
+                super().__setitem__(key, new)
+                rm.invalidate([key, "added.txt"])
+            return data
+
+    layer = Layer({"test.2da": old})
+    rm = resman.ResMan(layer)
+    names = iter(rm)
+    dict.__setitem__(layer, "added.txt", b"added")
+    assert rm.get_2da("test.2da")[0]["A"] == "old"
+    assert list(names) == ["test.2da"]
+    assert rm.get_2da("test.2da")[0]["A"] == "new"
+    assert set(rm) == {"test.2da", "added.txt"}
+
+
+def test_resman_get_tlk_and_ssf():
+    inmem = ResDict()
+    with open("tests/tlk/ossian.tlk", "rb") as f:
+        inmem["ossian.tlk"] = f.read()
+    with open("tests/ssf/c_cat.ssf", "rb") as f:
+        inmem["c_cat.ssf"] = f.read()
+    rm = resman.ResMan(inmem)
+    entries, _ = rm.get_tlk("ossian.tlk")
+    assert isinstance(entries, tuple) and entries
+    assert rm.get_tlk("ossian.tlk")[0] is entries
+    assert rm.get_ssf("c_cat.ssf") is rm.get_ssf("c_cat.ssf")
+    rm.invalidate()
+    assert rm.get_tlk("ossian.tlk")[0] is not entries
+
+
+def _age(path, seconds=10):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - seconds * 1_000_000_000))
+
+
+def test_resdir_incremental_reindex(temp_resdir):
+    path, _ = temp_resdir
+    _age(path)
+    resdir = LocalDirectory(path)
+    assert not resdir.reindex()
+
+    (path / "new.txt").write_bytes(b"new")
+    os.remove(path / "test1.txt")
+    changes = resdir.reindex()
+    assert changes.added == {"new.txt"}
+    assert changes.removed == {"test1.txt"}
+    assert not changes.modified
+    assert changes.names == {"new.txt", "test1.txt"}
+    assert resdir["new.txt"] == b"new"
+    assert "test1.txt" not in resdir
+
+
+def test_resdir_reindex_skips_unchanged_dir(temp_resdir):
+    path, _ = temp_resdir
+    _age(path)
+    resdir = LocalDirectory(path)
+    # In-place rewrites do not touch the directory mtime.
+    (path / "test2.nss").write_bytes(b"changed!")
+    assert not resdir.reindex()
+    changes = resdir.reindex(force=True)
+    assert changes.modified == {"test2.nss"}
+    assert not changes.added and not changes.removed
+
+
+def test_resdir_reindex_own_writes(temp_resdir):
+    path, _ = temp_resdir
+    resdir = LocalDirectory(path, writable=True)
+    resdir["own.txt"] = b"data"
+    assert not resdir.reindex()
+    del resdir["own.txt"]
+    assert not resdir.reindex()
+
+
+def test_resdir_reindex_missing_dir(tmp_path):
+    resdir = LocalDirectory(tmp_path / "missing")
+    assert len(resdir) == 0
+    assert not resdir.reindex()
+
+
+def test_resman_instrumentation():
+    upper = ResDict()
+    upper["nwscript.nss"] = b"shadowed"
+    lower = ResDict()
+    lower["nwscript.nss"] = b"original"
+    lower["other.txt"] = b"12345"
+    rm = resman.ResMan(upper, lower)
+    assert rm.stats() == []
+
+    rm.instrument()
+    _ = rm["nwscript.nss"]
+    _ = rm["other.txt"]
+    assert rm.get("missing.txt") is None
+    rm.read_many(["other.txt"])
+
+    (l0, s0), (l1, s1) = rm.stats()
+    assert l0 is upper and l1 is lower
+    assert (s0.served, s0.missed, s0.bytes_read) == (1, 3, 8)
+    assert (s1.served, s1.missed, s1.bytes_read) == (2, 1, 10)
+    assert s1.time >= 0
+
+    rm.instrument(False)
+    _ = rm["other.txt"]
+    assert rm.stats() == []
+
+
+def test_resman_shadowed():
+    upper = ResDict()
+    upper["nwscript.nss"] = b"shadowed"
+    upper["unique.txt"] = b"unique"
+    rm = resman.create(upper, include_user=False)
+    report = rm.shadowed()
+    assert "unique.txt" not in report
+    assert report["nwscript.nss"][0] is upper
+    assert len(report["nwscript.nss"]) >= 2
+
+
+def test_resman_trace_roundtrip(tmp_path):
+    rm = resman.create(include_user=False)
+    rm.start_trace()
+    _ = rm["nwscript.nss"]
+    _ = rm["RULESET.2da"]
+    _ = rm["nwscript.nss"]
+    assert rm.get("missing.txt") is None
+    names = rm.stop_trace()
+    assert names == ["nwscript.nss", "ruleset.2da"]
+    assert rm.stop_trace() == []
+
+    trace = tmp_path / "trace.txt"
+    with open(trace, "w") as f:
+        resman.write_trace(f, names)
+    with open(trace) as f:
+        assert resman.read_trace(f) == names
+
+
+def test_resman_prefetch_into_cache():
+    cache = CachedContainer(resman.create(include_user=False))
+    future = resman.prefetch(cache, ["nwscript.nss", "gone.txt", "ruleset.2da"])
+    assert future.result(timeout=10) == 2
+    assert cache.stats.count == 2
+    _ = cache["nwscript.nss"]
+    assert cache.stats.hits == 1
+
+
+def _write_erf(path, files, file_type="HAK "):
+    with open(path, "wb") as f:
+        with ErfWriter(f, file_type=file_type) as w:
+            for fn, data in files.items():
+                w.add_file_data(fn, data)
+
+
+def test_create_for_module(tmp_path):
+    haks = tmp_path / "hak"
+    haks.mkdir()
+    _write_erf(haks / "top.hak", {"shared.txt": b"top", "top.txt": b"t"})
+    _write_erf(haks / "Bottom.hak", {"shared.txt": b"bottom", "mod.txt": b"hak"})
+    tlks = tmp_path / "tlk"
+    tlks.mkdir()
+    (tlks / "custom.tlk").write_bytes(b"")
+
+    ifo = gff.Struct(
+        0xFFFFFFFF,
+        Mod_HakList=gff.List(
+            [
+                gff.Struct(8, Mod_Hak=gff.CExoString("top")),
+                gff.Struct(8, Mod_Hak=gff.CExoString("bottom")),
+            ]
+        ),
+        Mod_CustomTlk=gff.CExoString("custom"),
+    )
+    ifo_data = BytesIO()
+    gff.write(ifo_data, ifo, FileMagic("IFO "))
+    module = tmp_path / "test.mod"
+    _write_erf(
+        module,
+        {"module.ifo": ifo_data.getvalue(), "mod.txt": b"module"},
+        file_type="MOD ",
+    )
+
+    stack = resman.create_for_module(
+        module,
+        include_user=False,
+        hak_directories=[haks],
+        tlk_directories=[tlks],
+    )
+    rm = stack.resman
+    assert rm["shared.txt"] == b"top"
+    assert rm["mod.txt"] == b"hak"
+    assert rm["top.txt"] == b"t"
+    assert rm["nwscript.nss"]
+    assert rm.maps[:2] == stack.haks
+    assert rm.maps[2].file_type == b"MOD "
+    assert stack.custom_tlk == tlks / "custom.tlk"
+    assert set(stack.timings) == {module, haks / "top.hak", haks / "Bottom.hak"}
+    assert len(stack.ifo.Mod_HakList) == 2
+
+
+def test_create_for_module_missing_hak(tmp_path):
+    ifo = gff.Struct(
+        0xFFFFFFFF,
+        Mod_HakList=gff.List([gff.Struct(8, Mod_Hak=gff.CExoString("gone"))]),
+    )
+    ifo_data = BytesIO()
+    gff.write(ifo_data, ifo, FileMagic("IFO "))
+    module = tmp_path / "test.mod"
+    _write_erf(module, {"module.ifo": ifo_data.getvalue()}, file_type="MOD ")
+    with pytest.raises(FileNotFoundError):
+        resman.create_for_module(module, include_user=False, hak_directories=[])
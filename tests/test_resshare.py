@@ -0,0 +1,71 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import nwn
+from nwn import key
+from nwn.resshare import SharedIndex, save_index, map_index
+
+KEYFILE = "tests/key/data/test.key"
+
+
+def _read_in_worker(name):
+    shared = SharedIndex.attach(name)
+    with key.Reader(KEYFILE, shared_index=shared.buffer) as rd:
+        result = {fn: rd[fn] for fn in rd}
+    del rd  # the reader holds views into the shared memory
+    shared.close()
+    return result
+
+
+def test_publish_attach():
+    with key.Reader(KEYFILE) as rd, SharedIndex.publish(rd) as shared:
+        expect = {fn: rd[fn] for fn in rd}
+        attached = SharedIndex.attach(shared.name)
+        with key.Reader(KEYFILE, shared_index=attached.buffer) as shrd:
+            assert {fn: shrd[fn] for fn in shrd} == expect
+        del shrd
+        attached.close()
+
+
+def test_worker_processes():
+    ctx = multiprocessing.get_context("spawn")
+    with key.Reader(KEYFILE) as rd, SharedIndex.publish(rd) as shared:
+        expect = {fn: rd[fn] for fn in rd}
+        with ProcessPoolExecutor(2, mp_context=ctx) as pool:
+            results = list(pool.map(_read_in_worker, [shared.name] * 2))
+    assert results == [expect, expect]
+
+
+def test_save_and_map(tmp_path):
+    path = tmp_path / "base.idx"
+    with key.Reader(KEYFILE) as rd:
+        save_index(rd, path)
+        mapping = map_index(path)
+        with key.Reader(KEYFILE, shared_index=mapping) as shrd:
+            assert shrd.filenames == sorted(rd.filenames)
+            assert shrd["nwscript.nss"] == rd["nwscript.nss"]
+
+
+def test_attach_from_other_process():
+    with key.Reader(KEYFILE) as rd, SharedIndex.publish(rd) as shared:
+        env = dict(os.environ)
+        src = str(Path(nwn.__file__).parent.parent)
+        env["PYTHONPATH"] = os.pathsep.join(
+            p for p in (src, env.get("PYTHONPATH")) if p
+        )
+        # Stopping the resource tracker waits for its cleanup at exit.
+        code = (
+            "import sys; from multiprocessing import resource_tracker; "
+            "from nwn.resshare import SharedIndex; "
+            "SharedIndex.attach(sys.argv[1]).close(); "
+            "resource_tracker._resource_tracker._stop()"
+        )
+        subprocess.run(
+            [sys.executable, "-c", code, shared.name], env=env, check=True
+        )
+        # The exiting process must not have removed the shared memory.
+        SharedIndex.attach(shared.name).close()
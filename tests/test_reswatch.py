@@ -0,0 +1,87 @@
+import os
+import threading
+
+import pytest
+
+from nwn.res import ResDict
+from nwn.resdir import LocalDirectory
+from nwn.resman import ResMan
+from nwn.reswatch import Watcher
+
+
+@pytest.fixture
+def stack(tmp_path):
+    upper = tmp_path / "upper"
+    upper.mkdir()
+    inmem = ResDict()
+    inmem["foo.txt"] = b"base"
+    rm = ResMan(LocalDirectory(upper), inmem)
+    return upper, rm
+
+
+def test_poll_updates_resman(stack):
+    path, rm = stack
+    watcher = Watcher(rm)
+    assert watcher.poll() == []
+    assert rm["foo.txt"] == b"base"
+
+    (path / "foo.txt").write_bytes(b"override")
+    changed = watcher.poll()
+    assert len(changed) == 1
+    layer, changes = changed[0]
+    assert layer is rm.maps[0]
+    assert changes.added == {"foo.txt"}
+    assert rm["foo.txt"] == b"override"
+
+    os.remove(path / "foo.txt")
+    watcher.poll()
+    assert rm["foo.txt"] == b"base"
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"force": False}])
+def test_poll_overwritten_in_place(stack, kwargs):
+    path, rm = stack
+    (path / "test.2da").write_bytes(b"2DA V2.0\n\nA\n0 old\n")
+    # An old directory mtime, so that it is trusted by the cheap check.
+    os.utime(path, ns=(0, 0))
+    watcher = Watcher(rm, **kwargs)
+    watcher.poll()
+    assert rm.get_2da("test.2da")[0]["A"] == "old"
+
+    with open(path / "test.2da", "r+b") as f:
+        f.write(b"2DA V2.0\n\nA\n0 new\n")
+    os.utime(path, ns=(0, 0))
+    changed = watcher.poll()
+    if kwargs.get("force", True):
+        assert changed[0][1].modified == {"test.2da"}
+        assert rm.get_2da("test.2da")[0]["A"] == "new"
+    else:
+        assert changed == []
+
+
+def test_subscribers(stack):
+    path, rm = stack
+    watcher = Watcher(rm)
+    events = []
+    unsubscribe = watcher.subscribe(lambda layer, changes: events.append(changes))
+    (path / "bar.txt").write_bytes(b"bar")
+    watcher.poll()
+    assert [e.added for e in events] == [{"bar.txt"}]
+    unsubscribe()
+    (path / "baz.txt").write_bytes(b"baz")
+    watcher.poll()
+    assert len(events) == 1
+
+
+def test_background_thread(stack):
+    path, rm = stack
+    seen = threading.Event()
+    with Watcher(rm, interval=0.01) as watcher:
+        assert watcher.running
+        with pytest.raises(RuntimeError):
+            watcher.start()
+        watcher.subscribe(lambda layer, changes: seen.set())
+        (path / "bar.txt").write_bytes(b"bar")
+        assert seen.wait(5)
+    assert not watcher.running
+    assert rm["bar.txt"] == b"bar"